@@ -1,29 +1,49 @@
-import pyperclip
+import argparse
+import sys
+from pathlib import Path
+
+# Lua文字列のエスケープ処理は settingfile_formatter と共通
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from settingfile_formatter.formatters import lua_string
 
 # クリップボードに格納されたテキストデータをLua文字列に変換してクリップボードに格納するスクリプト
+# (--decode でLua文字列から元のテキストに戻す。--stdin で標準入出力を使う)
 def format_lua_string(text: str) -> str:
-    lines = text.splitlines()
-    formatted_lines = []
-
-    for i, line in enumerate(lines):
-        # エスケープ処理（\ → \\, " → \", 改行 → \n）
-        escaped = line.replace('\\', '\\\\').replace('"', '\\"')
-        if i < len(lines) - 1:
-            escaped += '\\n'
-        quoted = f'"{escaped}"'
-        if i < len(lines) - 1:
-            quoted += ' ..'
-        formatted_lines.append(quoted)
+    """テキストを1行毎に '..' で連結したLua文字列に変換する"""
+    # エスケープ処理（\ → \\, " → \", 改行 → \n, その他の制御文字 → \ddd）
+    parts = lua_string.split_lines(lua_string.encode(text.replace('\r\n', '\n')))
+    if len(parts) > 1 and not parts[-1]:
+        parts.pop()
+    return ' ..\n'.join(f'"{part}"' for part in parts)
 
-    return '\n'.join(formatted_lines)
+def parse_lua_string(source: str) -> str:
+    """'..' で連結されたLua文字列 (Expression やレンダースクリプトの値) を元のテキストに戻す"""
+    return lua_string.decode_literals(source)
 
 # クリップボード経由で処理する関数
-def process_clipboard():
+def process_clipboard(decode: bool = False):
+    import pyperclip
+
     text = pyperclip.paste()  # クリップボードの内容を取得
-    formatted_text = format_lua_string(text)
-    pyperclip.copy(formatted_text)  # 変換後のデータをクリップボードに格納
+    converted = parse_lua_string(text) if decode else format_lua_string(text)
+    pyperclip.copy(converted)  # 変換後のデータをクリップボードに格納
     print("変換完了！クリップボードにコピーされました。")
 
+# 標準入出力で処理する関数 (大きなスクリプトやパイプ処理用)
+def process_stdio(decode: bool = False):
+    sys.stdin.reconfigure(encoding='utf-8')
+    sys.stdout.reconfigure(encoding='utf-8')
+    text = sys.stdin.read()
+    sys.stdout.write(parse_lua_string(text) if decode else format_lua_string(text))
+
 # --- メイン処理 ---
 if __name__ == "__main__":
-    process_clipboard()
+    parser = argparse.ArgumentParser(description='テキストとLua文字列の相互変換')
+    parser.add_argument('-d', '--decode', action='store_true', help='Lua文字列を元のテキストに戻す')
+    parser.add_argument('--stdin', action='store_true', help='クリップボードの代わりに標準入出力を使う')
+    args = parser.parse_args()
+    if args.stdin:
+        process_stdio(args.decode)
+    else:
+        process_clipboard(args.decode)
@@ -0,0 +1,28 @@
+"""settingfile formatter をライブラリとして使うためのパッケージ
+
+    from settingfile_formatter import FormatterSession, format_text
+"""
+import importlib
+
+# 公開する名前は属性の初回参照時にimportする (drsetfmt.py 等のサブモジュールだけを使う場合の起動時間短縮のため)
+_LAZY_ATTRIBUTES = {
+    'FormatterSession': 'api',
+    'apply_formatting': 'api',
+    'default_session': 'api',
+    'format_bytes': 'api',
+    'format_many': 'api',
+    'format_text': 'api',
+    'ConfigLoader': 'config_loader',
+    'FormatterError': 'config_loader',
+    'VerifyError': 'verify',
+}
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module_name}', __name__), name)
+    globals()[name] = value
+    return value
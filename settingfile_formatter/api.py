@@ -0,0 +1,156 @@
+"""他の Python ツールからプロセス内で整形するための API
+
+    from settingfile_formatter import FormatterSession, format_text
+
+    session = FormatterSession(['all'])
+    formatted = session.format_text(text)
+    for formatted in session.format_many(texts, jobs=4):
+        ...
+
+FormatterSession は ConfigLoader と整形ルールのインスタンス (コンパイル済みの正規表現を含む) を保持し、呼び出しをまたいで使い回す。
+モジュールの format_text / format_bytes / format_many は既定の設定のセッションを共有する。
+drsetfmt.py の CLI もこのモジュールの apply_formatting で整形する。
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Sequence, Union, TYPE_CHECKING
+
+from .config_loader import ConfigLoader
+from .formatters.base import Document, apply_formatters
+
+if TYPE_CHECKING:
+    from .formatters.stats import FormatStats
+
+# 単一ファイルをツール単位で並列に整形する最小の大きさ (これより小さいとプロセス起動の時間が上回る)
+PARALLEL_MIN_SIZE = 512 * 1024
+# format_many で1回にワーカープロセスへ渡すテキストの数
+MANY_CHUNK_SIZE = 8
+
+
+def apply_formatting(content: str, rules: List[str], config: ConfigLoader,
+                     stats: Optional['FormatStats'] = None, jobs: Optional[int] = None, verify: bool = False) -> str:
+    """指定されたルールに従ってフォーマッターを適用する
+
+    整形対象を含まないルール (applies_to が偽) はトークン化せずに省略する。
+    stats が指定された場合、ルール毎の計測結果と省略したルールを記録する。
+    jobs が2以上で内容が大きい場合、トップレベルのツール単位に分割して並列に整形する。
+    verify が真の場合、整形前後のトークン列が等価でなければ VerifyError を送出する。
+    """
+    verifier = None
+    if verify:
+        from .verify import create_verifier
+        verifier = create_verifier(rules, config)
+    if jobs is not None and jobs > 1 and len(content) >= PARALLEL_MIN_SIZE:
+        from .parallel import format_parallel
+        formatted = format_parallel(content, rules, config, jobs, stats)
+        if verifier is not None:
+            verifier.check(content, formatted)
+        return formatted
+    doc = Document(content.expandtabs(4))     # タブを4スペースに変換
+    if verifier is not None:
+        doc.track_changes()
+    apply_formatters(doc, config.get_named_formatters(rules), stats)
+    if verifier is not None and not verifier.check_changes(doc):
+        # 変更された範囲のみでは確認できない場合は文書全体を比較し、食い違った位置を報告する
+        original = Document(doc.original_text, doc.tokenizer)
+        verifier.check_tokens(content, doc.text, original.tokens_per_line, doc.tokens_per_line)
+    if stats is not None:
+        stats.files += 1
+    return doc.text
+
+
+class FormatterSession:
+    """設定と整形ルールのインスタンスを保持し、複数のテキストの整形に使い回す
+
+    rules は各メソッドで rules を省略した場合に適用するルール (既定は 'all')。
+    生成時にルールを読み込むため、存在しないルール名はここで FormatterError になる。
+    verify が真の場合、整形前後のトークン列が等価でなければ VerifyError を送出する。
+    """
+
+    def __init__(self, rules: Optional[Sequence[str]] = None, config: Optional[ConfigLoader] = None,
+                 config_file: Optional[str] = None, verify: bool = False):
+        self.config = config or ConfigLoader(config_file)
+        self.rules = list(rules or ['all'])
+        self.verify = verify
+        self.config.get_formatters(self.rules)
+
+    def format_text(self, text: str, rules: Optional[Sequence[str]] = None,
+                    stats: Optional['FormatStats'] = None, jobs: Optional[int] = None) -> str:
+        """テキストを整形する (改行は '\\n' に統一する。jobs は大きなテキストをツール単位で並列に整形する際のプロセス数)"""
+        rules = list(rules) if rules else self.rules
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        return apply_formatting(text, rules, self.config, stats, jobs, self.verify)
+
+    def format_bytes(self, data: bytes, rules: Optional[Sequence[str]] = None,
+                     stats: Optional['FormatStats'] = None) -> bytes:
+        """UTF-8 のバイト列を整形する (改行文字は元の内容に合わせる。変更が無ければ data をそのまま返す)"""
+        newline = '\r\n' if b'\r\n' in data else '\n'
+        content = data.decode('utf-8').replace('\r\n', '\n')
+        formatted = self.format_text(content, rules, stats)
+        if formatted == content:
+            return data
+        return formatted.replace('\n', newline).encode('utf-8')
+
+    def format_many(self, texts: Iterable[str], rules: Optional[Sequence[str]] = None,
+                    jobs: Optional[int] = None) -> Iterator[str]:
+        """複数のテキストを整形し、入力と同じ順に整形結果を生成する
+
+        jobs が2以上の場合はプロセスプールで並列に整形する (各ワーカーは同じ設定のセッションを1度だけ生成する)。
+        例外は該当するテキストの結果を取り出す時点で送出する。
+        """
+        rules = list(rules) if rules else self.rules
+        if jobs is None or jobs <= 1:
+            for text in texts:
+                yield self.format_text(text, rules)
+            return
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=(str(self.config.config_path.resolve()), rules, self.verify)) as executor:
+            for result in executor.map(_format_worker, texts, chunksize=MANY_CHUNK_SIZE):
+                if isinstance(result, Exception):
+                    raise result
+                yield result
+
+
+# ワーカープロセス毎に1度だけ生成するセッション
+_worker_session: Optional[FormatterSession] = None
+
+
+def _init_worker(config_file: str, rules: List[str], verify: bool):
+    global _worker_session
+    _worker_session = FormatterSession(rules, config_file=config_file, verify=verify)
+
+
+def _format_worker(text: str) -> Union[str, Exception]:
+    """1テキストを整形する (例外は同じ単位で渡した他のテキストの結果を失わないよう、結果として返す)"""
+    try:
+        return _worker_session.format_text(text)
+    except Exception as e:
+        return e
+
+
+# モジュールの関数で共有する既定のセッション (最初の呼び出しで生成する)
+_default_session: Optional[FormatterSession] = None
+
+
+def default_session() -> FormatterSession:
+    """既定の設定 (本モジュールと同じディレクトリの config.json) のセッションを返す"""
+    global _default_session
+    if _default_session is None:
+        _default_session = FormatterSession()
+    return _default_session
+
+
+def format_text(text: str, rules: Optional[Sequence[str]] = None, jobs: Optional[int] = None) -> str:
+    """既定のセッションでテキストを整形する"""
+    return default_session().format_text(text, rules, jobs=jobs)
+
+
+def format_bytes(data: bytes, rules: Optional[Sequence[str]] = None) -> bytes:
+    """既定のセッションで UTF-8 のバイト列を整形する"""
+    return default_session().format_bytes(data, rules)
+
+
+def format_many(texts: Iterable[str], rules: Optional[Sequence[str]] = None,
+                jobs: Optional[int] = None) -> Iterator[str]:
+    """既定のセッションで複数のテキストを整形する"""
+    return default_session().format_many(texts, rules, jobs)
@@ -0,0 +1,125 @@
+import copy
+import shutil
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+from .api import FormatterSession
+from .config_loader import ConfigLoader
+from .file_utils import AtomicFile
+
+if TYPE_CHECKING:
+    from .formatters.stats import FormatStats
+
+SETTING_SUFFIX = '.setting'
+# 非 .setting メンバーを複製する際の読み書きの単位
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# ワーカープロセス毎に1度だけ生成するセッション
+_worker_session: Optional[FormatterSession] = None
+
+
+def _init_worker(config_file: str, rules: List[str], verify: bool):
+    global _worker_session
+    _worker_session = FormatterSession(rules, ConfigLoader(config_file), verify=verify)
+
+
+def _format_member(data: bytes, profile: bool) -> Tuple[bytes, Optional['FormatStats']]:
+    """1メンバーを整形する (ワーカープロセスで実行)"""
+    stats = None
+    if profile:
+        from .formatters.stats import FormatStats
+        stats = FormatStats()
+    return _worker_session.format_bytes(data, stats=stats), stats
+
+
+def format_archive(input_path: Path, output_path: Path, rules: List[str], config: ConfigLoader,
+                   stats: Optional['FormatStats'] = None, jobs: Optional[int] = None, backup: bool = False,
+                   verify: bool = False, session: Optional[FormatterSession] = None) -> bool:
+    """.drfx / .zip 内の .setting メンバーを整形した新しいアーカイブを出力先に書き込み、変更の有無を返す
+
+    展開せずにメンバーを順に読み、.setting 以外のメンバーは圧縮方式・日時・属性を保ったまま複製する。
+    jobs が2以上で .setting メンバーが複数ある場合はプロセスプールで並列に整形する。
+    上書き保存で内容が変わらなかった場合は置き換えない。
+    verify が真の場合、整形前後のトークン列が食い違うメンバーがあれば VerifyError を送出する (出力は破棄する)。
+    session は同じ rules / config / verify の FormatterSession (省略時はアーカイブ毎に1つ生成し、全メンバーで使い回す)。
+    """
+    session = session or FormatterSession(rules, config, verify=verify)
+    try:
+        with zipfile.ZipFile(input_path) as source:
+            members = source.infolist()
+            settings = [info for info in members if _is_setting(info)]
+            formatted: Dict[str, bytes] = {}
+            if jobs is not None and jobs > 1 and len(settings) > 1:
+                formatted = _format_parallel(source, settings, rules, config, jobs, stats, verify)
+
+            changed = False
+            with AtomicFile(output_path, input_path, backup) as out:
+                with zipfile.ZipFile(out, 'w') as target:
+                    target.comment = source.comment
+                    for info in members:
+                        if not _is_setting(info):
+                            _copy_member(source, target, info)
+                            continue
+                        data = source.read(info)
+                        if info.filename in formatted:
+                            result = formatted[info.filename]
+                        else:
+                            with _member_errors(info.filename):
+                                result = session.format_bytes(data, stats=stats)
+                        changed = changed or result != data
+                        target.writestr(copy.copy(info), result)
+                if changed or output_path != input_path:
+                    out.commit()
+    except (zipfile.BadZipFile, UnicodeDecodeError) as e:
+        raise IOError(f'アーカイブの読み込みに失敗しました: {input_path}') from e
+
+    if stats is not None:
+        stats.bytes_read += input_path.stat().st_size
+        if changed or output_path != input_path:
+            stats.bytes_written += output_path.stat().st_size
+        else:
+            stats.writes_skipped += 1
+    return changed
+
+
+@contextmanager
+def _member_errors(name: str) -> Iterator[None]:
+    """検証エラーにメンバー名を付ける"""
+    from .verify import VerifyError
+    try:
+        yield
+    except VerifyError as e:
+        raise e.with_source(name) from None
+
+
+def _is_setting(info: zipfile.ZipInfo) -> bool:
+    return not info.is_dir() and info.filename.lower().endswith(SETTING_SUFFIX)
+
+
+def _copy_member(source: zipfile.ZipFile, target: zipfile.ZipFile, info: zipfile.ZipInfo):
+    """メンバーを展開先のファイルを作らずに逐次複製する"""
+    if info.is_dir():
+        target.writestr(copy.copy(info), b'')
+        return
+    with source.open(info) as src, target.open(copy.copy(info), 'w') as dst:
+        shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+
+
+def _format_parallel(source: zipfile.ZipFile, settings: List[zipfile.ZipInfo], rules: List[str],
+                     config: ConfigLoader, jobs: int, stats: Optional['FormatStats'],
+                     verify: bool = False) -> Dict[str, bytes]:
+    """.setting メンバーをプロセスプールで並列に整形し、メンバー名毎の結果を返す"""
+    with ProcessPoolExecutor(max_workers=min(jobs, len(settings)), initializer=_init_worker,
+                             initargs=(str(config.config_path.resolve()), rules, verify)) as executor:
+        futures = {info.filename: executor.submit(_format_member, source.read(info), stats is not None)
+                   for info in settings}
+        results = {}
+        for name, future in futures.items():
+            with _member_errors(name):
+                results[name], member_stats = future.result()
+            if stats is not None:
+                stats.merge(member_stats)
+    return results
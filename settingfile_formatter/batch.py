@@ -0,0 +1,172 @@
+import glob
+import os
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional
+
+from .cache import FormatCache
+from .config_loader import ConfigLoader
+from .file_utils import GLOB_CHARS
+from .formatters.stats import FormatStats
+
+SETTING_SUFFIX = '.setting'
+# ディレクトリとglobから対象とする拡張子 (.zip は明示的に指定された場合のみ対象とする)
+TARGET_SUFFIXES = (SETTING_SUFFIX, '.drfx')
+
+# ワーカープロセス毎に1度だけ生成する設定とキャッシュ
+_worker_config: Optional[ConfigLoader] = None
+_worker_cache: Optional[FormatCache] = None
+
+
+@dataclass
+class FileResult:
+    """1ファイル分の処理結果"""
+    path: str
+    status: str                      # 'changed' | 'unchanged' | 'skipped' | 'failed'
+    output_path: Optional[str] = None
+    error: Optional[str] = None
+    cache_entry: Optional[dict] = None
+    stats: Optional[FormatStats] = None
+
+
+@dataclass
+class BatchSummary:
+    """バッチ処理全体の集計結果"""
+    results: List[FileResult] = field(default_factory=list)
+    wall_time: float = 0.0
+
+    def count(self, status: str) -> int:
+        return sum(1 for r in self.results if r.status == status)
+
+    @property
+    def failed(self) -> List[FileResult]:
+        return [r for r in self.results if r.status == 'failed']
+
+    def report(self) -> str:
+        lines = ['--- 処理結果 ---']
+        lines.extend(f'✗ {r.path}: {r.error}' for r in self.failed)
+        lines.append(
+            f"変更: {self.count('changed')} / 変更なし: {self.count('unchanged')}"
+            f" / スキップ: {self.count('skipped')} / 失敗: {self.count('failed')}"
+            f' (合計 {len(self.results)} ファイル, {self.wall_time:.2f} 秒)'
+        )
+        return '\n'.join(lines)
+
+
+def discover_files(paths: Iterable[str], prefix: str = 'fixed_') -> List[Path]:
+    """ファイル、ディレクトリ (再帰)、globパターンから処理対象ファイルを列挙する
+
+    ディレクトリとglobからは .setting と .drfx ファイルのみを対象とし、
+    本ツールの出力 (prefix付きファイル) は除外する。
+    """
+    found = {}
+
+    def add_candidate(candidate: Path):
+        if candidate.suffix in TARGET_SUFFIXES and not candidate.name.startswith(prefix):
+            found.setdefault(candidate.resolve(), candidate)
+
+    for path_str in paths:
+        path = Path(path_str)
+        if any(c in path_str for c in GLOB_CHARS):
+            for match in sorted(glob.glob(path_str, recursive=True)):
+                match_path = Path(match)
+                if match_path.is_dir():
+                    for candidate in sorted(match_path.rglob('*')):
+                        add_candidate(candidate)
+                elif match_path.is_file():
+                    add_candidate(match_path)
+        elif path.is_dir():
+            for candidate in sorted(path.rglob('*')):
+                add_candidate(candidate)
+        else:
+            # 明示的に指定されたファイルは拡張子に関わらず対象とする (存在確認は prepare_file で行う)
+            found.setdefault(path.resolve(), path)
+    return list(found.values())
+
+
+def _init_worker(config_file: str, use_cache: bool, profile: bool):
+    global _worker_config, _worker_cache
+    _worker_config = ConfigLoader(config_file)
+    _worker_cache = FormatCache(_worker_config.config_path) if use_cache else None
+    if profile and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def _process_one(file_path: str, overwrite: bool, backup: bool, rules: List[str], force: bool, profile: bool,
+                 stream: bool = False, config: Optional[ConfigLoader] = None,
+                 cache: Optional[FormatCache] = None, verify: bool = False, incremental: bool = False) -> FileResult:
+    """1ファイルを処理し、例外を結果として返す"""
+    # drsetfmt との循環importを避けるため関数内でimportする
+    from .drsetfmt import process_file
+
+    config = config or _worker_config
+    cache = cache or _worker_cache
+    collected = []
+    on_stats = (lambda _path, stats: collected.append(stats)) if profile else None
+    try:
+        output_path, status = process_file(file_path, overwrite, backup, rules, config,
+                                           verbose=False, cache=cache, force=force, on_stats=on_stats, stream=stream,
+                                           verify=verify, incremental=incremental)
+    except Exception as e:
+        return FileResult(file_path, 'failed', error=str(e) or type(e).__name__)
+    # キャッシュへの書き込みは親プロセスでまとめて行う
+    entry = cache.pop_entry(Path(file_path)) if cache is not None and cache is _worker_cache else None
+    return FileResult(file_path, status, str(output_path), cache_entry=entry,
+                      stats=collected[0] if collected else None)
+
+
+def run_batch(paths: Iterable[str], overwrite: bool, backup: bool, rules: List[str], config: ConfigLoader,
+              jobs: Optional[int] = None, cache: Optional[FormatCache] = None, force: bool = False,
+              on_stats: Optional[Callable[[str, FormatStats], None]] = None, stream: bool = False,
+              verify: bool = False, incremental: bool = False) -> BatchSummary:
+    """複数ファイルをプロセスプールで並列に整形する
+
+    on_stats が指定された場合、各ファイルのルール毎の計測結果を親プロセスで順に渡す。
+    """
+    start = time.perf_counter()
+    files = [str(p) for p in discover_files(paths)]
+    jobs = max(1, jobs or os.cpu_count() or 1)
+    summary = BatchSummary()
+
+    if jobs == 1 or len(files) <= 1:
+        for file_path in files:
+            result = _process_one(file_path, overwrite, backup, rules, force, on_stats is not None, stream, config, cache,
+                                  verify, incremental)
+            _report_stats(result, on_stats)
+            _print_progress(result)
+            summary.results.append(result)
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(files)), initializer=_init_worker,
+                                 initargs=(str(config.config_path.resolve()), cache is not None,
+                                           on_stats is not None)) as executor:
+            futures = [executor.submit(_process_one, f, overwrite, backup, rules, force, on_stats is not None, stream,
+                                       verify=verify, incremental=incremental)
+                       for f in files]
+            for future in as_completed(futures):
+                result = future.result()
+                if cache is not None and result.cache_entry is not None:
+                    cache.merge_entry(FormatCache.key_for(Path(result.path)), result.cache_entry)
+                _report_stats(result, on_stats)
+                _print_progress(result)
+                summary.results.append(result)
+        order = {f: i for i, f in enumerate(files)}
+        summary.results.sort(key=lambda r: order[r.path])
+
+    summary.wall_time = time.perf_counter() - start
+    return summary
+
+
+def _report_stats(result: FileResult, on_stats: Optional[Callable[[str, FormatStats], None]]):
+    if on_stats is not None and result.stats is not None:
+        on_stats(result.path, result.stats)
+
+
+def _print_progress(result: FileResult):
+    if result.status == 'failed':
+        print(f'✗ 失敗しました: {result.path}')
+    else:
+        label = {'changed': '変更あり', 'unchanged': '変更なし', 'skipped': 'スキップ'}[result.status]
+        print(f'✓ {label}: {result.output_path}')
@@ -0,0 +1,6 @@
+"""settingfile formatter のベンチマーク
+
+実行はリポジトリのルート (settingfile_formatter の親ディレクトリ) から行う:
+    python -m settingfile_formatter.benchmarks.run
+    python -m settingfile_formatter.benchmarks.bench_tokenizer
+"""
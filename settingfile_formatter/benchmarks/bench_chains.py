@@ -0,0 +1,84 @@
+"""文字列連結 (`key = "..." .. "..."`) の検出のスケーリング比較ベンチマーク
+
+旧実装の DOTALL 正規表現 (UserControlsFormatter のプレースホルダー置換で使用していたもの) と
+StringChainScanner を、後戻りが多発する入力で比較する。
+
+使い方:
+    python -m settingfile_formatter.benchmarks.bench_chains [--repeat N] [--legacy-limit 秒]
+"""
+import argparse
+import re
+from typing import List, Optional
+
+from .corpus import CorpusSpec, generate
+from .run import best_time, scaling_exponent
+from ..formatters.base import StringChainScanner
+
+LEGACY_PATTERN = re.compile(
+    r'(\b[a-zA-Z_]\w*\b)\s*=\s*((?:"(?:\\.|[^"])*?"\s*\.\.\s*)+"(?:\\.|[^"])*?")',
+    re.DOTALL
+)
+
+
+def escaped_backslashes(n: int) -> str:
+    """閉じられていない文字列中に '\\\\' が n 個並ぶ連結 (旧実装では指数時間)"""
+    return 'INP_Default = "a" .. "' + '\\\\' * n + '\n'
+
+
+def long_script_chain(n: int) -> str:
+    """n 行のLuaスクリプトを1行ずつ連結し、最後が文字列以外で終わる連結"""
+    parts = ' ..\n    '.join(f'"local v{i} = \\"{i}..{i + 1}\\"\\n"' for i in range(n))
+    return f'FrameRenderScript = Input {{ Value =\n    {parts} .. suffix, }},\n'
+
+
+def synthetic_file(n: int) -> str:
+    """UserControls とスクリプト文字列を含む合成settingファイル"""
+    return generate(CorpusSpec(tools=n, user_controls=6, script_lines=16))
+
+
+# (名前, 入力生成関数, サイズ, 旧実装を計測する最大サイズ)
+CASES = [
+    ('escaped_backslashes', escaped_backslashes, [8, 10, 12, 14, 1000, 10000, 100000], 14),
+    ('long_script_chain', long_script_chain, [250, 500, 1000, 2000], None),
+    ('synthetic_file', synthetic_file, [50, 100, 200, 400], None),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文字列連結の検出: 旧正規表現 / StringChainScanner')
+    parser.add_argument('--repeat', type=int, default=3, help='計測回数 (最速値を採用)')
+    parser.add_argument('--legacy-limit', type=float, default=5.0, metavar='SEC',
+                        help='旧実装の1回の計測がこの秒数を超えたら以降のサイズを省略する')
+    args = parser.parse_args()
+
+    scanner = StringChainScanner()
+    print(f"{'case':<22}{'size':>8}{'bytes':>10}{'legacy(ms)':>14}{'scanner(ms)':>14}")
+    for name, make, sizes, legacy_max in CASES:
+        sizes_bytes: List[float] = []
+        legacy_bytes: List[float] = []
+        legacy_times: List[float] = []
+        scanner_times: List[float] = []
+        legacy_skipped = False
+        for size in sizes:
+            text = make(size)
+            scan_time = best_time(lambda: scanner.scan(text), args.repeat)
+            legacy_time: Optional[float] = None
+            if not legacy_skipped and (legacy_max is None or size <= legacy_max):
+                legacy_time = best_time(lambda: LEGACY_PATTERN.findall(text), 1)
+                legacy_skipped = legacy_time > args.legacy_limit
+                legacy_bytes.append(len(text))
+                legacy_times.append(legacy_time)
+            sizes_bytes.append(len(text))
+            scanner_times.append(scan_time)
+            legacy = f'{legacy_time * 1000:.2f}' if legacy_time is not None else '-'
+            print(f'{name:<22}{size:>8}{len(text):>10}{legacy:>14}{scan_time * 1000:>14.2f}')
+        print(f"{name:<22}{'scaling exponent':>18}: legacy {_exponent(legacy_bytes, legacy_times)}"
+              f' / scanner {scaling_exponent(sizes_bytes, scanner_times):.2f}')
+
+
+def _exponent(sizes: List[float], times: List[float]) -> str:
+    return f'{scaling_exponent(sizes, times):.2f}' if len(times) > 1 else '-'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""compact ルールによるサイズ削減と読み込み時間への影響の計測
+
+使い方:
+    python -m settingfile_formatter.benchmarks.bench_compact [settingファイル ...] [--repeat N]
+ファイル未指定時は合成したsettingファイルを使用する。
+元の内容・'all' で整形した内容・compact を適用した内容のそれぞれについて、
+バイト数、zip (.drfx) に格納した場合の圧縮後のバイト数、Tokenizer でトークン化する時間 (読み込み時間の目安) を表示する。
+"""
+import argparse
+import zlib
+from pathlib import Path
+
+from .bench_tokenizer import measure
+from .corpus import CorpusSpec, generate
+from ..config_loader import ConfigLoader
+from ..drsetfmt import apply_formatting
+from ..formatters.base import Tokenizer
+
+
+def main():
+    parser = argparse.ArgumentParser(description='compact ルールのサイズ削減・読み込み時間の計測')
+    parser.add_argument('files', nargs='*', help='計測対象のsettingファイル')
+    parser.add_argument('--repeat', type=int, default=5, help='計測回数 (最速値を採用)')
+    args = parser.parse_args()
+
+    if args.files:
+        samples = [(Path(f).name, Path(f).read_text(encoding='utf-8')) for f in args.files]
+    else:
+        samples = [(f'synthetic x{n}', generate(CorpusSpec(tools=n, instance_inputs=n))) for n in (100, 1000)]
+
+    config = ConfigLoader()
+    tokenizer = Tokenizer()
+    print(f"{'input':<24}{'variant':<10}{'bytes':>12}{'ratio':>8}{'zipped':>12}{'ratio':>8}{'tokenize(ms)':>14}")
+    for name, content in samples:
+        variants = {
+            'original': content,
+            'all': apply_formatting(content, ['all'], config),
+            'compact': apply_formatting(content, ['compact'], config),
+        }
+        base_size = len(content.encode('utf-8'))
+        base_zipped = len(zlib.compress(content.encode('utf-8')))
+        for variant, text in variants.items():
+            data = text.encode('utf-8')
+            zipped = len(zlib.compress(data))
+            tokenize_ms = measure(tokenizer.scan_content, text, args.repeat) * 1000
+            print(f'{name:<24}{variant:<10}{len(data):>12}{len(data) / base_size:>8.2f}'
+                  f'{zipped:>12}{zipped / base_zipped:>8.2f}{tokenize_ms:>14.1f}')
+
+
+if __name__ == '__main__':
+    main()
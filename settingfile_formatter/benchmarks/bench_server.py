@@ -0,0 +1,68 @@
+"""常駐サーバー (--server) とコールド起動の CLI の整形1回あたりの待ち時間の比較
+
+使い方:
+    python -m settingfile_formatter.benchmarks.bench_server [--rule RULE] [--runs N] [--tools N]
+CLI は1回毎に drsetfmt.py を起動し、サーバーは1つのプロセスに標準入出力で format を繰り返し要求する。
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+from .corpus import CorpusSpec, generate
+from .startup import PROJECT_DIR, measure_startup
+
+
+def measure_server(text: str, rule: str, runs: int) -> List[float]:
+    """サーバーへの format 要求の往復時間 (秒) のリストを返す"""
+    command = [sys.executable, str(PROJECT_DIR / 'drsetfmt.py'), '--server']
+    with subprocess.Popen(command, cwd=PROJECT_DIR, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                          encoding='utf-8') as process:
+        def call(request_id: int, method: str, params: dict) -> dict:
+            process.stdin.write(json.dumps({'jsonrpc': '2.0', 'id': request_id, 'method': method,
+                                            'params': params}) + '\n')
+            process.stdin.flush()
+            return json.loads(process.stdout.readline())
+
+        # 初回は起動を待つため除外する
+        call(0, 'format', {'text': text, 'rules': [rule]})
+        times = []
+        for i in range(1, runs + 1):
+            start = time.perf_counter()
+            response = call(i, 'format', {'text': text, 'rules': [rule]})
+            times.append(time.perf_counter() - start)
+            if 'error' in response:
+                raise RuntimeError(response['error']['message'])
+        call(runs + 1, 'shutdown', {})
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description='常駐サーバーとコールド起動の比較')
+    parser.add_argument('--rule', default='all', help='適用する整形ルール')
+    parser.add_argument('--runs', type=int, default=10, help='計測回数')
+    parser.add_argument('--tools', type=int, default=5, help='合成ファイルのツール数')
+    args = parser.parse_args()
+
+    text = generate(CorpusSpec(tools=args.tools, instance_inputs=5))
+    with tempfile.TemporaryDirectory() as tmp:
+        target = Path(tmp) / 'server.setting'
+        target.write_text(text, encoding='utf-8')
+        measure_startup(PROJECT_DIR, target, args.rule, 1)
+        cold = measure_startup(PROJECT_DIR, target, args.rule, args.runs)
+    warm = measure_server(text, args.rule, args.runs)
+
+    print(f'{len(text)} bytes, rule={args.rule}')
+    print(f"{'mode':<10}{'median(ms)':>12}{'min(ms)':>10}")
+    for name, times in (('cli', cold), ('server', warm)):
+        print(f'{name:<10}{statistics.median(times) * 1000:>12.1f}{min(times) * 1000:>10.1f}')
+    print(f'speedup: x{statistics.median(cold) / statistics.median(warm):.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Tokenizer (文字列リスト / TokenLine) のスループット比較ベンチマーク
+
+scan は findall と先頭文字の変換で種別を求める現在の実装、finditer はマッチ毎に種別を求める以前の実装。
+
+使い方:
+    python -m settingfile_formatter.benchmarks.bench_tokenizer [settingファイル ...] [--repeat N]
+ファイル未指定時は合成したsettingファイルを使用する。
+"""
+import argparse
+import time
+from pathlib import Path
+from typing import List
+
+from .corpus import CorpusSpec, generate
+from ..formatters.base import TokenLine, Tokenizer
+
+
+def finditer_scan_line(tokenizer: Tokenizer, line: str) -> TokenLine:
+    """マッチ毎にグループ番号から種別を求める以前の scan_line (比較用)"""
+    tokens, kinds = [], []
+    punct, punct_kinds = Tokenizer.PUNCT, Tokenizer.PUNCT_KINDS
+    for match in tokenizer.pattern.finditer(line):
+        token, kind = match.group(), match.lastindex
+        if kind == punct:
+            kind = punct_kinds.get(token, punct)
+        tokens.append(token)
+        kinds.append(kind)
+    return TokenLine(tokens, bytes(kinds))
+
+
+def finditer_scan_content(tokenizer: Tokenizer, content: str) -> List[TokenLine]:
+    return [finditer_scan_line(tokenizer, line) for line in content.splitlines()]
+
+
+def measure(func, content: str, repeat: int) -> float:
+    """最速の実行時間 (秒) を返す"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(content)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tokenizer スループット比較')
+    parser.add_argument('files', nargs='*', help='計測対象のsettingファイル')
+    parser.add_argument('--repeat', type=int, default=5, help='計測回数 (最速値を採用)')
+    args = parser.parse_args()
+
+    if args.files:
+        samples = [(f, Path(f).read_text(encoding='utf-8')) for f in args.files]
+    else:
+        samples = [(f'synthetic x{n}', generate(CorpusSpec(tools=n, instance_inputs=n))) for n in (100, 1000, 5000)]
+
+    tokenizer = Tokenizer()
+    print(f"{'input':<24}{'size(MB)':>10}{'tokenizer(MB/s)':>18}{'finditer(MB/s)':>16}{'scan(MB/s)':>14}")
+    for name, content in samples:
+        # 種別コードは以前の実装と一致すること
+        scanned = tokenizer.scan_content(content)
+        legacy = finditer_scan_content(tokenizer, content)
+        assert scanned == legacy and [t.kinds for t in scanned] == [t.kinds for t in legacy], name
+        size = len(content.encode('utf-8')) / 1e6
+        tokenize_time = measure(tokenizer.tokenize_content, content, args.repeat)
+        finditer_time = measure(lambda text: finditer_scan_content(tokenizer, text), content, args.repeat)
+        scan_time = measure(tokenizer.scan_content, content, args.repeat)
+        print(f'{name:<24}{size:>10.2f}{size / tokenize_time:>18.2f}{size / finditer_time:>16.2f}'
+              f'{size / scan_time:>14.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""ベンチマーク用の合成settingファイル生成
+
+DaVinci Resolve が書き出すマクロ (タブインデント、1行の UserControls、
+'\\n' を含む1行のスクリプト文字列、番号の飛んだ InstanceInput) を模したファイルを生成する。
+"""
+import random
+from dataclasses import dataclass, asdict
+from typing import List
+
+
+@dataclass
+class CorpusSpec:
+    """生成するsettingファイルの規模"""
+    tools: int = 50                 # マクロ内のツール数
+    user_controls: int = 4          # ツール毎の UserControls 要素数
+    instance_inputs: int = 20       # マクロの InstanceInput 数
+    script_lines: int = 8           # ツール毎のスクリプト文字列の行数 (0 で無し)
+    nesting_depth: int = 3          # ツール毎の入れ子テーブルの深さ
+    seed: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _script(rng: random.Random, lines: int) -> str:
+    """'\\n' でエスケープされた1行のLuaスクリプト文字列"""
+    body = []
+    for i in range(lines):
+        indent = '    ' * (i % 3)
+        body.append(f'{indent}local v{i} = math.sin(time * {rng.randint(1, 9)}) -- \\"{i}\\"')
+    return '\\n'.join(body) + '\\n'
+
+
+def _nested(depth: int, level: int = 0) -> str:
+    if level >= depth:
+        return f'{{ {level}, {level + 0.5} }}'
+    return f'{{ Level = {level}, Child = {_nested(depth, level + 1)}, }}'
+
+
+def _user_controls(rng: random.Random, tool: int, count: int) -> str:
+    controls = []
+    for c in range(count):
+        if c % 3 == 2:
+            # string_literal 整形済みの連結文字列を含むコントロール
+            default = f'"line {c}\\n" .. "line {c + 1}"'
+            data_type = '"Text"'
+        else:
+            default = f'{rng.random():.3f}'
+            data_type = '"Number"'
+        controls.append(
+            f'Ctrl{tool}_{c} = {{ LINKS_Name = "Control {c}", LINKID_DataType = {data_type}, '
+            f'INP_Default = {default}, ICS_ControlPage = "Controls", }}'
+        )
+    return 'UserControls = ordered() { ' + ', '.join(controls) + ' }'
+
+
+def _tool(rng: random.Random, spec: CorpusSpec, n: int) -> List[str]:
+    t = '\t' * 4
+    lines = [
+        f'{t}Tool{n} = Custom {{',
+        f'{t}\tCtrlWZoom = false,',
+        f'{t}\tInputs = {{',
+        f'{t}\t\tNumberIn1 = Input {{ Value = {rng.uniform(-1, 1):.6f}, }},',
+        f'{t}\t\tPointIn1 = Input {{ Value = {{ {rng.random():.4f}, {rng.random():.4f} }}, }},',
+    ]
+    if spec.script_lines:
+        lines.append(f'{t}\t\tFrameRenderScript = Input {{ Value = "{_script(rng, spec.script_lines)}", }},')
+    if spec.nesting_depth:
+        lines.append(f'{t}\t\tNested = Input {{ Value = {_nested(spec.nesting_depth)}, }},')
+    if n > 1:
+        lines.append(f'{t}\t\tImage = Input {{ SourceOp = "Tool{n - 1}", Source = "Output", }},')
+    lines.append(f'{t}\t}},')
+    lines.append(f'{t}\tViewInfo = OperatorInfo {{ Pos = {{ {n * 110}, {rng.randint(-50, 50)}.5 }} }},')
+    if spec.user_controls:
+        lines.append(f'{t}\t{_user_controls(rng, n, spec.user_controls)}')
+    lines.append(f'{t}}},')
+    return lines
+
+
+def generate(spec: CorpusSpec) -> str:
+    """spec に従って合成settingファイルの内容を返す"""
+    rng = random.Random(spec.seed)
+    numbers = list(range(1, spec.instance_inputs + 1))
+    rng.shuffle(numbers)
+
+    lines = ['{', '\tTools = ordered() {', '\t\tMacro = GroupOperator {', '\t\t\tInputs = ordered() {']
+    for i, number in enumerate(numbers):
+        tool = i % max(spec.tools, 1) + 1
+        lines.append(f'\t\t\t\tInput{number} = InstanceInput {{')
+        lines.append(f'\t\t\t\t\tSourceOp = "Tool{tool}",')
+        lines.append('\t\t\t\t\tSource = "NumberIn1",')
+        lines.append('\t\t\t\t},')
+    lines.extend([
+        '\t\t\t},',
+        '\t\t\tOutputs = {',
+        f'\t\t\t\tMainOutput1 = InstanceOutput {{ SourceOp = "Tool{spec.tools}", Source = "Output", }}',
+        '\t\t\t},',
+        '\t\t\tViewInfo = GroupInfo { Pos = { 0, 0 } },',
+        '\t\t\tTools = ordered() {',
+    ])
+    for n in range(1, spec.tools + 1):
+        lines.extend(_tool(rng, spec, n))
+    lines.extend(['\t\t\t},', '\t\t},', '\t},', '\tActiveTool = "Macro"', '}'])
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,224 @@
+"""各整形ルールと apply_formatting 全体のスケーリング計測
+
+使い方:
+    python -m settingfile_formatter.benchmarks.run [--sizes 50 100 200 400] [--output result.json] [--baseline old.json]
+括弧の索引 (BraceIndex) については、索引の作成と問い合わせの合計時間を索引導入前の走査と比較する。
+"""
+import argparse
+import json
+import math
+import platform
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from .corpus import CorpusSpec, generate
+from ..cache import formatter_fingerprint
+from ..config_loader import ConfigLoader
+from ..drsetfmt import apply_formatting
+from ..formatters.base import TokenLine, Tokenizer
+from ..formatters.string_literal import StringLiteralFormatter
+from ..formatters.user_controls import UserControlsFormatter
+
+CHAIN = 'apply_formatting(all)'
+
+
+def best_time(func: Callable[[], object], repeat: int) -> float:
+    """最速の実行時間 (秒) を返す"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(func: Callable[[], object]) -> int:
+    """実行中のピークメモリ (バイト) を返す"""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def scaling_exponent(sizes: List[float], times: List[float]) -> float:
+    """log(時間) を log(サイズ) に最小二乗で当てはめた傾き (1.0 で線形)"""
+    points = [(math.log(s), math.log(t)) for s, t in zip(sizes, times) if s > 0 and t > 0]
+    if len(points) < 2:
+        return float('nan')
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    denom = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / denom if denom else float('nan')
+
+
+def build_targets(config: ConfigLoader) -> Dict[str, Callable[[str], str]]:
+    """計測対象 (各整形ルールと全ルールの連続適用) を返す"""
+    targets = {}
+    for rule in config.get_formatter_choices():
+        if rule == 'all':
+            continue
+        formatter = config.get_formatters([rule])[0]
+        targets[rule] = formatter.format_content
+    targets[CHAIN] = lambda content: apply_formatting(content, ['all'], config)
+    return targets
+
+
+def legacy_parent_indent(lines: List[str], tokens_per_line: List[TokenLine], line_num: int, token_idx: int) -> str:
+    """索引導入前の StringLiteralFormatter._get_parent_indent (対応の無い '{' まで逆方向に走査する)"""
+    nest_level = 0
+    for i in range(line_num, -1, -1):
+        tokens = tokens_per_line[i][:token_idx] if i == line_num else tokens_per_line[i]
+        for token in reversed(tokens):
+            nest_level += 1 if token == '}' else -1 if token == '{' else 0
+            if nest_level < 0:
+                return lines[i][:len(lines[i]) - len(lines[i].lstrip())]
+    return ""
+
+
+def legacy_extract_blocks(tokens_per_line: List[TokenLine], start_tokens: List[str]) -> List[tuple]:
+    """索引導入前の ContentFormatter._extract_blocks (ブロック内の全トークンでネストレベルを数える)"""
+    blocks = []
+    start_line = -1
+    nest_level = 0
+    for i, line_tokens in enumerate(tokens_per_line):
+        if start_line == -1 and line_tokens.startswith(start_tokens):
+            start_line = i
+            nest_level = 0
+        if start_line != -1:
+            for token in line_tokens:
+                nest_level += 1 if token == '{' else -1 if token == '}' else 0
+            if nest_level == 0:
+                blocks.append((start_line, i))
+                start_line = -1
+    return blocks
+
+
+def string_block(count: int) -> str:
+    """1つのテーブルに '\\n' を含む文字列が並ぶ入力 (索引導入前は対象毎にテーブルの先頭まで遡って走査する)"""
+    fields = [f'        Line{i} = "first {i}\\nsecond {i}",' for i in range(count)]
+    return '\n'.join(['{', '    Notes = {'] + fields + ['    },', '}']) + '\n'
+
+
+def measure_brace_index(content: str, repeat: int) -> dict:
+    """整形ルールが行う問い合わせ (文字列リテラルの親のインデント、UserControls ブロックの範囲) の時間を比較する
+
+    index は索引の作成を含む時間、legacy は索引導入前の走査の時間。トークン化は両者共通のため含めない。
+    """
+    lines = content.splitlines()
+    tokens_per_line = Tokenizer().scan_content(content)
+    string_literal, user_controls = StringLiteralFormatter(), UserControlsFormatter()
+    targets = list(string_literal._find_targets(tokens_per_line).items())
+    start_tokens = user_controls.BLOCK_START_TOKENS
+
+    def with_index():
+        index = string_literal.tokenizer.build_brace_index(tokens_per_line, lines)
+        indents = [index.parent_indent(line_num, key_idx) for line_num, key_idx in targets]
+        return indents, user_controls._extract_blocks(tokens_per_line, start_tokens, index)
+
+    def legacy():
+        indents = [legacy_parent_indent(lines, tokens_per_line, line_num, key_idx) for line_num, key_idx in targets]
+        return indents, legacy_extract_blocks(tokens_per_line, start_tokens)
+
+    if with_index() != legacy():
+        raise AssertionError('括弧の索引の結果が索引導入前の走査と一致しません')
+    return {'index_seconds': best_time(with_index, repeat), 'legacy_seconds': best_time(legacy, repeat),
+            'lookups': len(targets)}
+
+
+def run(sizes: List[int], base_spec: CorpusSpec, repeat: int) -> dict:
+    config = ConfigLoader()
+    targets = build_targets(config)
+    results = {name: {'runs': []} for name in targets}
+    brace_index = []
+
+    for tools in sizes:
+        spec = CorpusSpec(**dict(base_spec.to_dict(), tools=tools, instance_inputs=base_spec.instance_inputs * tools // sizes[0]))
+        content = generate(spec)
+        # 各ルール単体はタブ展開済みの内容を対象とする (apply_formatting と同じ前処理)
+        expanded = content.expandtabs(4)
+        size = len(content.encode('utf-8'))
+        for name, func in targets.items():
+            source = content if name == CHAIN else expanded
+            seconds = best_time(lambda: func(source), repeat)
+            results[name]['runs'].append({
+                'tools': tools,
+                'bytes': size,
+                'seconds': seconds,
+                'mb_per_s': size / 1e6 / seconds if seconds else None,
+                'peak_bytes': peak_memory(lambda: func(source)),
+            })
+        brace_index.append(dict(measure_brace_index(expanded, repeat), input=f'corpus x{tools}'))
+    dense = sizes[-1]
+    brace_index.append(dict(measure_brace_index(string_block(dense), repeat), input=f'string block x{dense}'))
+
+    for name, result in results.items():
+        runs = result['runs']
+        result['scaling_exponent'] = scaling_exponent([r['bytes'] for r in runs], [r['seconds'] for r in runs])
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'fingerprint': formatter_fingerprint(config.config_path),
+        'spec': base_spec.to_dict(),
+        'sizes': sizes,
+        'repeat': repeat,
+        'results': results,
+        'brace_index': brace_index,
+    }
+
+
+def print_report(report: dict, baseline: Optional[dict] = None):
+    print(f"{'target':<24}{'tools':>7}{'size(MB)':>10}{'MB/s':>9}{'peak(MB)':>10}{'vs base':>9}")
+    for name, result in report['results'].items():
+        base_runs = {r['tools']: r for r in (baseline or {}).get('results', {}).get(name, {}).get('runs', [])}
+        for r in result['runs']:
+            base = base_runs.get(r['tools'])
+            ratio = f"{base['seconds'] / r['seconds']:.2f}x" if base else '-'
+            print(f"{name:<24}{r['tools']:>7}{r['bytes'] / 1e6:>10.2f}{r['mb_per_s']:>9.2f}"
+                  f"{r['peak_bytes'] / 1e6:>10.2f}{ratio:>9}")
+        print(f"{name:<24}{'scaling exponent':>26}: {result['scaling_exponent']:.2f}")
+
+    print(f"\n{'brace index':<24}{'lookups':>9}{'legacy(ms)':>12}{'index(ms)':>11}{'speedup':>9}")
+    for r in report.get('brace_index', []):
+        speedup = r['legacy_seconds'] / r['index_seconds']
+        # 索引の作成が問い合わせで取り戻せていない場合は明示する
+        verdict = '' if speedup >= 1 else '  net loss'
+        print(f"{r['input']:<24}{r['lookups']:>9}{r['legacy_seconds'] * 1000:>12.1f}"
+              f"{r['index_seconds'] * 1000:>11.1f}{speedup:>8.2f}x{verdict}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='整形ルールのスケーリングベンチマーク')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 100, 200, 400], help='ツール数の系列')
+    parser.add_argument('--user-controls', type=int, default=CorpusSpec.user_controls)
+    parser.add_argument('--instance-inputs', type=int, default=CorpusSpec.instance_inputs,
+                        help='最小サイズでの InstanceInput 数 (サイズに比例して増やす)')
+    parser.add_argument('--script-lines', type=int, default=CorpusSpec.script_lines)
+    parser.add_argument('--nesting-depth', type=int, default=CorpusSpec.nesting_depth)
+    parser.add_argument('--seed', type=int, default=CorpusSpec.seed)
+    parser.add_argument('--repeat', type=int, default=3, help='計測回数 (最速値を採用)')
+    parser.add_argument('--output', help='結果を書き出すJSONファイル')
+    parser.add_argument('--baseline', help='比較対象の過去の結果JSON')
+    args = parser.parse_args()
+
+    spec = CorpusSpec(user_controls=args.user_controls, instance_inputs=args.instance_inputs,
+                      script_lines=args.script_lines, nesting_depth=args.nesting_depth, seed=args.seed)
+    report = run(sorted(args.sizes), spec, args.repeat)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f'結果を書き出しました: {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""単一ファイル整形のコールド起動時間の計測
+
+使い方:
+    python -m settingfile_formatter.benchmarks.startup [--rule RULE] [--runs N] [--compare 他のチェックアウトのディレクトリ]
+drsetfmt.py を別プロセスで繰り返し起動し、起動から終了までの時間を計測する。
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .corpus import CorpusSpec, generate
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+def measure_startup(project_dir: Path, target: Path, rule: str, runs: int) -> list:
+    """各回の実行時間 (秒) のリストを返す"""
+    output = target.parent / ('fixed_' + target.name)
+    command = [sys.executable, str(project_dir / 'drsetfmt.py'), str(target), '-r', rule]
+    times = []
+    for _ in range(runs):
+        # 出力ファイルが無ければキャッシュによるスキップは起きない
+        output.unlink(missing_ok=True)
+        start = time.perf_counter()
+        subprocess.run(command, cwd=project_dir, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description='コールド起動時間の計測')
+    parser.add_argument('--rule', default='instance_input', help='適用する整形ルール')
+    parser.add_argument('--runs', type=int, default=10, help='計測回数')
+    parser.add_argument('--compare', metavar='DIR', help='比較対象の settingfile_formatter ディレクトリ')
+    args = parser.parse_args()
+
+    targets = [('current', PROJECT_DIR)]
+    if args.compare:
+        targets.append(('compare', Path(args.compare).resolve()))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        target = Path(tmp) / 'startup.setting'
+        target.write_text(generate(CorpusSpec(tools=5, instance_inputs=5)), encoding='utf-8')
+        print(f"{'target':<10}{'median(ms)':>12}{'min(ms)':>10}  directory")
+        for name, project_dir in targets:
+            # 初回は .pyc 生成を含むため除外する
+            measure_startup(project_dir, target, args.rule, 1)
+            times = measure_startup(project_dir, target, args.rule, args.runs)
+            print(f'{name:<10}{statistics.median(times) * 1000:>12.1f}{min(times) * 1000:>10.1f}  {project_dir}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+import hashlib
+import json
+import os
+import socket
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .file_utils import is_archive, read_file_content
+
+CACHE_FILE_NAME = '.drsetfmt_cache.json'
+CACHE_VERSION = 1
+FORMATTERS_DIR = Path(__file__).parent / 'formatters'
+
+LOCK_TIMEOUT = 10.0
+LOCK_INTERVAL = 0.05
+
+
+def _process_alive(pid: int) -> bool:
+    """pid のプロセスが存在するか判定する"""
+    if pid <= 0:
+        return False
+    if os.name == 'nt':
+        # Windows の os.kill はシグナルを送らずプロセスを終了させるため API で確認する
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)   # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        try:
+            code = ctypes.c_ulong()
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(code))) and code.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _lock_owner() -> str:
+    return f'{os.getpid()}@{socket.gethostname()}'
+
+
+def _is_stale_lock(lock_path: Path) -> bool:
+    """ロックファイルを作成したプロセスが既に終了しているか判定する
+
+    別のホストのプロセスや記録を読めないロックは確認できないため、残っているものとして扱う。
+    """
+    try:
+        owner = lock_path.read_text(encoding='utf-8')
+    except OSError:
+        return False
+    pid, _, host = owner.partition('@')
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    return not _process_alive(int(pid))
+
+
+def content_hash(content: str) -> str:
+    """内容のハッシュ値を返す"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def file_hash(file_path: Path) -> str:
+    """ファイルのバイト列のハッシュ値を返す (テキストとして読めないアーカイブ用)"""
+    digest = hashlib.sha256()
+    with file_path.open('rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def input_hash(input_path: Path) -> str:
+    """入力ファイルのハッシュ値を返す (アーカイブはバイト列、settingファイルは読み込んだ内容から求める)"""
+    return file_hash(input_path) if is_archive(input_path) else content_hash(read_file_content(input_path))
+
+
+def formatter_fingerprint(config_path: Path) -> str:
+    """設定ファイルと整形ルールのソースから整形処理のバージョンを表す値を作成する
+
+    cfggen.py による再生成や整形ルールの変更でキャッシュが無効になる。
+    """
+    digest = hashlib.sha256()
+    sources = [config_path, Path(__file__)] + sorted(FORMATTERS_DIR.glob('*.py'))
+    for source in sources:
+        digest.update(source.name.encode('utf-8'))
+        try:
+            digest.update(source.read_bytes())
+        except OSError:
+            pass
+    return digest.hexdigest()
+
+
+def cache_path_for(config_path: Path) -> Path:
+    """設定ファイルと同じディレクトリに置くキャッシュファイルのパスを返す"""
+    return config_path.parent / CACHE_FILE_NAME
+
+
+class FormatCache:
+    """整形済みファイルの記録 (内容ハッシュ、適用ルール、ファイル情報) を管理する
+
+    記録はメモリ上に蓄積し save() でロックを取ってディスク上の内容とマージしてから書き込む。
+    """
+
+    def __init__(self, config_path: Path):
+        self.path = cache_path_for(config_path)
+        self.fingerprint = formatter_fingerprint(config_path)
+        self._entries: Dict[str, dict] = self._read().get('files', {})
+        self._updates: Dict[str, dict] = {}
+        self.disabled = False           # 書き込みに失敗した場合は以降の記録を行わない
+
+    def _read(self) -> dict:
+        try:
+            with self.path.open('r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get('version') != CACHE_VERSION or data.get('fingerprint') != self.fingerprint:
+            return {}
+        return data
+
+    @staticmethod
+    def key_for(file_path: Path) -> str:
+        return str(Path(file_path).resolve())
+
+    def is_fresh(self, input_path: Path, output_path: Path, rules: List[str]) -> bool:
+        """前回の整形結果から変化がなく、処理を省略できるか判定する"""
+        key = self.key_for(input_path)
+        entry = self._updates.get(key) or self._entries.get(key)
+        if not entry or entry['rules'] != list(rules) or entry['output'] != self.key_for(output_path):
+            return False
+
+        try:
+            stat = input_path.stat()
+            if output_path != input_path:
+                output_stat = output_path.stat()
+                if [output_stat.st_size, output_stat.st_mtime_ns] != entry['output_stat']:
+                    return False
+        except OSError:
+            return False
+
+        if [stat.st_size, stat.st_mtime_ns] == entry['stat']:
+            return True
+        # 更新日時のみ変化した場合は内容のハッシュで判定する
+        if stat.st_size != entry['stat'][0] or input_hash(input_path) != entry['hash']:
+            return False
+        self._updates[key] = dict(entry, stat=[stat.st_size, stat.st_mtime_ns])
+        return True
+
+    def block_hashes(self, input_path: Path, output_path: Path, rules: List[str]) -> Tuple[List[str], List[str]]:
+        """差分整形 (--incremental) 用に記録した前回の整形結果と入力のブロックのハッシュ値を返す
+
+        同じ出力先・ルールの記録が無い場合は空のリストを返す。
+        入力のハッシュ値は前回の出力ファイルと組で使うため、別名保存の出力ファイルが記録後に変更されていれば返さない。
+        上書き保存では前回の出力ファイルが編集後の入力そのものになるため、入力のハッシュ値は使わない。
+        """
+        key = self.key_for(input_path)
+        entry = self._updates.get(key) or self._entries.get(key)
+        if not entry or entry['rules'] != list(rules) or entry['output'] != self.key_for(output_path):
+            return [], []
+        sources = entry.get('sources', []) if output_path != input_path else []
+        if sources:
+            try:
+                output_stat = output_path.stat()
+            except OSError:
+                output_stat = None
+            if output_stat is None or [output_stat.st_size, output_stat.st_mtime_ns] != entry['output_stat']:
+                sources = []
+        return entry.get('blocks', []), sources
+
+    def record(self, input_path: Path, output_path: Path, rules: List[str], input_content: Optional[str] = None,
+               input_hash: Optional[str] = None, blocks: Optional[List[str]] = None,
+               sources: Optional[List[str]] = None):
+        """整形後の状態を記録する
+
+        input_content は処理後の入力ファイルの内容。内容を保持しないストリーミング処理やアーカイブではハッシュ値 input_hash を渡す。
+        blocks / sources は差分整形 (--incremental) 用の整形結果・入力のブロックのハッシュ値。
+        """
+        if self.disabled:
+            return
+        stat = input_path.stat()
+        output_stat = output_path.stat()
+        entry = {
+            'hash': input_hash or content_hash(input_content),
+            'stat': [stat.st_size, stat.st_mtime_ns],
+            'rules': list(rules),
+            'output': self.key_for(output_path),
+            'output_stat': [output_stat.st_size, output_stat.st_mtime_ns],
+        }
+        if blocks:
+            entry['blocks'] = blocks
+            entry['sources'] = sources or []
+        self._updates[self.key_for(input_path)] = entry
+
+    def pop_entry(self, input_path: Path) -> Optional[dict]:
+        """未保存の記録を取り出す (ワーカープロセスから親プロセスへの受け渡し用)"""
+        return self._updates.pop(self.key_for(input_path), None)
+
+    def merge_entry(self, key: str, entry: dict):
+        """他のプロセスで作成された記録を取り込む"""
+        self._updates[key] = entry
+
+    @contextmanager
+    def _lock(self):
+        """キャッシュファイルの更新用のロックを取る
+
+        ロックファイルには作成したプロセスを記録し、待ち時間を過ぎても解放されない場合は
+        そのプロセスが終了していれば異常終了で残ったロックとみなして取り除く。動作中であれば TimeoutError とする。
+        """
+        lock_path = self.path.with_name(self.path.name + '.lock')
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while True:
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                if time.monotonic() > deadline:
+                    if not _is_stale_lock(lock_path):
+                        raise TimeoutError(f'キャッシュファイルのロックを取得できません: {lock_path}')
+                    lock_path.unlink(missing_ok=True)
+                    deadline = time.monotonic() + LOCK_TIMEOUT
+                    continue
+                time.sleep(LOCK_INTERVAL)
+        try:
+            os.write(fd, _lock_owner().encode('utf-8'))
+            yield
+        finally:
+            os.close(fd)
+            lock_path.unlink(missing_ok=True)
+
+    def save(self):
+        """記録をディスク上の内容とマージして書き込む
+
+        書き込めない場合 (読み取り専用の設置先、ロックの取得失敗など) は警告を表示し、以降キャッシュを使わない。
+        """
+        if not self._updates or self.disabled:
+            return
+        tmp_path = self.path.with_name(f'{self.path.name}.{os.getpid()}.tmp')
+        try:
+            with self._lock():
+                entries = self._read().get('files', {})
+                entries.update(self._updates)
+                data = {'version': CACHE_VERSION, 'fingerprint': self.fingerprint, 'files': entries}
+                with tmp_path.open('w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+        except OSError as e:
+            try:
+                tmp_path.unlink(missing_ok=True)
+            except OSError:
+                pass
+            print(f'警告: キャッシュファイルを書き込めないためキャッシュを無効にします: {self.path} ({e})',
+                  file=sys.stderr)
+            self.disabled = True
+            self._updates = {}
+            return
+        self._entries = entries
+        self._updates = {}
+
+
+def invalidate_cache(config_path: Path) -> bool:
+    """キャッシュファイルを削除する"""
+    path = cache_path_for(config_path)
+    if path.exists():
+        path.unlink()
+        return True
+    return False
@@ -1,20 +1,32 @@
 import os
 import re
 import json
+import sys
 from pathlib import Path
 
+if not __package__:
+    # スクリプトとして直接実行された場合もパッケージ内の相対importを使えるようにする
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    __package__ = Path(__file__).resolve().parent.name
+
+from .cache import invalidate_cache
+
 FORMATTERS_DIR = Path(__file__).parent / 'formatters'
 CONFIG_PATH = Path(__file__).parent / 'config.json'
 INIT_PATH = FORMATTERS_DIR / '__init__.py'
 
-# base.pyは除外
-EXCLUDE_FILES = {'base.py', '__init__.py'}
+# base.py等の共通モジュールは除外
+EXCLUDE_FILES = {'base.py', 'stats.py', '__init__.py'}
 
 # Formatterクラス検出用パターン
 CLASS_PATTERN = re.compile(r'class\s+(\w+Formatter)\b')
+# 'all' に含めないルールの検出用パターン (クラス属性 IN_ALL = False)
+EXPLICIT_ONLY_PATTERN = re.compile(r'^\s+IN_ALL\s*=\s*False\b', re.MULTILINE)
 
 def find_formatter_classes():
+    """整形ルールの対応表と、'all' に含めないルール名のリストを返す"""
     formatters = {}
+    explicit_only = []
     for file in FORMATTERS_DIR.glob('*.py'):
         if file.name in EXCLUDE_FILES:
             continue
@@ -24,32 +36,66 @@ def find_formatter_classes():
         for cls in matches:
             key = file.stem  # ファイル名（拡張子なし）
             formatters[key] = f"formatters.{key}.{cls}"
-    return formatters
+        if matches and EXPLICIT_ONLY_PATTERN.search(content):
+            explicit_only.append(file.stem)
+    return formatters, explicit_only
 
-def update_config_json(formatters):
+def update_config_json(formatters, explicit_only):
     config = {"formatters": formatters}
+    if explicit_only:
+        config["explicit_only"] = explicit_only
+    # ルール毎のオプションは手動で記載するため、既存の設定から引き継ぐ
+    options = load_options()
+    if options:
+        config["options"] = options
     with CONFIG_PATH.open('w', encoding='utf-8') as f:
         json.dump(config, f, ensure_ascii=False, indent=2)
     print(f'config.jsonを更新しました: {CONFIG_PATH}')
 
+def load_options():
+    try:
+        with CONFIG_PATH.open(encoding='utf-8') as f:
+            return json.load(f).get('options', {})
+    except (OSError, ValueError):
+        return {}
+
 def update_init_py(formatters):
     # base.pyのimportを先頭に追加
     lines = [
-        'from .base import ContentFormatter, Tokenizer'
+        'import importlib',
+        '',
+        'from .base import ContentFormatter, Tokenizer',
+        '',
+        '# 整形ルールのモジュールは属性の初回参照時にimportする (選択されたルールのみ読み込むため)',
+        '_LAZY_FORMATTERS = {',
     ]
-    # Formatterクラスのimport
-    lines += [f"from .{key} import {val.split('.')[-1]}" for key, val in formatters.items()]
+    lines += [f"    '{val.split('.')[-1]}': '{key}'," for key, val in formatters.items()]
+    lines.append('}')
     # __all__ の生成
     all_list = ["'ContentFormatter'", "'Tokenizer'"] + [f"'{val.split('.')[-1]}'" for val in formatters.values()]
     lines.append(f"__all__ = [{', '.join(all_list)}]")
+    lines += [
+        '',
+        '',
+        'def __getattr__(name):',
+        '    module_name = _LAZY_FORMATTERS.get(name)',
+        '    if module_name is None:',
+        '        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")',
+        "    value = getattr(importlib.import_module(f'.{module_name}', __name__), name)",
+        '    globals()[name] = value',
+        '    return value',
+    ]
     with INIT_PATH.open('w', encoding='utf-8') as f:
         f.write('\n'.join(lines) + '\n')
     print(f'__init__.pyを更新しました: {INIT_PATH}')
 
 def main():
-    formatters = find_formatter_classes()
-    update_config_json(formatters)
+    formatters, explicit_only = find_formatter_classes()
+    update_config_json(formatters, explicit_only)
     update_init_py(formatters)
+    # 整形ルールの構成が変わるため整形済みファイルのキャッシュを破棄する
+    if invalidate_cache(CONFIG_PATH):
+        print('キャッシュを破棄しました')
 
 if __name__ == '__main__':
     main()
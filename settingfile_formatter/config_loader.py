@@ -2,28 +2,34 @@ from __future__ import annotations
 import json
 import importlib
 from pathlib import Path
-from typing import Dict, List, TYPE_CHECKING
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
 
 if TYPE_CHECKING:
-    from formatters.base import ContentFormatter
+    from .formatters.base import ContentFormatter
 
 
 class FormatterError(Exception):
     pass
 
+DEFAULT_CONFIG_PATH = Path(__file__).resolve().parent / 'config.json'
+
 class ConfigLoader:
-    def __init__(self, config_file: str = 'config.json'):
-        self.config_path = Path(config_file)
-        self._formatters_config = self._load_config()
+    def __init__(self, config_file: Optional[str] = None):
+        # 未指定時は作業ディレクトリではなく本モジュールと同じディレクトリの config.json を使う
+        self.config_path = Path(config_file) if config_file else DEFAULT_CONFIG_PATH
+        self._formatters_config, self._explicit_only, self._options = self._load_config()
         self._rule_map = self._build_rule_map()
         self._all_choice_num = str(len(self._rule_map) + 1)
+        self._instances: Dict[str, ContentFormatter] = {}
 
-    def _load_config(self) -> Dict[str, str]:
+    def _load_config(self) -> Tuple[Dict[str, str], List[str], Dict[str, dict]]:
+        """整形ルールの対応表、'all' に含めないルール名のリスト、ルール毎のオプションを返す"""
         if not self.config_path.exists():
             raise FileNotFoundError(f"設定ファイル '{self.config_path}' が見つかりません")
         try:
             with self.config_path.open('r', encoding='utf-8') as f:
-                return json.load(f).get('formatters', {})
+                config = json.load(f)
+            return config.get('formatters', {}), config.get('explicit_only', []), config.get('options', {})
         except json.JSONDecodeError as e:
             raise FormatterError(f"設定ファイル '{self.config_path}' のJSON形式が正しくありません") from e
         except Exception as e:
@@ -50,28 +56,49 @@ class ConfigLoader:
         return list(selected_rules)
 
     def _get_formatter_instance(self, rule_name: str) -> ContentFormatter:
+        # 生成済みのインスタンスは再利用する (フォーマッターは状態を持たない)
+        if rule_name in self._instances:
+            return self._instances[rule_name]
         if rule_name not in self._formatters_config:
             raise FormatterError(f"設定に存在しない整形ルールです: '{rule_name}'")
 
         module_name, class_name = self._formatters_config[rule_name].rsplit('.', 1)
         try:
-            module = importlib.import_module(module_name)
+            # config.json のモジュール名はパッケージからの相対名 (formatters.xxx)
+            module = importlib.import_module(f'.{module_name}', __package__)
             formatter_class = getattr(module, class_name)
-            return formatter_class()
         except (ImportError, AttributeError) as e:
             raise FormatterError(f"整形ルール '{rule_name}' のクラス読み込みに失敗しました") from e
+        # config.json の options に記載されたルール毎の設定はコンストラクタの引数として渡す
+        try:
+            instance = self._instances[rule_name] = formatter_class(**self._options.get(rule_name, {}))
+        except (TypeError, ValueError) as e:
+            raise FormatterError(f"整形ルール '{rule_name}' のオプションが正しくありません: {e}") from e
+        return instance
 
-    def get_formatters(self, rule_names: List[str]) -> List[ContentFormatter]:
-        """指定されたルール名のリストに基づき、適用すべきフォーマッターのリストを返す"""
+    def resolve_rule_names(self, rule_names: List[str]) -> List[str]:
+        """'all' を展開し、適用順のルール名のリストを返す
+
+        'all' に含めないルール (explicit_only) は明示的に指定された場合のみ、他のルールの後に適用する。
+        """
+        explicit = self._explicit_only
         if 'all' in rule_names or not rule_names:
-            target_rules = self._formatters_config.keys()
+            names = [name for name in self._formatters_config if name not in explicit]
         else:
-            target_rules = rule_names
+            names = [name for name in rule_names if name not in explicit]
+        return names + [name for name in rule_names if name in explicit]
+
+    def get_formatters(self, rule_names: List[str]) -> List[ContentFormatter]:
+        """指定されたルール名のリストに基づき、適用すべきフォーマッターのリストを返す"""
+        return [self._get_formatter_instance(name) for name in self.resolve_rule_names(rule_names)]
 
-        return [self._get_formatter_instance(name) for name in target_rules]
+    def get_named_formatters(self, rule_names: List[str]) -> List[Tuple[str, ContentFormatter]]:
+        """(ルール名, フォーマッター) のリストを返す"""
+        return [(name, self._get_formatter_instance(name)) for name in self.resolve_rule_names(rule_names)]
 
     def build_rule_prompt(self) -> str:
         prompt_lines = ['---', '整形ルールを選択してください:']
         prompt_lines.extend([f'  {num}: {name}' for num, name in self._rule_map.items()])
-        prompt_lines.append(f'  {self._all_choice_num}: 全てのルールを適用')
+        excluded = f" ({', '.join(self._explicit_only)} を除く)" if self._explicit_only else ''
+        prompt_lines.append(f'  {self._all_choice_num}: 全てのルールを適用{excluded}')
         return '\n'.join(prompt_lines)
\ No newline at end of file
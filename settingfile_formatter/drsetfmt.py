@@ -1,19 +1,48 @@
 import argparse
+import os
 import sys
 from pathlib import Path
-from typing import Tuple, List
+from typing import Callable, Tuple, List, Optional, TYPE_CHECKING
 
-from config_loader import ConfigLoader, FormatterError
-from file_utils import prepare_file, read_file_content, write_file_content
+if not __package__:
+    # スクリプトとして直接実行された場合もパッケージ内の相対importを使えるようにする
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    __package__ = Path(__file__).resolve().parent.name
+
+from .api import apply_formatting
+from .cache import FormatCache, file_hash
+from .config_loader import ConfigLoader, FormatterError
+from .file_utils import get_output_path, is_archive, is_batch_target, prepare_file, read_file_content, write_file_content
+
+# 起動時間短縮のため、バッチ処理・監視・計測用のモジュールは使用時にimportする
+if TYPE_CHECKING:
+    from .formatters.stats import FormatStats
 
 def parse_args(config: ConfigLoader) -> argparse.Namespace:
     """コマンドライン引数を解析する"""
     parser = argparse.ArgumentParser(description='整形ルール選択付き settingファイル整形ツール')
     available_rules = config.get_formatter_choices()
 
-    parser.add_argument('file', nargs='?', help='処理対象ファイル')
+    parser.add_argument('paths', nargs='*', metavar='PATH',
+                        help='処理対象ファイル (ディレクトリ、globパターン、複数指定時はバッチ処理)')
     parser.add_argument('-o', '--overwrite', action='store_true', help='上書き保存する')
     parser.add_argument('--backup', action='store_true', help='上書き保存時にバックアップを作成する')
+    parser.add_argument('-j', '--jobs', type=int, metavar='N',
+                        help='並列プロセス数 (バッチ処理ではファイル単位、大きな単一ファイルではツール単位。未指定時はCPU数)')
+    parser.add_argument('--async-io', action='store_true',
+                        help='バッチ処理で読み込み・整形・書き込みを重ねて行う (ネットワーク共有上のファイル向け)')
+    parser.add_argument('-f', '--force', action='store_true', help='キャッシュを無視して全てのファイルを整形する')
+    parser.add_argument('--profile', action='store_true', help='整形ルール毎の処理時間・トークン数・編集数・ピークメモリを表示する')
+    parser.add_argument('--verify', action='store_true',
+                        help='整形前後のトークン列が等価であることを確認し、食い違う場合は保存せずにエラーにする')
+    parser.add_argument('-w', '--watch', action='store_true', help='指定したファイル・ディレクトリを監視し、保存時に整形する')
+    parser.add_argument('--server', action='store_true',
+                        help='常駐し、標準入出力の JSON-RPC で整形要求を受け付ける (エディタ連携用)')
+    parser.add_argument('--socket', metavar='PATH', help='--server の要求を標準入出力の代わりにUnixソケットで受け付ける')
+    parser.add_argument('-s', '--stream', action='store_true',
+                        help='ツール単位で逐次読み込み・整形・書き込みを行い、巨大なファイルのメモリ使用量を抑える')
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help='前回の整形結果から変更のあったツールのみ整形する (キャッシュにツール毎のハッシュ値を記録する)')
     parser.add_argument(
         '-r', '--rule',
         nargs='+',  # 1つ以上の引数を受け取る
@@ -68,40 +97,138 @@ def get_interactive_inputs(config: ConfigLoader) -> Tuple[str, bool, bool, List[
     rules = _prompt_for_rules(config)
     return file_path, overwrite, backup, rules
 
-def apply_formatting(content: str, rules: List[str], config: ConfigLoader) -> str:
-    """指定されたルールに従ってフォーマッターを適用する"""
-    content = content.expandtabs(4)     # タブを4スペースに変換
-    for f in config.get_formatters(rules):
-        content = f.format_content(content)
-    return content
-
-def process_file(file_path: str, overwrite: bool, backup: bool, rules: List[str], config: ConfigLoader):
-    """単一のファイルを読み込み、整形し、保存する"""
-    output_path = prepare_file(file_path, overwrite, backup)
+def process_file(file_path: str, overwrite: bool, backup: bool, rules: List[str], config: ConfigLoader,
+                 verbose: bool = True, cache: Optional[FormatCache] = None, force: bool = False,
+                 on_stats: Optional[Callable[[str, 'FormatStats'], None]] = None,
+                 stream: bool = False, jobs: Optional[int] = None, verify: bool = False,
+                 incremental: bool = False) -> Tuple[Path, str]:
+    """単一のファイルを読み込み、整形し、保存する
+
+    出力先パスと処理結果 ('changed' / 'unchanged' / 'skipped') を返す。
+    cache が指定された場合、前回から変化のないファイルは読み込まずにスキップする。
+    on_stats が指定された場合、整形後にファイルパスとルール毎の計測結果を渡して呼び出す。
+    stream が真の場合、ファイル全体を読み込まずにツール単位で逐次整形する。
+    .drfx / .zip の場合は展開せずに内部の .setting ファイルを整形したアーカイブを出力する (stream は無視する)。
+    jobs は大きなファイルをツール単位で並列に整形する際のプロセス数。
+    出力先と内容が同じ場合は書き込まず、バックアップは実際に書き込む場合のみ作成する。
+    verify が真の場合、整形前後のトークン列が等価でなければ保存せずに VerifyError を送出する。
+    incremental が真の場合、cache に記録した前回の整形結果から変更のあったツールのみ整形する (stream では無視する)。
+    force が真の場合は前回の整形結果も使わずに全てのツールを整形し、結果を記録し直す。
+    """
     input_path = Path(file_path)
+    if cache is not None and not force and input_path.is_file():
+        output_path = get_output_path(file_path, overwrite)
+        if cache.is_fresh(input_path, output_path, rules):
+            if verbose:
+                print(f'✓ 変更がないためスキップしました: {output_path}')
+            return output_path, 'skipped'
+
+    output_path = prepare_file(file_path, overwrite)
+
+    stats = None
+    if on_stats is not None:
+        from .formatters.stats import FormatStats
+        stats = FormatStats()
+    archive = is_archive(input_path)
+    if archive:
+        from .archive import format_archive
+        changed = format_archive(input_path, output_path, rules, config, stats, jobs, backup=backup and overwrite,
+                                 verify=verify)
+    elif stream:
+        from .streaming import format_file
+        changed, input_hash, output_hash = format_file(input_path, output_path, rules, config, stats,
+                                                       backup=backup and overwrite, verify=verify)
+    elif incremental and cache is not None:
+        from .incremental import format_incremental, previous_blocks
+        content = read_file_content(input_path, stats)
+        formatted, previous = (), None
+        if not force:
+            formatted, sources = cache.block_hashes(input_path, output_path, rules)
+            previous = previous_blocks(sources, read_file_content(output_path)) if sources else None
+        result = format_incremental(content, rules, config, formatted, previous, stats)
+        formatted_content = result.text
+        if verify:
+            from .verify import create_verifier
+            create_verifier(rules, config).check(content, formatted_content)
+        if verbose and result.total:
+            print(f'情報: {result.total} ツール中 {result.reformatted} ツールを整形しました')
+    else:
+        content = read_file_content(input_path, stats)
+        formatted_content = apply_formatting(content, rules, config, stats, jobs, verify)
+    if not archive and not stream:
+        write_file_content(output_path, formatted_content, mode_from=input_path, backup=backup and overwrite,
+                           stats=stats)
+        changed = formatted_content != content
+    if stats is not None:
+        on_stats(file_path, stats)
+    if cache is not None:
+        if archive:
+            cache.record(input_path, output_path, rules, input_hash=file_hash(input_path))
+        elif stream:
+            cache.record(input_path, output_path, rules, input_hash=output_hash if overwrite else input_hash)
+        elif incremental:
+            cache.record(input_path, output_path, rules, formatted_content if overwrite else content,
+                         blocks=result.blocks, sources=None if overwrite else result.sources)
+        else:
+            cache.record(input_path, output_path, rules, formatted_content if overwrite else content)
 
-    content = read_file_content(input_path)
-    formatted_content = apply_formatting(content, rules, config)
-    write_file_content(output_path, formatted_content)
-
-    action = '上書き保存しました' if overwrite else '別名で保存しました'
-    print(f'✓ 処理が完了しました ({action}): {output_path}')
+    if verbose:
+        action = '上書き保存しました' if overwrite else '別名で保存しました'
+        print(f'✓ 処理が完了しました ({action}): {output_path}')
+    return output_path, 'changed' if changed else 'unchanged'
 
 def main():
     """アプリケーションのエントリーポイント"""
     try:
         config = ConfigLoader()
         args = parse_args(config)
+        cache = FormatCache(config.config_path)
+        profile = on_stats = None
+        if args.profile:
+            import tracemalloc
+            from .formatters.stats import FormatStats
+            profile = FormatStats()
+            on_stats = lambda _path, stats: profile.merge(stats)
+            tracemalloc.start()
 
-        if args.file:
-            file_path = args.file
-            overwrite = args.overwrite
-            backup = args.backup
-            rules = args.rule
-        else:
-            file_path, overwrite, backup, rules = get_interactive_inputs(config)
-
-        process_file(file_path, overwrite, backup, rules, config)
+        try:
+            if args.server or args.socket:
+                from .server import serve_stdio, serve_unix
+                if args.socket:
+                    serve_unix(config, args.socket)
+                else:
+                    serve_stdio(config)
+            elif args.watch:
+                if not args.paths:
+                    raise ValueError('監視モードでは監視対象のファイルまたはディレクトリを指定してください')
+                from .watcher import Watcher
+                Watcher(args.paths, args.overwrite, args.backup, args.rule, config).run()
+            elif not args.paths:
+                file_path, overwrite, backup, rules = get_interactive_inputs(config)
+                process_file(file_path, overwrite, backup, rules, config, cache=cache, force=args.force,
+                             on_stats=on_stats, stream=args.stream, jobs=args.jobs or os.cpu_count(),
+                             verify=args.verify, incremental=args.incremental)
+            elif is_batch_target(args.paths):
+                if args.async_io:
+                    from .pipeline import run_pipeline as run_batch
+                else:
+                    from .batch import run_batch
+                summary = run_batch(args.paths, args.overwrite, args.backup, args.rule, config, args.jobs,
+                                    cache=cache, force=args.force, on_stats=on_stats, stream=args.stream,
+                                    verify=args.verify, incremental=args.incremental)
+                print(summary.report())
+                if summary.failed:
+                    sys.exit(1)
+            else:
+                process_file(args.paths[0], args.overwrite, args.backup, args.rule, config,
+                             cache=cache, force=args.force, on_stats=on_stats, stream=args.stream,
+                             jobs=args.jobs or os.cpu_count(), verify=args.verify, incremental=args.incremental)
+        finally:
+            cache.save()
+            if profile is not None:
+                tracemalloc.stop()
+                if profile.files:
+                    print(profile.report())
 
     except (FormatterError, FileNotFoundError, IOError, ValueError) as e:
         print(f'\nエラー: {e}', file=sys.stderr)
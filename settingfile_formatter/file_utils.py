@@ -1,32 +1,147 @@
+import mmap
+import os
 import shutil
+import tempfile
+import time
 from pathlib import Path
+from typing import List, Optional, TYPE_CHECKING
 
-def prepare_file(file_path: str, overwrite: bool, backup: bool, prefix: str = 'fixed_') -> Path:
-    """ファイルの存在確認、バックアップ作成、出力ファイルパスの決定を行う"""
+if TYPE_CHECKING:
+    from .formatters.stats import FormatStats
+
+GLOB_CHARS = ('*', '?', '[')
+# .setting ファイルをまとめたアーカイブ (.drfx は zip 形式)
+ARCHIVE_SUFFIXES = ('.drfx', '.zip')
+# この大きさ以上のファイルは mmap で読み込む (読み込み用のバッファへのコピーを省く)
+MMAP_MIN_SIZE = 1024 * 1024
+
+def is_batch_target(paths: List[str]) -> bool:
+    """単一ファイル処理ではなくバッチ処理が必要か判定する"""
+    if len(paths) != 1:
+        return True
+    return Path(paths[0]).is_dir() or any(c in paths[0] for c in GLOB_CHARS)
+
+def is_archive(file_path: Path) -> bool:
+    """アーカイブ (.drfx / .zip) か判定する"""
+    return Path(file_path).suffix.lower() in ARCHIVE_SUFFIXES
+
+def get_output_path(file_path: str, overwrite: bool, prefix: str = 'fixed_') -> Path:
+    """出力ファイルパスを決定する"""
+    input_path = Path(file_path)
+    return input_path if overwrite else input_path.parent / (prefix + input_path.name)
+
+def prepare_file(file_path: str, overwrite: bool, prefix: str = 'fixed_') -> Path:
+    """ファイルの存在確認、出力ファイルパスの決定を行う
+
+    バックアップは内容が変わって書き込む時点で作成する (write_file_content / AtomicFile)。
+    """
     input_path = Path(file_path)
     if not input_path.is_file():
         raise FileNotFoundError(f'指定されたファイルが見つかりません: {input_path}')
+    return get_output_path(file_path, overwrite, prefix)
 
-    if backup and overwrite:
-        backup_path = input_path.with_suffix(input_path.suffix + '.bak')
-        try:
-            shutil.copy2(input_path, backup_path)
-            print(f'情報: バックアップを作成しました: {backup_path}')
-        except Exception as e:
-            raise IOError(f'ファイルのバックアップに失敗しました: {backup_path}') from e
+def create_backup(file_path: Path) -> Path:
+    """ファイルを '.bak' 付きの名前で複製する"""
+    backup_path = file_path.with_suffix(file_path.suffix + '.bak')
+    try:
+        shutil.copy2(file_path, backup_path)
+        print(f'情報: バックアップを作成しました: {backup_path}')
+    except Exception as e:
+        raise IOError(f'ファイルのバックアップに失敗しました: {backup_path}') from e
+    return backup_path
 
-    return input_path if overwrite else input_path.parent / (prefix + input_path.name)
+def encode_content(content: str) -> bytes:
+    """書き込む内容をバイト列にする (テキストモードでの書き込みと同じく改行を OS の改行文字にする)"""
+    if os.linesep != '\n':
+        content = content.replace('\n', os.linesep)
+    return content.encode('utf-8')
 
-def read_file_content(file_path: Path) -> str:
-    """ファイルを読み込み、その内容を返す"""
+def read_file_content(file_path: Path, stats: Optional['FormatStats'] = None) -> str:
+    """ファイルを読み込み、その内容を返す (改行は '\\n' に統一する)"""
+    start = time.perf_counter()
     try:
-        return file_path.read_text(encoding='utf-8')
+        with file_path.open('rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size >= MMAP_MIN_SIZE:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    content = str(mm, 'utf-8')
+            else:
+                content = f.read().decode('utf-8')
     except Exception as e:
         raise IOError(f'ファイルの読み込みに失敗しました: {file_path}') from e
+    if '\r' in content:
+        content = content.replace('\r\n', '\n').replace('\r', '\n')
+    if stats is not None:
+        stats.bytes_read += size
+        stats.io_time += time.perf_counter() - start
+    return content
 
-def write_file_content(file_path: Path, content: str):
-    """ファイルに内容を書き込む"""
+def write_file_content(file_path: Path, content: str, mode_from: Optional[Path] = None, backup: bool = False,
+                       stats: Optional['FormatStats'] = None) -> bool:
+    """ファイルに内容を書き込み、書き込んだかを返す
+
+    既存のファイルとバイト単位で同じ内容であれば書き込まない (更新日時も変わらない)。
+    書き込みは一時ファイルを経由して置き換えるため、途中で失敗しても元のファイルは壊れない。
+    """
+    start = time.perf_counter()
+    data = encode_content(content)
     try:
-        file_path.write_text(content, encoding='utf-8')
+        if file_path.is_file() and file_path.stat().st_size == len(data) and file_path.read_bytes() == data:
+            written = False
+        else:
+            with AtomicFile(file_path, mode_from, backup) as f:
+                f.write(data)
+                f.commit()
+            written = True
     except Exception as e:
-        raise IOError(f'ファイルの書き込みに失敗しました: {file_path}') from e
\ No newline at end of file
+        raise IOError(f'ファイルの書き込みに失敗しました: {file_path}') from e
+    if stats is not None:
+        stats.bytes_written += len(data) if written else 0
+        stats.writes_skipped += 0 if written else 1
+        stats.io_time += time.perf_counter() - start
+    return written
+
+
+class AtomicFile:
+    """同じディレクトリの一時ファイルに書き込み、commit() で対象のファイルと置き換える
+
+    commit() せずに閉じた場合 (例外を含む) は一時ファイルを破棄し、対象のファイルは変更しない。
+    パーミッションは既存の対象ファイル (無ければ mode_from) から引き継ぐ。
+    backup が真の場合は置き換える直前に既存の対象ファイルの '.bak' を作成する。
+    """
+
+    def __init__(self, file_path: Path, mode_from: Optional[Path] = None, backup: bool = False):
+        self.file_path = file_path
+        self.mode_from = mode_from
+        self.backup = backup
+        fd, self._tmp_name = tempfile.mkstemp(prefix=f'.{file_path.name}.', suffix='.tmp', dir=file_path.parent)
+        self._file = open(fd, 'wb')
+        self._committed = False
+
+    def write(self, data: bytes) -> int:
+        return self._file.write(data)
+
+    def __getattr__(self, name):
+        # tell / seek 等は一時ファイルに委譲する (zipfile.ZipFile の書き込み先として使うため)
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._file, name)
+
+    def commit(self):
+        self._file.close()
+        exists = self.file_path.exists()
+        mode_source = self.file_path if exists else self.mode_from
+        if mode_source is not None:
+            shutil.copymode(mode_source, self._tmp_name)
+        if self.backup and exists:
+            create_backup(self.file_path)
+        os.replace(self._tmp_name, self.file_path)
+        self._committed = True
+
+    def __enter__(self) -> 'AtomicFile':
+        return self
+
+    def __exit__(self, *exc_info):
+        if not self._committed:
+            self._file.close()
+            Path(self._tmp_name).unlink(missing_ok=True)
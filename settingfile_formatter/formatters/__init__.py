@@ -1,5 +1,22 @@
+import importlib
+
 from .base import ContentFormatter, Tokenizer
-from .instance_input import InstanceInputFormatter
-from .string_literal import StringLiteralFormatter
-from .user_controls import UserControlsFormatter
-__all__ = ['ContentFormatter', 'Tokenizer', 'InstanceInputFormatter', 'StringLiteralFormatter', 'UserControlsFormatter']
+
+# 整形ルールのモジュールは属性の初回参照時にimportする (選択されたルールのみ読み込むため)
+_LAZY_FORMATTERS = {
+    'CompactFormatter': 'compact',
+    'InstanceInputFormatter': 'instance_input',
+    'NumericTableFormatter': 'numeric_table',
+    'StringLiteralFormatter': 'string_literal',
+    'UserControlsFormatter': 'user_controls',
+}
+__all__ = ['ContentFormatter', 'Tokenizer', 'CompactFormatter', 'InstanceInputFormatter', 'NumericTableFormatter', 'StringLiteralFormatter', 'UserControlsFormatter']
+
+
+def __getattr__(name):
+    module_name = _LAZY_FORMATTERS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module_name}', __name__), name)
+    globals()[name] = value
+    return value
@@ -1,16 +1,62 @@
 import re
-from typing import List, Tuple, Optional
-from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+from typing import Dict, List, Tuple, Optional, Union, TYPE_CHECKING
+from abc import ABC
+from contextlib import nullcontext
+
+if TYPE_CHECKING:
+    from .stats import FormatStats, RuleStats
+
+
+_first_char = itemgetter(0)
 
 
 class Tokenizer:
     """トークン化の共通処理を提供するクラス"""
 
-    TOKEN_PATTERN = r'([a-zA-Z_][a-zA-Z0-9_.]*)|(".*?[^\\]")|(\.\.)|([-+]?\d*\.?\d+)|([{}(),=\[\]])'
+    # NAME, STRING, CONCAT, NUMBER, PUNCT の順の字句 (TOKEN_PATTERN ではこの順のグループ番号になる)
+    # 文字列リテラルは1文字毎の選択にせず、エスケープ以外の連続をまとめて読む形にしている
+    TOKEN_GROUPS = (r'[a-zA-Z_][a-zA-Z0-9_.]*', r'"[^"\\]*(?:\\.[^"\\]*)*"', r'\.\.', r'[-+]?\d*\.?\d+', r'[{}(),=\[\]]')
+    TOKEN_PATTERN = '|'.join(f'({group})' for group in TOKEN_GROUPS)
     INDENT = '    '
+    # コンパイル済みパターンは全インスタンスで共有する
+    COMPILED_PATTERN = re.compile(TOKEN_PATTERN)
+    # グループの無いパターン (findall がトークン文字列のリストを直接返す)
+    FLAT_PATTERN = re.compile('|'.join(TOKEN_GROUPS))
+
+    # トークン種別 (NAME〜PUNCT は TOKEN_PATTERN のグループ番号、記号の一部は専用の種別に分ける)
+    # COMMENT / LONG_STRING はコメントと長い文字列 ('[[...]]' と行をまたぐ文字列)。行をまたぐものは行毎の断片を1トークンとする
+    NAME, STRING, CONCAT, NUMBER, PUNCT, OPEN_BRACE, CLOSE_BRACE, COMMA, ASSIGN, COMMENT, LONG_STRING = range(1, 12)
+    PUNCT_KINDS = {'{': OPEN_BRACE, '}': CLOSE_BRACE, ',': COMMA, '=': ASSIGN}
+    # トークンの先頭文字 -> 種別コード ('.' で始まるのは '..' 以外は数値)
+    KIND_TABLE = str.maketrans(
+        dict.fromkeys('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_', chr(NAME))
+        | {'"': chr(STRING)}
+        | dict.fromkeys('0123456789-+.', chr(NUMBER))
+        | dict.fromkeys('()[]', chr(PUNCT))
+        | {char: chr(kind) for char, kind in PUNCT_KINDS.items()})
+    # 種別コード列から括弧の位置を探すパターン
+    BRACE_KIND_PATTERN = re.compile(b'[' + re.escape(bytes([OPEN_BRACE, CLOSE_BRACE])) + b']')
+
+    # コメント・長い文字列・行をまたぐ文字列を含む行の字句パターン (グループ番号で字句を区別する)
+    SPECIAL_PATTERN = re.compile(
+        r'(--\[(=*)\[.*?\]\2\])'                              # 1: 行内で閉じる長いコメント
+        r'|(--\[(=*)\[.*)'                                    # 3: 次の行に続く長いコメント
+        r'|(--(?:.*\S)?)'                                     # 5: 行コメント
+        r'|(\[(=*)\[.*?\]\7\])'                               # 6: 行内で閉じる長い文字列
+        r'|(\[(=*)\[.*)'                                      # 8: 次の行に続く長い文字列
+        r'|("[^"\\]*(?:\\.[^"\\]*)*(?:\\|\\z\s*)$)'           # 10: 行末の '\' か '\z' で次の行に続く文字列
+        r'|(' + '|'.join(TOKEN_GROUPS) + ')')                 # 11: その他のトークン
+    _OPEN_COMMENT, _LINE_COMMENT, _OPEN_LONG, _OPEN_QUOTE, _OTHER = 3, 5, 8, 10, 11
+    # 次の行に続く文字列の残り (閉じる '"' の手前まで) と、さらに次の行に続く場合
+    _QUOTE_REST = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*')
+    _QUOTE_CONTINUED = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*(?:\\|\\z\s*)$')
+    # 行内で閉じる文字列 (is_special が真の行で、文字列を除いても該当するかを確かめる)
+    _CLOSED_STRING = re.compile(TOKEN_GROUPS[STRING - 1])
 
     def __init__(self):
-        self.pattern = re.compile(self.TOKEN_PATTERN)
+        self.pattern = self.COMPILED_PATTERN
 
     def update_nest_level(self, token: str, level: int) -> int:
         """括弧のネストレベルを更新 (順方向)"""
@@ -29,6 +75,125 @@ class Tokenizer:
         """コンテンツ全体をトークン化"""
         return [self.tokenize_line(line) for line in content.splitlines()]
 
+    @staticmethod
+    def is_special(text: str) -> bool:
+        """コメント・長い文字列・次の行に続く文字列を含み得る行 (複数行のテキストも可) か
+
+        文字列中の '--' 等も含めて判定するため、偽の場合のみ確実に含まない。
+        """
+        return ('--' in text or '[' in text and ('[[' in text or '[=' in text)
+                or '\\' in text and (text.endswith('\\') or '\\\n' in text or '\\z' in text))
+
+    @staticmethod
+    def may_open_span(text: str) -> bool:
+        """次の行に続く長い文字列・コメント・文字列を含み得るか ('--' の行コメントは次の行に続かない)"""
+        return ('[' in text and ('[[' in text or '[=' in text)
+                or '\\' in text and (text.endswith('\\') or '\\\n' in text or '\\z' in text))
+
+    def scan_line(self, line: str, continued: Optional[Tuple[int, str]] = None) -> 'TokenLine':
+        """1行をトークン文字列と種別コードの列にトークン化する
+
+        findall でトークン文字列を切り出し、種別は先頭文字の変換 (str.translate) でまとめて求める。
+        コメント等を含む行と、前の行から続く長い文字列・コメントの途中から始まる行 (continued は前の行の TokenLine.opened)
+        は _scan_special で1字句ずつ読む。
+        """
+        # is_special と同じ判定 (大半の行で呼び出しを省くため展開している)
+        if continued is not None or (
+                ('--' in line or '[' in line and ('[[' in line or '[=' in line)
+                 or '\\' in line and (line.endswith('\\') or '\\z' in line))
+                and self.is_special(self._CLOSED_STRING.sub('', line))):
+            return self._scan_special(line, continued)
+        tokens = self.FLAT_PATTERN.findall(line, len(line) - len(line.lstrip()))
+        firsts = ''.join(map(_first_char, tokens))
+        kinds = firsts.translate(self.KIND_TABLE).encode('latin-1')
+        if '.' in firsts:
+            kinds = bytearray(kinds)
+            for i, token in enumerate(tokens):
+                if token == '..':
+                    kinds[i] = self.CONCAT
+            kinds = bytes(kinds)
+        return TokenLine(tokens, kinds)
+
+    def scan_content(self, content: str) -> List['TokenLine']:
+        """コンテンツ全体を行毎の TokenLine に変換する"""
+        lines = content.splitlines()
+        result = [self.scan_line(line) for line in lines]
+        if not self.is_special(content):
+            return result
+        # 行末で閉じていない字句の後の行を、閉じるまで状態を引き継いでトークン化し直す
+        pos = 0
+        for i in [i for i, tokens in enumerate(result) if tokens.opened is not None]:
+            if i < pos:
+                continue
+            opened, pos = result[i].opened, i + 1
+            while opened is not None and pos < len(lines):
+                tokens = result[pos] = self.scan_line(lines[pos], opened)
+                opened = tokens.opened
+                pos += 1
+        return result
+
+    def token_starts(self, line: str, continued: Optional[Tuple[int, str]] = None) -> List[int]:
+        """scan_line と同じトークン列の各トークンの行内の開始位置を返す"""
+        if continued is not None or self.is_special(self._CLOSED_STRING.sub('', line)):
+            return [start for start, _token, _kind in self._special_tokens(line, continued)[0]]
+        return [match.start() for match in self.FLAT_PATTERN.finditer(line)]
+
+    def _scan_special(self, line: str, continued: Optional[Tuple[int, str]]) -> 'TokenLine':
+        found, opened = self._special_tokens(line, continued)
+        tokens = [token for _start, token, _kind in found]
+        kinds = bytes([kind for _start, _token, kind in found])
+        if continued is None and opened is None:
+            return TokenLine(tokens, kinds)
+        return SpanTokenLine(tokens, kinds, continued, opened)
+
+    def _special_tokens(self, line: str, continued: Optional[Tuple[int, str]]
+                        ) -> Tuple[List[Tuple[int, str, int]], Optional[Tuple[int, str]]]:
+        """コメント・長い文字列を区別して (開始位置, トークン, 種別) の列と、行末で閉じていない字句の状態を返す
+
+        状態は (種別, 閉じる字句) で、閉じる字句は長い文字列・コメントでは ']]' 等、'"' の文字列では '"'。
+        """
+        found: List[Tuple[int, str, int]] = []
+        pos = 0
+        if continued is not None:
+            kind, closer = continued
+            end = self._find_close(line, closer)
+            if end < 0:
+                if line:
+                    found.append((0, line, kind))
+                return found, continued
+            if end:
+                found.append((0, line[:end], kind))
+            pos = end
+        opened = None
+        kind_table = self.KIND_TABLE
+        for match in self.SPECIAL_PATTERN.finditer(line, pos):
+            group = match.lastindex
+            token = match.group()
+            if group == self._OTHER:
+                kind = self.CONCAT if token == '..' else ord(token[0].translate(kind_table))
+            elif group <= self._LINE_COMMENT:
+                kind = self.COMMENT
+                if group == self._OPEN_COMMENT:
+                    opened = (kind, f']{match.group(4)}]')
+            else:
+                kind = self.LONG_STRING
+                if group == self._OPEN_LONG:
+                    opened = (kind, f']{match.group(9)}]')
+                elif group == self._OPEN_QUOTE:
+                    opened = (kind, '"')
+            found.append((match.start(), token, kind))
+        return found, opened
+
+    def _find_close(self, line: str, closer: str) -> int:
+        """前の行から続く字句が閉じる位置 (閉じる字句の直後) を返す (この行でも閉じない場合は -1)"""
+        if closer != '"':
+            end = line.find(closer)
+            return end + len(closer) if end >= 0 else -1
+        if self._QUOTE_CONTINUED.match(line):
+            return -1
+        # 閉じる '"' が無く続きも無い (構文エラー) 場合は行末で閉じたものとする
+        return min(self._QUOTE_REST.match(line).end() + 1, len(line))
+
     def find_brace_end(self, tokens: List[str], start: int) -> Optional[int]:
         """対応する閉じ括弧 '}' のインデックスを返す"""
         if not tokens or start >= len(tokens) or tokens[start] != '{': return None
@@ -38,6 +203,23 @@ class Tokenizer:
             if level == 0 and tokens[i] == '}': return i
         return None
 
+    def match_braces(self, tokens: List[str]) -> Dict[int, int]:
+        """'{' のインデックスから対応する '}' のインデックスへの対応表を1パスで作成する"""
+        pairs, stack = {}, []
+        for i, token in enumerate(tokens):
+            if token == '{':
+                stack.append(i)
+            elif token == '}' and stack:
+                pairs[stack.pop()] = i
+        return pairs
+
+    def build_brace_index(self, tokens_per_line: List['TokenLine'], lines: Optional[List[str]] = None) -> 'BraceIndex':
+        """行毎のトークン列から括弧の対応と親ブロックの索引を作成する
+
+        作成時に求めるのは行毎のネストレベルのみで、'{' 毎の対応と親ブロックは最初の問い合わせ時に作成する。
+        """
+        return BraceIndex([tokens.kinds for tokens in tokens_per_line], lines)
+
     def count_elements(self, tokens: List[str]) -> int:
         """要素数をカウント（末尾カンマ無視）"""
         if not tokens:
@@ -46,37 +228,594 @@ class Tokenizer:
         return clean_tokens.count(',') + 1 if clean_tokens else 0
 
 
+class TokenLine(list):
+    """1行分のトークン文字列のリスト (Tokenizer.scan_line で作成)
+
+    文字列のリストと同様に扱え、各トークンの種別コード (Tokenizer.NAME など) を kinds に bytes で持つ。
+    continued / opened は行頭で続いている・行末で閉じていない長い文字列やコメントの状態 (SpanTokenLine のみ値を持つ)。
+    """
+
+    __slots__ = ('kinds',)
+    continued: Optional[Tuple[int, str]] = None
+    opened: Optional[Tuple[int, str]] = None
+
+    def __init__(self, tokens: List[str], kinds: bytes):
+        super().__init__(tokens)
+        self.kinds = kinds
+
+    def __repr__(self) -> str:
+        return f'TokenLine({list(self)!r})'
+
+    def find_kind(self, kind: int, start: int = 0) -> int:
+        """種別が kind の最初のトークンのインデックスを返す (無ければ -1)"""
+        return self.kinds.find(kind, start)
+
+    def startswith(self, tokens: List[str]) -> bool:
+        """先頭のトークン列が tokens と一致するか"""
+        return self[:len(tokens)] == tokens
+
+    def has_verbatim(self) -> bool:
+        """コメントか長い文字列 (トークンから組み立て直すと内容が変わり得る字句) を含むか"""
+        kinds = self.kinds
+        return Tokenizer.COMMENT in kinds or Tokenizer.LONG_STRING in kinds
+
+
+class SpanTokenLine(TokenLine):
+    """前後の行にまたがる長い文字列・コメントを含む行の TokenLine"""
+
+    __slots__ = ('continued', 'opened')
+
+    def __init__(self, tokens: List[str], kinds: bytes, continued: Optional[Tuple[int, str]],
+                 opened: Optional[Tuple[int, str]]):
+        super().__init__(tokens, kinds)
+        self.continued = continued
+        self.opened = opened
+
+
+class BraceIndex:
+    """括弧の対応と親ブロックの索引 (Tokenizer.build_brace_index で作成)
+
+    ブロックは '{' の出現順に採番し、位置は (行番号, 行内トークン番号) で表す。
+    トークン毎の情報は持たず、トークンを囲むブロックは問い合わせ時に '{' の位置の二分探索と親ブロックを辿って求める。
+    """
+
+    __slots__ = ('line_depths', 'lines', '_kinds', '_line_starts', '_opens', '_closes', '_parents')
+
+    def __init__(self, kinds_per_line: List[bytes], lines: Optional[List[str]] = None):
+        self.lines = lines                                    # インデントを参照する行リスト
+        self._kinds = kinds_per_line
+        # 各行の先頭 (と末尾) でのネストレベル (括弧の種別コードの数から求める)
+        open_code, close_code = bytes([Tokenizer.OPEN_BRACE]), bytes([Tokenizer.CLOSE_BRACE])
+        self.line_depths: List[int] = []
+        depth = 0
+        for kinds in kinds_per_line:
+            self.line_depths.append(depth)
+            depth += kinds.count(open_code) - kinds.count(close_code)
+        self.line_depths.append(depth)
+        # 以下は '{' 毎の情報 (_build_blocks で作成。位置は全行のトークンを通した番号)
+        self._line_starts: Optional[List[int]] = None         # 行番号 -> 行の先頭トークンの番号
+        self._opens: List[int] = []                           # ブロック番号 -> '{' の位置 (昇順)
+        self._closes: List[int] = []                          # ブロック番号 -> 対応する '}' の位置 (無ければ -1)
+        self._parents: List[int] = []                         # ブロック番号 -> 囲むブロック番号 (最上位は -1)
+
+    def _build_blocks(self):
+        """全行の種別コードを連結し、括弧の位置のみを走査して '{' 毎の対応と親ブロックを記録する"""
+        line_starts, offset = [], 0
+        for kinds in self._kinds:
+            line_starts.append(offset)
+            offset += len(kinds)
+        all_kinds = b''.join(self._kinds)
+        opens, closes, parents = self._opens, self._closes, self._parents
+        stack = []
+        open_brace = Tokenizer.OPEN_BRACE
+        for match in Tokenizer.BRACE_KIND_PATTERN.finditer(all_kinds):
+            pos = match.start()
+            if all_kinds[pos] == open_brace:
+                parents.append(stack[-1] if stack else -1)
+                stack.append(len(opens))
+                opens.append(pos)
+                closes.append(-1)
+            elif stack:
+                closes[stack.pop()] = pos
+        self._line_starts = line_starts
+
+    def _position(self, line_num: int, token_idx: int) -> int:
+        if self._line_starts is None:
+            self._build_blocks()
+        return self._line_starts[line_num] + token_idx
+
+    def block_end(self, line_num: int, token_idx: int) -> Optional[Tuple[int, int]]:
+        """'{' の位置から対応する '}' の位置を返す"""
+        pos = self._position(line_num, token_idx)
+        block_id = bisect_left(self._opens, pos)
+        if block_id == len(self._opens) or self._opens[block_id] != pos or self._closes[block_id] < 0:
+            return None
+        close = self._closes[block_id]
+        close_line = bisect_right(self._line_starts, close) - 1
+        return close_line, close - self._line_starts[close_line]
+
+    def parent_block(self, line_num: int, token_idx: int) -> int:
+        """トークンを囲むブロック番号を返す (最上位は -1)"""
+        pos = self._position(line_num, token_idx)
+        block_id = bisect_left(self._opens, pos) - 1
+        closes, parents = self._closes, self._parents
+        # 直前の '{' のブロックがトークンより前で閉じていれば、閉じていない親ブロックまで辿る
+        while block_id >= 0 and 0 <= closes[block_id] <= pos:
+            block_id = parents[block_id]
+        return block_id
+
+    def parent_indent(self, line_num: int, token_idx: int) -> str:
+        """トークンを囲むブロックの '{' がある行のインデントを返す"""
+        block_id = self.parent_block(line_num, token_idx)
+        if block_id < 0 or self.lines is None:
+            return ""
+        line = self.lines[bisect_right(self._line_starts, self._opens[block_id]) - 1]
+        return line[:len(line) - len(line.lstrip())]
+
+
+class Document:
+    """パイプライン全体で共有する整形対象ドキュメント
+
+    行リストと行毎のトークン列を保持し、トークン化は初回参照時に1度だけ行う。
+    行単位の置換では置換された行のみを再トークン化する。
+    """
+
+    def __init__(self, content: str, tokenizer: Optional[Tokenizer] = None):
+        self.tokenizer = tokenizer or Tokenizer()
+        self._text: Optional[str] = content
+        self._lines: Optional[List[str]] = None
+        self._tokens: Optional[List[Optional[TokenLine]]] = None
+        self._brace_index: Optional[BraceIndex] = None
+        self._trailing_newline = content.endswith('\n')
+        # 行の文字列 -> トークン列 (内容を置き換えても保持し、同じ文字列の行は再トークン化しない)
+        self._line_tokens: Dict[str, TokenLine] = {}
+        # 行をまたぐ長い文字列・コメントがあるか (ある場合は前の行の状態を引き継いでトークン化する)
+        self._spans = False
+        # 整形前の行と、現在の各行の整形前の行番号 (変更された行は None。track_changes を呼んだ場合のみ記録する)
+        self._original_text: Optional[str] = None
+        self._original_lines: Optional[List[str]] = None
+        self._origin: Optional[List[Optional[int]]] = None
+        # 計測中のルールの統計 (FormatStats.measure が設定する)
+        self.stats: Optional['RuleStats'] = None
+        # ストリーミング整形でチャンク間に引き継ぐ整形ルールの状態 (streaming.format_chunk が設定する)
+        self.state: Optional[Dict[str, int]] = None
+
+    def _phase(self, name: str):
+        return self.stats.phase(name) if self.stats is not None else nullcontext()
+
+    @property
+    def text(self) -> str:
+        """現在の内容を文字列として返す"""
+        if self._text is None:
+            self._text = '\n'.join(self._lines) + ('\n' if self._trailing_newline and self._lines else '')
+        return self._text
+
+    @property
+    def lines(self) -> List[str]:
+        """現在の内容を行リストとして返す（改行文字なし）"""
+        if self._lines is None:
+            self._lines = self._text.splitlines()
+        return self._lines
+
+    @property
+    def tokens_per_line(self) -> List[TokenLine]:
+        """行毎のトークン列を返す（未トークン化の行のみ処理する。既出の文字列の行はそのトークン列を共有する）
+
+        前の行から続く長い文字列・コメントの状態が変わった行もトークン化し直す。
+        """
+        lines = self.lines
+        if self._tokens is None:
+            self._tokens = [None] * len(lines)
+        tokens = self._tokens
+        if None not in tokens:
+            return tokens
+        with self._phase('tokenize'):
+            count = 0
+            known = self._line_tokens
+            if not self._spans:
+                # 行をまたぐ字句が無い間は行毎に独立にトークン化する
+                for i, line_tokens in enumerate(tokens):
+                    if line_tokens is None:
+                        line = lines[i]
+                        line_tokens = known.get(line)
+                        if line_tokens is None:
+                            line_tokens = known[line] = self.tokenizer.scan_line(line)
+                        tokens[i] = line_tokens
+                        count += len(line_tokens)
+                        if line_tokens.opened is not None:
+                            self._spans = True
+                            break
+            if self._spans:
+                # 前の行の状態から続けてトークン化し、状態が変わった行はトークン化し直す
+                opened = None
+                for i, line_tokens in enumerate(tokens):
+                    if line_tokens is None or line_tokens.continued != opened:
+                        line = lines[i]
+                        if opened is not None:
+                            line_tokens = self.tokenizer.scan_line(line, opened)
+                        else:
+                            line_tokens = known.get(line)
+                            if line_tokens is None:
+                                line_tokens = known[line] = self.tokenizer.scan_line(line)
+                        tokens[i] = line_tokens
+                        count += len(line_tokens)
+                    opened = line_tokens.opened
+            if self.stats is not None:
+                self.stats.tokens += count
+        return tokens
+
+    @property
+    def brace_index(self) -> BraceIndex:
+        """括弧の対応と親ブロックの索引を返す（内容が変更されるまでキャッシュする）"""
+        if self._brace_index is None:
+            tokens_per_line = self.tokens_per_line
+            with self._phase('index'):
+                self._brace_index = self.tokenizer.build_brace_index(tokens_per_line, self.lines)
+        return self._brace_index
+
+    @property
+    def original_text(self) -> Optional[str]:
+        """track_changes を呼んだ時点の内容 (呼んでいない場合は None)"""
+        return self._original_text
+
+    @property
+    def original_lines(self) -> Optional[List[str]]:
+        """track_changes を呼んだ時点の行リスト (呼んでいない場合は None)"""
+        return self._original_lines
+
+    def track_changes(self):
+        """以降の変更を行単位で記録し、changed_ranges で変更された範囲を求められるようにする"""
+        self._original_text = self.text
+        self._original_lines = list(self.lines)
+        self._origin = list(range(len(self._original_lines)))
+
+    def changed_ranges(self) -> List[Tuple[int, int, int, int]]:
+        """track_changes 以降に変更された範囲を (整形前の開始行, 終了行, 現在の開始行, 終了行) のリストで返す
+
+        範囲の外の行は整形前と同じ文字列で、同じ順に並んでいる。
+        """
+        ranges = []
+        prev_origin = prev = -1
+        for i, origin in enumerate(self._origin):
+            if origin is None:
+                continue
+            if origin != prev_origin + 1 or i != prev + 1:
+                ranges.append((prev_origin + 1, origin, prev + 1, i))
+            prev_origin, prev = origin, i
+        if prev_origin + 1 != len(self._original_lines) or prev + 1 != len(self._origin):
+            ranges.append((prev_origin + 1, len(self._original_lines), prev + 1, len(self._origin)))
+        return ranges
+
+    def cached_tokens(self, line: str) -> Optional[TokenLine]:
+        """line と同じ文字列の行をトークン化済みであればそのトークン列を返す (無ければ None)"""
+        return self._line_tokens.get(line)
+
+    def scan_lines(self, lines: List[str]) -> List[TokenLine]:
+        """lines を行毎に独立にトークン化する (既出の文字列の行はトークン列を共有する。行をまたぐ字句は考慮しない)"""
+        known = self._line_tokens
+        result = []
+        for line in lines:
+            line_tokens = known.get(line)
+            if line_tokens is None:
+                line_tokens = known[line] = self.tokenizer.scan_line(line)
+            result.append(line_tokens)
+        return result
+
+    def opens_span(self, lines: List[str]) -> bool:
+        """lines に行末で閉じていない長い文字列・コメントを含む行があるか (含み得る行のみトークン化して調べる)"""
+        known = self._line_tokens
+        may_open_span = self.tokenizer.may_open_span
+        for line in lines:
+            if not may_open_span(line):
+                continue
+            tokens = known.get(line)
+            if tokens is None:
+                # 文字列リテラルの中のみにある場合はトークン化しない (Tokenizer.scan_line と同じ判定)
+                if not self.tokenizer.is_special(Tokenizer._CLOSED_STRING.sub('', line)):
+                    continue
+                tokens = self.scan_lines([line])[0]
+            if tokens.opened is not None:
+                return True
+        return False
+
+    def line_starts(self) -> List[int]:
+        """各行の先頭オフセットを返す（行区切りは '\\n' を前提とする）"""
+        starts, offset = [], 0
+        for line in self.lines:
+            starts.append(offset)
+            offset += len(line) + 1
+        return starts
+
+    def set_text(self, content: str):
+        """内容全体を置き換える（キャッシュは破棄される）"""
+        if content == self._text:
+            return
+        self._text = content
+        self._lines = None
+        self._tokens = None
+        self._spans = False
+        self._brace_index = None
+        self._trailing_newline = content.endswith('\n')
+        if self._origin is not None:
+            self._origin = [None] * len(self.lines)
+        if self.stats is not None:
+            self.stats.edits += 1
+
+    def replace_lines(self, start: int, end: int, new_lines: List[str]):
+        """lines[start:end] を new_lines で置き換える"""
+        lines = self.lines
+        lines[start:end] = new_lines
+        if self.stats is not None:
+            self.stats.edits += 1
+        if self._tokens is not None:
+            self._tokens[start:end] = [None] * len(new_lines)
+        if self._origin is not None:
+            self._origin[start:end] = [None] * len(new_lines)
+        self._text = None
+        self._brace_index = None
+
+    def replace_spans(self, spans: List[Tuple[int, int, str]]):
+        """現在のテキスト上のオフセット範囲 (start, end, 置換文字列) をまとめて置き換える
+
+        範囲は重複せず昇順であること。影響を受けた行のみ再トークン化される。
+        """
+        if not spans:
+            return
+        line_starts = self.line_starts()
+        lines = self.lines
+        edits = EditBuffer(lines)
+
+        # 同じ行に掛かる範囲は1つの行置換にまとめる
+        groups: List[Tuple[int, int, List[Tuple[int, int, str]]]] = []
+        for start, end, text in spans:
+            first, last = bisect_right(line_starts, start) - 1, bisect_right(line_starts, end) - 1
+            if groups and first <= groups[-1][1]:
+                groups[-1] = (groups[-1][0], max(last, groups[-1][1]), groups[-1][2] + [(start, end, text)])
+            else:
+                groups.append((first, last, [(start, end, text)]))
+
+        for first, last, group_spans in groups:
+            base = line_starts[first]
+            segment = EditBuffer('\n'.join(lines[first:last + 1]))
+            for start, end, text in group_spans:
+                segment.replace(start - base, end - base, text)
+            edits.replace(first, last + 1, segment.build().split('\n'))
+        self.apply_edits(edits)
+
+    def apply_edits(self, edits: 'EditBuffer'):
+        """行リストに対して記録された置換を1度に反映する"""
+        if not edits:
+            return
+        if self.stats is not None:
+            self.stats.edits += len(edits)
+        if self._tokens is not None:
+            self._tokens = edits.build_parallel(self._tokens, None)
+        if self._origin is not None:
+            self._origin = edits.build_parallel(self._origin, None)
+        self._lines = edits.build()
+        self._text = None
+        self._brace_index = None
+
+
+class EditBuffer:
+    """元の列 (文字列または行リスト) に対する範囲置換を記録し、最後に1度だけ組み立てる
+
+    置換範囲は常に元の列の位置で指定するため、記録順や置換による位置ずれを考慮する必要はない。
+    """
+
+    def __init__(self, source: Union[str, List]):
+        self.source = source
+        self._edits: List[Tuple[int, int, Union[str, List]]] = []
+
+    def __bool__(self) -> bool:
+        return bool(self._edits)
+
+    def __len__(self) -> int:
+        return len(self._edits)
+
+    def replace(self, start: int, end: int, replacement: Union[str, List]):
+        """source[start:end] を replacement で置き換える"""
+        if not 0 <= start <= end <= len(self.source):
+            raise ValueError(f'置換範囲が不正です: {start}-{end}')
+        self._edits.append((start, end, replacement))
+
+    def insert(self, pos: int, replacement: Union[str, List]):
+        """pos の位置に replacement を挿入する"""
+        self.replace(pos, pos, replacement)
+
+    def _sorted_edits(self) -> List[Tuple[int, int, Union[str, List]]]:
+        edits = sorted(self._edits, key=lambda e: (e[0], e[1]))
+        for prev, cur in zip(edits, edits[1:]):
+            if cur[0] < prev[1]:
+                raise ValueError(f'置換範囲が重複しています: {prev[0]}-{prev[1]} と {cur[0]}-{cur[1]}')
+        return edits
+
+    def build(self) -> Union[str, List]:
+        """置換を反映した新しい列を返す (元の列は変更しない)"""
+        source = self.source
+        pieces = []
+        pos = 0
+        for start, end, replacement in self._sorted_edits():
+            pieces.append(source[pos:start])
+            pieces.append(replacement)
+            pos = end
+        pieces.append(source[pos:])
+        if isinstance(source, str):
+            return ''.join(pieces)
+        return [item for piece in pieces for item in piece]
+
+    def build_parallel(self, parallel: List, fill) -> List:
+        """source と同じ長さの並列リストに同じ置換を反映する (置換部分は fill で埋める)"""
+        result = []
+        pos = 0
+        for start, end, replacement in self._sorted_edits():
+            result.extend(parallel[pos:start])
+            result.extend([fill] * len(replacement))
+            pos = end
+        result.extend(parallel[pos:])
+        return result
+
+
+class StringChain:
+    """`key = "..." .. "..."` 形式の文字列連結 (StringChainScanner.scan で作成)"""
+
+    __slots__ = ('key', 'start', 'end', 'parts')
+
+    def __init__(self, key: str, start: int, end: int, parts: List[Tuple[int, int]]):
+        self.key = key          # キー名
+        self.start = start      # キーの先頭位置
+        self.end = end          # 最後の文字列リテラルの直後の位置
+        self.parts = parts      # 各文字列リテラル (引用符を含む) の (開始, 終了) 位置
+
+
+class StringChainScanner:
+    """文字列連結 `key = "..." .. "..."` をテキスト全体から1パスで検出する
+
+    文字列リテラル (エスケープを含む) とコメントは1つの字句として読み飛ばし、
+    字句の並びを状態遷移で判定する。字句パターンは後戻りしない形のため、入力の長さに対して線形時間で動作する。
+    連結の途中に文字列以外を含むものは対象外とする。
+    """
+
+    # 字句パターン (グループ番号が字句種別に対応、空白は読み飛ばす)
+    # 閉じられていない文字列は行末までを1つの字句 (その他) とする
+    # 文字列は1文字毎の選択を繰り返さないよう、エスケープ以外の並びを1回の繰り返しで読む形にしている
+    _TOKEN = re.compile(
+        r'("[^"\\\n]*(?:\\.[^"\\\n]*)*")'
+        r'|(\'[^\'\\\n]*(?:\\.[^\'\\\n]*)*\'?|--\[\[(?:.*?\]\]|.*)|--[^\n]*)'
+        r'|(\.\.)'
+        r'|(=)'
+        r'|([A-Za-z_]\w*)'
+        r'|("[^"\\\n]*(?:\\.[^"\\\n]*)*|\S)',
+        re.DOTALL,
+    )
+    _STRING, _SKIP, _DOTS, _EQUALS, _NAME, _OTHER = range(1, 7)
+    # 文字列の後に続く '..' と文字列の並び (長い連結を字句毎の状態遷移を経ずに1回の照合で読み進める)
+    _RUN_STRING = re.compile(r'"[^"\\\n]*(?:\\.[^"\\\n]*)*"')
+    _RUN = re.compile(rf'(?:\s*\.\.\s*{_RUN_STRING.pattern})+')
+
+    # 走査中の状態
+    _IDLE, _KEY, _ASSIGN, _PART, _CONCAT = range(5)
+
+    def scan(self, text: str) -> List[StringChain]:
+        if '..' not in text:
+            return []
+        chains: List[StringChain] = []
+        state, key, key_start, parts = self._IDLE, '', 0, []
+        tokens = self._TOKEN.finditer(text)
+        while tokens is not None:
+            for m in tokens:
+                kind = m.lastindex
+                if kind == self._SKIP:
+                    continue
+
+                if state == self._PART:
+                    if kind == self._DOTS:
+                        state = self._CONCAT
+                        continue
+                    # 文字列の後に '..' 以外が来たら連結の終わり
+                    if len(parts) > 1:
+                        chains.append(StringChain(key, key_start, parts[-1][1], parts))
+                    state = self._IDLE
+
+                if kind == self._NAME:
+                    state, key, key_start = self._KEY, m.group(), m.start()
+                elif kind == self._EQUALS and state == self._KEY:
+                    state = self._ASSIGN
+                elif kind == self._STRING and state in (self._ASSIGN, self._CONCAT):
+                    if state == self._ASSIGN:
+                        parts = []
+                    parts.append(m.span())
+                    state = self._PART
+                    run = self._RUN.match(text, m.end())
+                    if run is not None:
+                        # 続く '..' と文字列の並びの部分をまとめて取り出し、並びの後から走査を続ける
+                        parts.extend(part.span() for part in self._RUN_STRING.finditer(text, m.end(), run.end()))
+                        tokens = self._TOKEN.finditer(text, run.end())
+                        break
+                else:
+                    state = self._IDLE
+            else:
+                tokens = None
+
+        if state == self._PART and len(parts) > 1:
+            chains.append(StringChain(key, key_start, parts[-1][1], parts))
+        return chains
+
+
 class ContentFormatter(ABC):
-    """コンテンツ整形の基底クラス"""
+    """コンテンツ整形の基底クラス
+
+    サブクラスは format_content (文字列単位) と format_document (Document単位)
+    のどちらか一方を実装する。
+    """
+
+    # ツール単位に分割した各部分を独立に整形できるか (文書全体の状態を使うルールは False)
+    CHUNK_LOCAL = True
+    # 整形対象を含み得るテキストにマッチするパターン (None の場合は常に適用する)
+    PROBE: Optional[re.Pattern] = None
+    # 'all' で適用するか (False のルールは cfggen.py が config.json に記録し、明示的に指定した場合のみ適用する)
+    IN_ALL = True
+    # ツール単位の逐次整形 (streaming) に使えるか (整形後もチャンクを囲む先頭・末尾の行を保つ)
+    STREAMABLE = True
 
     def __init__(self):
         self.tokenizer = Tokenizer()
+        # 計測中の統計 (FormatStats.measure が設定する)
+        self.stats: Optional['RuleStats'] = None
+
+    def _phase(self, name: str):
+        """処理フェーズを計測するコンテキストマネージャ (計測中でなければ何もしない)"""
+        return self.stats.phase(name) if self.stats is not None else nullcontext()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if (cls.format_content is ContentFormatter.format_content
+                and cls.format_document is ContentFormatter.format_document):
+            raise TypeError(f'{cls.__name__} は format_content または format_document を実装する必要があります')
+
+    def applies_to(self, text: str) -> bool:
+        """テキストが整形対象を含み得るか (偽の場合は整形しても変化しないため、トークン化せずに省略できる)"""
+        return self.PROBE is None or self.PROBE.search(text) is not None
 
-    @abstractmethod
     def format_content(self, content: str) -> str:
         """コンテンツを整形"""
-        pass
+        doc = Document(content, self.tokenizer)
+        self.format_document(doc)
+        return doc.text
+
+    def format_document(self, doc: Document):
+        """共有ドキュメントを整形（既定では format_content に委譲）"""
+        doc.set_text(self.format_content(doc.text))
 
-    def _extract_blocks(self, tokens_per_line: List[List[str]], start_tokens: List[str]) -> List[Tuple[int, int]]:
-        """指定されたトークンで始まるブロックの範囲を抽出する"""
-        blocks = []
-        start_line = -1
-        nest_level = 0
+    def _extract_blocks(self, tokens_per_line: List[TokenLine], start_tokens: List[str],
+                        index: Optional[BraceIndex] = None) -> List[Tuple[int, int]]:
+        """指定されたトークンで始まるブロックの範囲を抽出する
 
-        for i, line_tokens in enumerate(tokens_per_line):
-            if start_line == -1:
-                if len(line_tokens) >= len(start_tokens) and line_tokens[:len(start_tokens)] == start_tokens:
-                    start_line = i
-                    nest_level = 0
+        ネストレベルは索引の行毎の値を参照し、ブロック内部の行のトークンは走査しない。
+        """
+        with self._phase('extract_blocks'):
+            if index is None:
+                index = self.tokenizer.build_brace_index(tokens_per_line)
+            depths = index.line_depths
+            blocks = []
+            line_count = len(tokens_per_line)
+            i = 0
 
-            if start_line != -1:
-                for token in line_tokens:
-                    nest_level = self.tokenizer.update_nest_level(token, nest_level)
+            while i < line_count:
+                line_tokens = tokens_per_line[i]
+                if not line_tokens.startswith(start_tokens):
+                    i += 1
+                    continue
 
-                if nest_level == 0:
-                    blocks.append((start_line, i))
-                    start_line = -1
-        return blocks
+                # 行末のネストレベルが開始行の先頭と同じに戻る行までをブロックとする
+                end = i
+                while end < line_count and depths[end + 1] != depths[i]:
+                    end += 1
+                if end == line_count:
+                    break
+                blocks.append((i, end))
+                i = end + 1
+            return blocks
 
     def _format_multi_line(self, key: str, tokens: List[str], indent: str, has_comma: bool) -> List[str]:
         """複数行形式で整形"""
@@ -99,4 +838,22 @@ class ContentFormatter(ABC):
 
         result.append(f"{indent}}},")
 
-        return result
\ No newline at end of file
+        return result
+
+
+def apply_formatters(doc: Document, formatters: List[Tuple[str, ContentFormatter]],
+                     stats: Optional['FormatStats'] = None):
+    """(ルール名, フォーマッター) の並びを順に doc へ適用する
+
+    適用前に applies_to で判定し、整形対象を含まないルールは省略する (stats には省略として記録する)。
+    """
+    for name, f in formatters:
+        if not f.applies_to(doc.text):
+            if stats is not None:
+                stats.skip(name)
+            continue
+        if stats is None:
+            f.format_document(doc)
+            continue
+        with stats.measure(name, f, doc):
+            f.format_document(doc)
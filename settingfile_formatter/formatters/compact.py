@@ -0,0 +1,75 @@
+import re
+from typing import List
+
+from . import lua_string
+from .base import ContentFormatter
+
+# 連結しても字句が変わらないよう間に空白が必要な文字の組 (名前・数値同士、'--' のコメント化、'[[' の長い文字列化等)
+_WORD_CHARS = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_.')
+_GLUE = {'-': '-', '[': '[=', '=': '=', '<': '=', '>': '=', '~': '='}
+
+
+class CompactFormatter(ContentFormatter):
+    """空白・改行を詰め、'..' で連結された文字列リテラルを1つにまとめた最小の表記にする
+
+    埋め込みやアーカイブでの配布用に、他の整形ルールとは逆に内容を小さくする。'all' には含めない。
+    コメントは残す (行コメントの後には改行を置く)。
+    """
+
+    # 他のルールで展開した結果を詰めるため、明示的に指定した場合のみ最後に適用する
+    IN_ALL = False
+    # 文書全体を1行にまとめるため、ツール単位の分割・逐次整形はできない
+    CHUNK_LOCAL = False
+    STREAMABLE = False
+
+    # コメント・空白・'..' で連結した文字列も区別する必要があるため、Tokenizer.TOKEN_PATTERN とは別の字句で1パスに走査する
+    # 長い括弧 '[==[ ... ]==]' は開きと同じ数の '=' の閉じまでを1つの字句にする (3, 6 は '=' の並び)
+    # 文字列中の '\z' に続く空白 (改行を含む) は文字列の一部
+    LEX_PATTERN = re.compile(
+        r'(\s+)'                                                          # 1: 空白
+        r'|(--\[(=*)\[.*?\]\3\]|--[^\n]*)'                                # 2: コメント
+        r'|("(?:[^"\\\n]|\\z\s*|\\.)*"(?:\s*\.\.\s*"(?:[^"\\\n]|\\z\s*|\\.)*")*)'  # 4: 文字列 ('..' の連結を含む)
+        r'|(\'(?:[^\'\\\n]|\\z\s*|\\.)*\'|\[(=*)\[.*?\]\6\])'                # 5: その他の文字列
+        r'|(,(?=\s*\}))'                                                  # 7: '}' の直前のカンマ
+        r'|([^\s"\'\-\[,]+|.)',                                           # 8: 名前・数値・記号 (続くものはまとめる)
+        re.DOTALL,
+    )
+    _LITERAL_BODY = re.compile(r'"((?:[^"\\\n]|\\z\s*|\\.)*)"', re.DOTALL)
+
+    def format_content(self, content: str) -> str:
+        pieces: List[str] = []
+        append = pieces.append
+        word_chars, glue = _WORD_CHARS, _GLUE
+        last = ''           # 出力済みの最後の文字
+        spaced = False      # 直前に空白を読み飛ばしたか
+        with self._phase('compact'):
+            for match in self.LEX_PATTERN.finditer(content):
+                kind = match.lastindex
+                if kind == 1:
+                    spaced = True
+                    continue
+                if kind == 7:
+                    continue
+                token = match.group(kind)
+                if kind == 4 and '..' in token and token.count('"') > 2:
+                    token = self._join_literals(token)
+                first = token[0]
+                if spaced and last and ((last in word_chars and first in word_chars) or first in glue.get(last, '')):
+                    append(' ')
+                append(token)
+                spaced = False
+                if kind == 2 and match.group(3) is None:
+                    # 行コメントは改行で終える
+                    append('\n')
+                    last = '\n'
+                else:
+                    last = token[-1]
+        text = ''.join(pieces)
+        if content.endswith('\n') and not text.endswith('\n'):
+            text += '\n'
+        return text
+
+    def _join_literals(self, chain: str) -> str:
+        """'..' で連結された文字列リテラルを繋げられる限り1つのリテラルにまとめる"""
+        bodies = lua_string.concat(self._LITERAL_BODY.findall(chain))
+        return '..'.join(f'"{body}"' for body in bodies)
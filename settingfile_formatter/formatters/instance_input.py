@@ -1,23 +1,31 @@
-from .base import ContentFormatter
+from .base import ContentFormatter, Document
 import re
 
 class InstanceInputFormatter(ContentFormatter):
     """Inputxx = InstanceInput 再インデックス処理"""
 
     INPUT_PATTERN = re.compile(r'^(\s*)Input\d+\s*=\s*InstanceInput\s*\{')
+    PROBE = re.compile(r'InstanceInput\s*\{')
+    # 採番は文書全体で連番のため、並列整形ではツール単位に分割せず最後に文書全体へ適用する
+    CHUNK_LOCAL = False
+    # ストリーミング整形時にチャンク間で引き継ぐ採番済みの数
+    STATE_KEY = 'instance_input.count'
 
-    def format_content(self, content: str) -> str:
-        lines = content.splitlines(keepends=True)
-        new_lines = []
-        input_count = 1
-        for line in lines:
-            m = self.INPUT_PATTERN.match(line)
-            if m:
-                indent = m.group(1)
-                replaced = f"{indent}Input{input_count} = InstanceInput {{"
-                new_line = replaced + line[len(m.group(0)):]
-                new_lines.append(new_line)
-                input_count += 1
-            else:
-                new_lines.append(line)
-        return ''.join(new_lines)
+    def format_document(self, doc: Document):
+        offset = doc.state.get(self.STATE_KEY, 0) if doc.state is not None else 0
+        count = self._renumber(doc, offset)
+        if doc.state is not None:
+            doc.state[self.STATE_KEY] = offset + count
+
+    def _renumber(self, doc: Document, offset: int) -> int:
+        """offset + 1 から順に振り直し、対象の数を返す"""
+        with self._phase('scan'):
+            line_matches = [(i, m) for i, line in enumerate(doc.lines) if (m := self.INPUT_PATTERN.match(line))]
+        with self._phase('rebuild'):
+            lines = doc.lines
+            for input_count, (i, m) in enumerate(line_matches, offset + 1):
+                replaced = f"{m.group(1)}Input{input_count} = InstanceInput {{"
+                new_line = replaced + lines[i][len(m.group(0)):]
+                if new_line != lines[i]:
+                    doc.replace_lines(i, i + 1, [new_line])
+        return len(line_matches)
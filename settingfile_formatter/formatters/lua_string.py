@@ -0,0 +1,117 @@
+"""Lua文字列リテラルのエスケープ・アンエスケープ
+
+StringLiteralFormatter と clip_tools の共通処理。
+頻出するエスケープは str.replace (C実装の一括置換) で、それ以外の制御文字は str.translate の変換表で処理する。
+アンエスケープも頻出するものは一括置換し、残りの '\\ddd' 等のみ正規表現の1回の走査で処理する。
+'\\ddd' 等で表される UTF-8 以外のバイトは surrogateescape と同じ U+DC80..U+DCFF の文字として扱い、往復で保たれる。
+"""
+import re
+from typing import List
+
+# 名前付きのエスケープ
+_NAMED = {'a': '\a', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', 'v': '\v',
+          '\\': '\\', '"': '"', "'": "'", '\n': '\n'}
+# 一括置換するエスケープ ('\\\\' は先に別の文字に置き換えておく)
+_COMMON = [('\\n', '\n'), ('\\"', '"'), ("\\'", "'"), ('\\t', '\t'), ('\\r', '\r')]
+# '\\\\' の一時的な置き換え先の候補 (中身に含まれないものを使う)
+_SENTINELS = ('\x00', '\uffff', '\ufffe')
+
+# 一括置換しない制御文字 ('\\ddd' にする) と、'\\ddd' で表された UTF-8 以外のバイト
+_CONTROL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\x7f\udc80-\udcff]')
+_CONTROL_TABLE = {code: f'\\{code:03d}' for code in [*range(32), 127]}
+_CONTROL_TABLE.update({0xDC00 + code: f'\\{code:03d}' for code in range(128, 256)})
+
+_ESCAPE = re.compile(r'\\(?:(\d{1,3})|x([0-9A-Fa-f]{2})|u\{([0-9A-Fa-f]+)\}|z\s*|(.))', re.DOTALL)
+# エスケープされていない '\\n' (直前の '\\' の数が偶数) の終わりまで
+_LINE_BREAK = re.compile(r'(?<!\\)(?:\\\\)*\\n')
+# 文字列リテラル (両端の引用符を除いた中身が group 1 または 2 に入る)
+_LITERAL = re.compile(r'"((?:[^"\\]|\\.)*)"|\'((?:[^\'\\]|\\.)*)\'', re.DOTALL)
+_RAW_BYTES = re.compile('[\udc80-\udcff]')
+# 後続の文字によって意味が変わるエスケープで終わる ('\\1' の後の数字、'\\z' の後の空白)
+_OPEN_ESCAPE = re.compile(r'(?<!\\)(?:\\\\)*\\(?:\d{1,2}|z)$')
+
+
+def encode(text: str, quote: str = '"') -> str:
+    """テキストを引用符 quote で囲む文字列リテラルの中身にエスケープする (引用符は付けない)"""
+    text = (text.replace('\\', '\\\\').replace(quote, '\\' + quote)
+            .replace('\n', '\\n').replace('\r', '\\r').replace('\t', '\\t'))
+    if _CONTROL.search(text):
+        text = text.translate(_CONTROL_TABLE)
+    return text
+
+
+def decode(body: str) -> str:
+    """文字列リテラルの中身 (引用符を除いたもの) のエスケープを元に戻す"""
+    if '\\' not in body:
+        return body
+    sentinel = next((c for c in _SENTINELS if c not in body), None)
+    if sentinel is None:
+        text = _ESCAPE.sub(_unescape, body)
+    else:
+        # '\\\\' を除けば残りの '\\' は全てエスケープの始まりなので、頻出するものは順に一括置換できる
+        text = body.replace('\\\\', sentinel)
+        for escaped, char in _COMMON:
+            text = text.replace(escaped, char)
+        if '\\' in text:
+            # 残りのエスケープの結果が一時的な文字と紛れないよう '\\\\' に戻してから処理する
+            text = _ESCAPE.sub(_unescape, text.replace(sentinel, '\\\\'))
+        else:
+            text = text.replace(sentinel, '\\')
+    if _RAW_BYTES.search(text):
+        # '\\ddd' で表されたバイト列が UTF-8 として読める部分は通常の文字に戻す
+        text = text.encode('utf-8', 'surrogateescape').decode('utf-8', 'surrogateescape')
+    return text
+
+
+def _unescape(match: 're.Match[str]') -> str:
+    char = match.group(4)
+    if char is not None:
+        return _NAMED.get(char, char)
+    digits, hex_digits, code_point = match.group(1, 2, 3)
+    if digits or hex_digits:
+        code = int(digits, 10) if digits else int(hex_digits, 16)
+        if code > 255:
+            raise ValueError(f'エスケープの値が大きすぎます: {match.group(0)}')
+        return chr(code) if code < 128 else chr(0xDC00 + code)
+    if code_point:
+        return chr(int(code_point, 16))
+    return ''   # '\z' は後続の空白と共に読み飛ばす
+
+
+def has_line_break(body: str) -> bool:
+    """中身がエスケープされた改行 '\\n' を含むか"""
+    return '\\n' in body and ('\\\\' not in body or _LINE_BREAK.search(body) is not None)
+
+
+def split_lines(body: str) -> List[str]:
+    """中身をエスケープされた改行 '\\n' の直後で分割する (各部分は '\\n' を含む。最後の部分は空の場合がある)"""
+    pieces = body.split('\\n')
+    if '\\\\' not in body:
+        return [piece + '\\n' for piece in pieces[:-1]] + [pieces[-1]]
+    parts = [pieces[0]]
+    for piece in pieces[1:]:
+        last = parts[-1]
+        if (len(last) - len(last.rstrip('\\'))) % 2:
+            # 直前の '\\' がエスケープされた '\\\\' の一部だった場合は区切りではない
+            parts[-1] = last + '\\n' + piece
+        else:
+            parts[-1] = last + '\\n'
+            parts.append(piece)
+    return parts
+
+
+def concat(bodies: List[str]) -> List[str]:
+    """'..' で連結される文字列リテラルの中身のうち、そのまま繋げても意味の変わらないものを1つにまとめる"""
+    result = [bodies[0]]
+    for body in bodies[1:]:
+        last = result[-1]
+        if body and '\\' in last and _OPEN_ESCAPE.search(last) and (body[0].isdigit() or body[0].isspace()):
+            result.append(body)
+        else:
+            result[-1] = last + body
+    return result
+
+
+def decode_literals(source: str) -> str:
+    """source 中の全ての文字列リテラル (".." で連結されたもの等) の中身を元に戻して連結する"""
+    return ''.join(decode(m.group(1) if m.group(1) is not None else m.group(2)) for m in _LITERAL.finditer(source))
@@ -0,0 +1,158 @@
+import re
+from typing import List, Optional
+
+from .base import ContentFormatter, Document
+
+# 数値リテラル (Luaの10進表記)
+_NUM = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+# 行の要素: 数値・真偽値 (キー付きも可)
+_CELL = rf'(?:[A-Za-z_]\w*\s*=\s*)?(?:{_NUM}|true|false)(?![\w.])'
+# 行の要素: 数値・真偽値のみのキー付きのサブテーブル (BezierSpline の KeyFrames の RH / LH / Flags 等)
+_SUB_TABLE = rf'[A-Za-z_]\w*\s*=\s*\{{\s*{_CELL}(?:\s*,\s*{_CELL})*\s*,?\s*\}}'
+_ITEM = rf'(?:{_SUB_TABLE}|{_CELL})'
+# 行: 数値要素のみのテーブル ('[n] =' の添字付きも可)
+_ROW = rf'(?:\[\s*{_NUM}\s*\]\s*=\s*)?\{{\s*{_ITEM}(?:\s*,\s*{_ITEM})*\s*,?\s*\}}'
+
+
+class NumericTableFormatter(ContentFormatter):
+    """数値の行だけが並ぶテーブル (グラデーションの Colors、ポリラインの点列、KeyFrames 等) を1行1要素に揃えて整形
+
+    1行で書かれたテーブルは対象外。'all' には含めない。
+    行の先頭の数値要素の列を揃え、続くサブテーブル (KeyFrames のハンドル等) は揃えずに並べる。
+    """
+
+    # 数値の表記や行の並びを変えるため、明示的に指定した場合のみ適用する
+    IN_ALL = False
+
+    # 文字列・コメントは読み飛ばし、数値テーブルのみ group 1 に入る
+    TABLE_PATTERN = re.compile(
+        rf'"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'|--[^\n]*|(\{{\s*(?:{_ROW}\s*,\s*)+{_ROW}\s*,?\s*\}})'
+    )
+    ROW_PATTERN = re.compile(rf'(?:\[\s*({_NUM})\s*\]\s*=\s*)?\{{((?:[^{{}}]|\{{[^{{}}]*\}})*)\}}')
+    # 行の要素 (キー, サブテーブルの中身, 数値・真偽値)
+    ITEM_PATTERN = re.compile(rf'(?:([A-Za-z_]\w*)\s*=\s*)?(?:\{{([^{{}}]*)\}}|({_NUM}|true|false)(?![\w.]))')
+    CELL_PATTERN = re.compile(rf'(?:([A-Za-z_]\w*)\s*=\s*)?({_NUM}|true|false)(?![\w.])')
+    # 数値の行で始まるテーブル
+    PROBE = re.compile(rf'\{{\s*(?:\[\s*{_NUM}\s*\]\s*=\s*)?\{{\s*(?:[A-Za-z_]\w*\s*=\s*)?(?:[-+.\d]|true|false)')
+
+    # 数値を丸める小数点以下の桁数 (None の場合は元の表記のまま。config.json の options で指定する)
+    PRECISION: Optional[int] = None
+    # この数以上の数値を丸める場合は NumPy でまとめて変換する
+    NUMPY_MIN_VALUES = 4096
+
+    def __init__(self, precision: Optional[int] = None):
+        super().__init__()
+        if precision is not None and (not isinstance(precision, int) or precision < 0):
+            raise ValueError(f'precision には0以上の整数を指定してください: {precision!r}')
+        self.precision = self.PRECISION if precision is None else precision
+
+    def format_document(self, doc: Document):
+        text = doc.text
+        with self._phase('scan'):
+            tables = [m.span(1) for m in self.TABLE_PATTERN.finditer(text) if m.group(1)]
+        if not tables:
+            return
+
+        with self._phase('rebuild'):
+            spans = []
+            for start, end in tables:
+                if '\n' not in text[start:end]:
+                    # 元々1行で書かれたテーブルはそのまま
+                    continue
+                line_start = text.rfind('\n', 0, start) + 1
+                line = text[line_start:start]
+                indent = line[:len(line) - len(line.lstrip())]
+                replaced = self._format_table(text[start:end], indent)
+                if replaced != text[start:end]:
+                    spans.append((start, end, replaced))
+            doc.replace_spans(spans)
+
+    def _format_table(self, table: str, indent: str) -> str:
+        """数値テーブル '{ ... }' を、先頭の数値要素の列を右揃えした1行1要素の形に整形する"""
+        # 行毎の (添字, values での開始位置, 先頭の数値要素の数, 残りの要素)
+        # 残りの要素は (キー, サブテーブルの要素のキーのリスト (数値要素は None))
+        rows = []
+        heads: List[str] = []
+        values: List[str] = []
+        for row in self.ROW_PATTERN.finditer(table, 1):
+            start, count, rest = len(values), 0, []
+            for key, inner, value in self.ITEM_PATTERN.findall(row.group(2)):
+                head = f'{key} = ' if key else ''
+                if value and not rest:
+                    heads.append(head)
+                    count += 1
+                elif value:
+                    rest.append((head, None))
+                else:
+                    cells = self.CELL_PATTERN.findall(inner)
+                    rest.append((head, [f'{cell_key} = ' if cell_key else '' for cell_key, _value in cells]))
+                    values.extend(cell_value for _key, cell_value in cells)
+                    continue
+                values.append(value)
+            rows.append((row.group(1), start, count, rest))
+
+        values = self._round_values(values)
+        row_heads = [f'[{index}] = ' if index is not None else '' for index, _start, _count, _rest in rows]
+
+        # 先頭の数値要素の列毎のキーと値の幅。全行の添字の幅と先頭の数値要素の数が同じ場合のみ揃える
+        # (揃えられない行があると '[0] =   {    0.5 }' のような空白が入るため)
+        count = rows[0][2]
+        aligned = all(n == count for _index, _start, n, _rest in rows) and len({len(head) for head in row_heads}) == 1
+        head_widths = [0] * count
+        value_widths = [0] * count
+        if aligned:
+            col_heads = iter(heads)
+            for _index, start, _count, _rest in rows:
+                for col in range(count):
+                    head_widths[col] = max(head_widths[col], len(next(col_heads)))
+                    value_widths[col] = max(value_widths[col], len(values[start + col]))
+
+        row_indent = indent + self.tokenizer.INDENT
+        lines = ['{']
+        col_heads = iter(heads)
+        for row_head, (_index, start, count, rest) in zip(row_heads, rows):
+            items = [next(col_heads).ljust(head_widths[col] if aligned else 0)
+                     + values[start + col].rjust(value_widths[col] if aligned else 0)
+                     for col in range(count)]
+            pos = start + count
+            for head, cell_heads in rest:
+                if cell_heads is None:
+                    items.append(head + values[pos])
+                    pos += 1
+                else:
+                    cells = ', '.join(cell_head + value for cell_head, value in zip(cell_heads, values[pos:]))
+                    items.append(f'{head}{{ {cells} }}')
+                    pos += len(cell_heads)
+            lines.append(f'{row_indent}{row_head}{{ {", ".join(items)} }},')
+        lines.append(f'{indent}}}')
+        return '\n'.join(lines)
+
+    def _round_values(self, values: List[str]) -> List[str]:
+        """数値を precision 桁に丸めた表記にする (末尾の 0 は省く)。真偽値はそのまま"""
+        if self.precision is None:
+            return values
+        numeric = [i for i, value in enumerate(values) if value not in ('true', 'false')]
+        if len(numeric) >= self.NUMPY_MIN_VALUES and (np := _numpy()) is not None:
+            texts = np.char.mod(f'%.{self.precision}f', np.array([values[i] for i in numeric], dtype=float))
+            if self.precision > 0:
+                texts = np.char.rstrip(np.char.rstrip(texts, '0'), '.')
+            rounded = texts.tolist()
+        else:
+            rounded = [self._round(float(values[i])) for i in numeric]
+        result = list(values)
+        for i, text in zip(numeric, rounded):
+            result[i] = '0' if text == '-0' else text
+        return result
+
+    def _round(self, value: float) -> str:
+        text = f'{value:.{self.precision}f}'
+        return text.rstrip('0').rstrip('.') if self.precision > 0 else text
+
+
+def _numpy():
+    """NumPy を返す (未インストールの場合は None)。大きな表を丸める時に初めて読み込む"""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
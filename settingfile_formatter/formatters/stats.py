@@ -0,0 +1,116 @@
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+
+@dataclass
+class RuleStats:
+    """1つの整形ルールの計測結果"""
+    wall_time: float = 0.0
+    phases: Dict[str, float] = field(default_factory=dict)
+    tokens: int = 0
+    edits: int = 0
+    peak_bytes: int = 0
+    runs: int = 0
+    skipped: int = 0             # applies_to が偽のため省略した回数
+
+    def __post_init__(self):
+        self._stack: List[List] = []
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_stack', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._stack = []
+
+    @contextmanager
+    def phase(self, name: str):
+        """処理フェーズの時間を計測する (入れ子のフェーズの時間は外側に含めない)"""
+        now = time.perf_counter()
+        if self._stack:
+            outer = self._stack[-1]
+            self.phases[outer[0]] = self.phases.get(outer[0], 0.0) + now - outer[1]
+        self._stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            _, start = self._stack.pop()
+            self.phases[name] = self.phases.get(name, 0.0) + now - start
+            if self._stack:
+                self._stack[-1][1] = now
+
+    def merge(self, other: 'RuleStats'):
+        self.wall_time += other.wall_time
+        self.tokens += other.tokens
+        self.edits += other.edits
+        self.peak_bytes = max(self.peak_bytes, other.peak_bytes)
+        self.runs += other.runs
+        self.skipped += other.skipped
+        for name, seconds in other.phases.items():
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+
+@dataclass
+class FormatStats:
+    """整形処理全体の計測結果 (ルール名毎の RuleStats)"""
+    rules: Dict[str, RuleStats] = field(default_factory=dict)
+    files: int = 0
+    # ファイルの入出力 (file_utils が記録する)
+    bytes_read: int = 0
+    bytes_written: int = 0
+    writes_skipped: int = 0      # 内容が同じため書き込まなかった数
+    io_time: float = 0.0
+
+    @contextmanager
+    def measure(self, rule_name: str, formatter, doc):
+        """formatter による doc の整形を計測する
+
+        tracemalloc が有効な場合はルール実行中のピークメモリも記録する。
+        """
+        stats = self.rules.setdefault(rule_name, RuleStats())
+        current = RuleStats(runs=1)
+        formatter.stats = doc.stats = current
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield current
+        finally:
+            current.wall_time = time.perf_counter() - start
+            if tracing:
+                current.peak_bytes = max(0, tracemalloc.get_traced_memory()[1] - base)
+            formatter.stats = doc.stats = None
+            stats.merge(current)
+
+    def skip(self, rule_name: str):
+        """整形対象を含まないため省略したルールを記録する"""
+        self.rules.setdefault(rule_name, RuleStats()).skipped += 1
+
+    def merge(self, other: 'FormatStats'):
+        self.files += other.files
+        self.bytes_read += other.bytes_read
+        self.bytes_written += other.bytes_written
+        self.writes_skipped += other.writes_skipped
+        self.io_time += other.io_time
+        for name, rule_stats in other.rules.items():
+            self.rules.setdefault(name, RuleStats()).merge(rule_stats)
+
+    def report(self) -> str:
+        lines = [f'--- プロファイル ({self.files} ファイル) ---',
+                 f"{'rule':<18}{'wall(ms)':>10}{'tokens':>10}{'edits':>8}{'peak(KB)':>10}{'skipped':>9}  phases(ms)"]
+        for name, s in self.rules.items():
+            phases = ' '.join(f'{p}={t * 1000:.1f}' for p, t in sorted(s.phases.items(), key=lambda x: -x[1]))
+            lines.append(f'{name:<18}{s.wall_time * 1000:>10.1f}{s.tokens:>10}{s.edits:>8}'
+                         f'{s.peak_bytes / 1024:>10.1f}{s.skipped:>9}  {phases}')
+        if self.bytes_read or self.bytes_written or self.writes_skipped:
+            lines.append(f'I/O: 読み込み {self.bytes_read / 1024:.1f} KB / 書き込み {self.bytes_written / 1024:.1f} KB'
+                         f' (書き込み省略 {self.writes_skipped}) / {self.io_time * 1000:.1f} ms')
+        return '\n'.join(lines)
@@ -1,90 +1,81 @@
 import re
-from typing import List, Tuple
-from .base import ContentFormatter
+from typing import List, Optional, Tuple
+from .base import ContentFormatter, Document, EditBuffer, StringChainScanner
 
 
 class UserControlsFormatter(ContentFormatter):
     """UserControlsブロックを整形"""
     BLOCK_START_TOKENS = ['UserControls', '=', 'ordered', '(', ')', '{']
+    CHAIN_SCANNER = StringChainScanner()
+    PROBE = re.compile(r'UserControls\s*=\s*ordered\s*\(')
 
-    def format_content(self, content: str) -> str:
+    def format_document(self, doc: Document):
         """コンテンツ整形処理のメインフロー"""
-        # 前処理: 複数行文字列をプレースホルダーに置換
-        replaced_content, placeholders = self._replace_multiline(content)
-
-        # メイン処理: ブロックの整形
-        tokens_per_line = self.tokenizer.tokenize_content(replaced_content)
-        blocks = self._extract_blocks(tokens_per_line, self.BLOCK_START_TOKENS)
+        blocks = self._extract_blocks(doc.tokens_per_line, self.BLOCK_START_TOKENS, doc.brace_index)
         if not blocks:
-            return content
+            return
+
+        # ブロックの整形 (文字列の連結はトークンのまま1行に並べる)
+        blocks = self._format_blocks(doc, blocks)
+
+        # ブロック内の行頭のキーに対する文字列の連結を複数行に展開する
+        with self._phase('expand_chains'):
+            self._expand_chains(doc, blocks)
+
+    def _format_blocks(self, doc: Document, blocks: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """ドキュメント中の UserControls ブロックを整形済みの行に置き換え、置き換え後のブロックの行範囲を返す
 
-        result_lines = []
-        last_end = -1
-        original_lines = replaced_content.splitlines()
+        トークンから組み立て直すため、コメントや長い文字列を含むブロックは変更しない (返す範囲にも含めない)。
+        """
+        tokens_per_line = doc.tokens_per_line
+        lines = doc.lines
+        edits = EditBuffer(lines)
+        formatted_blocks, shift = [], 0
 
+        with self._phase('rebuild'):
+            for start, end in blocks:
+                block_tokens = tokens_per_line[start:end + 1]
+                if any(tokens.has_verbatim() for tokens in block_tokens):
+                    continue
+                indent = len(lines[start]) - len(lines[start].lstrip())
+                formatted_block = self._format_block(block_tokens, ' ' * indent)
+                edits.replace(start, end + 1, formatted_block)
+                formatted_blocks.append((start + shift, start + shift + len(formatted_block) - 1))
+                shift += len(formatted_block) - (end + 1 - start)
+            doc.apply_edits(edits)
+        return formatted_blocks
+
+    def _expand_chains(self, doc: Document, blocks: List[Tuple[int, int]]):
+        """ブロック内の'..'で連結された文字列を 'key =' の次の行から1つずつ改行して並べる
+
+        整形済みのブロックでは 'key = value' が1行にまとまっているため、'..' を含む行のみを走査する。
+        """
+        lines = doc.lines
+        edits = EditBuffer(lines)
         for start, end in blocks:
-            result_lines.extend(original_lines[last_end + 1:start])
-            indent = len(original_lines[start]) - len(original_lines[start].lstrip())
-            block_tokens = tokens_per_line[start:end + 1]
-            formatted_block = self._format_block(block_tokens, ' ' * indent)
-            result_lines.extend(formatted_block)
-            last_end = end
-
-        result_lines.extend(original_lines[last_end + 1:])
-        formatted_content = '\n'.join(result_lines)
-
-        # 後処理: プレースホルダーを整形済みの複数行文字列に差し戻す
-        final_content = self.restore_placeholders(formatted_content, placeholders)
-
-        return final_content
-
-    def _replace_multiline(self, content: str) -> Tuple[str, List[str]]:
-        """'..'で連結された複数行文字列をプレースホルダーに置換する。"""
-        placeholders = []
-        def replacer(match):
-            key = match.group(1)
-            placeholders.append(match.group(0))
-            placeholder_iidx = len(placeholders) - 1
-            # 'key = "__PLACEHOLDER_n__"' の形式に変換
-            return f'{key} = "__PLACEHOLDER_{placeholder_iidx}__"'
-
-        # 任意のキー(group 1)に紐づく、'..'を1つ以上含む文字列連結(group 2)をキャプチャ
-        pattern = re.compile(
-            r'(\b[a-zA-Z_]\w*\b)\s*=\s*((?:"(?:\\.|[^"])*?"\s*\.\.\s*)+"(?:\\.|[^"])*?")',
-            re.DOTALL
-        )
-        replaced_content = pattern.sub(replacer, content)
-        return replaced_content, placeholders
-
-    def restore_placeholders(self, formatted_content: str, placeholders: List[str]) -> str:
-        """プレースホルダーを元に戻す"""
-        def unreplacer(match):
-            line_indent_str = match.group(1)
-            key = match.group(2)
-            index = int(match.group(3))
-            trailing_comma = match.group(4)
-
-            original_assignment = placeholders[index]
-            _key, value_part = original_assignment.split('=', 1)
-
-            parts = [p.strip() for p in value_part.split('..')]
-
-            value_indent_str = line_indent_str + self.tokenizer.INDENT
-
-            output_lines = [f"{line_indent_str}{key} ="]
-            for i, part in enumerate(parts):
-                separator = ' ..' if i < len(parts) - 1 else ''
-                output_lines.append(f"{value_indent_str}{part}{separator}")
-
-            output_lines[-1] += trailing_comma
-            return '\n'.join(output_lines)
-
-        # 任意のキー(group 2)に紐づくプレースホルダーを検出
-        pattern = re.compile(
-            r'(^\s*)(\b[a-zA-Z_]\w*\b)\s*=\s*"__PLACEHOLDER_(\d+)__"(,?)',
-            re.MULTILINE
-        )
-        return pattern.sub(unreplacer, formatted_content)
+            for i in range(start, end + 1):
+                if '..' not in lines[i]:
+                    continue
+                expanded = self._expand_line(lines[i])
+                if expanded is not None:
+                    edits.replace(i, i + 1, expanded)
+        doc.apply_edits(edits)
+
+    def _expand_line(self, line: str) -> Optional[List[str]]:
+        """行頭のキーに対する連結を展開した行リストを返す (対象が無ければ None)"""
+        value_indent = self.tokenizer.INDENT
+        for chain in self.CHAIN_SCANNER.scan(line):
+            line_indent = line[:chain.start]
+            if line_indent.strip():
+                # 行の途中にある連結は対象外
+                continue
+
+            parts = [line[start:stop] for start, stop in chain.parts]
+            output_lines = [f"{line_indent}{chain.key} ="]
+            output_lines.extend(f"{line_indent}{value_indent}{part} .." for part in parts[:-1])
+            output_lines.append(f"{line_indent}{value_indent}{parts[-1]}{line[chain.end:]}")
+            return output_lines
+        return None
 
     def _format_block(self, block_tokens: List[List[str]], base_indent: str) -> List[str]:
         """ブロックの枠組みを整形"""
@@ -106,6 +97,7 @@ class UserControlsFormatter(ContentFormatter):
     def _chunk_tokens(self, tokens: List[str]) -> List[List[str]]:
         """トークンリストを 'key = { ... }' または 'key = value,' 分割する。"""
         chunks, i = [], 0
+        brace_pairs = self.tokenizer.match_braces(tokens)
         while i < len(tokens):
             start_idx = i
             if not (i + 1 < len(tokens) and tokens[i+1] == '='):
@@ -116,7 +108,7 @@ class UserControlsFormatter(ContentFormatter):
 
             # Case 1: key = { ... }
             if value_start_idx < len(tokens) and tokens[value_start_idx] == '{':
-                brace_end = self.tokenizer.find_brace_end(tokens, value_start_idx)
+                brace_end = brace_pairs.get(value_start_idx)
                 if brace_end is not None:
                     end_idx = brace_end + 1
                     if end_idx < len(tokens) and tokens[end_idx] == ',':
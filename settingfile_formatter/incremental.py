@@ -0,0 +1,93 @@
+"""前回の整形結果からの差分整形 (--incremental)
+
+入力をツール単位のブロック (streaming.iter_chunks と同じ区切り) に分け、前回から変更のあったブロックのみ整形する。
+変更の判定にはキャッシュに記録したブロック毎のハッシュ値を使う。
+    - blocks:  前回の整形結果のブロックのハッシュ値。上書き保存で編集された整形済みファイルのうち、一致するブロックは整形済み
+    - sources: 前回の入力のブロックのハッシュ値。別名保存では一致するブロックの整形結果を前回の出力ファイルから取り出す
+InstanceInput の番号付けのようにブロック間で状態を引き継ぐルールは変更のないブロックにも適用し、文書全体の整形と同じ結果にする。
+"""
+import hashlib
+from dataclasses import dataclass, field
+from typing import Collection, Dict, List, Optional, TYPE_CHECKING
+
+from .config_loader import ConfigLoader
+from .formatters.base import Document, apply_formatters
+from .streaming import format_chunk, iter_chunks
+
+if TYPE_CHECKING:
+    from .formatters.stats import FormatStats
+
+
+@dataclass
+class IncrementalResult:
+    text: str
+    blocks: List[str] = field(default_factory=list)     # 整形結果のブロックのハッシュ値
+    sources: List[str] = field(default_factory=list)    # 入力のブロックのハッシュ値
+    reformatted: int = 0                                 # 整形したブロック数
+    total: int = 0                                       # 全ブロック数
+
+
+def block_hash(indent: str, text: str) -> str:
+    """ブロックのハッシュ値 (囲むブロックのインデントで整形結果が変わるため含める)"""
+    return hashlib.sha256(f'{indent}\0{text}'.encode('utf-8')).hexdigest()[:32]
+
+
+def split_blocks(text: str) -> List[str]:
+    """テキストをツール単位のブロックに分ける"""
+    return [''.join(lines) for _indent, lines in iter_chunks(text.splitlines(True))]
+
+
+def previous_blocks(sources: List[str], previous_output: str) -> Dict[str, str]:
+    """前回の入力のブロックのハッシュ値から、前回の出力の対応するブロックへの対応表を作る (ブロック数が合わなければ空)"""
+    outputs = split_blocks(previous_output)
+    if len(outputs) != len(sources):
+        return {}
+    return dict(zip(sources, outputs))
+
+
+def format_incremental(content: str, rules: List[str], config: ConfigLoader, formatted: Collection[str] = (),
+                       previous: Optional[Dict[str, str]] = None,
+                       stats: Optional['FormatStats'] = None) -> IncrementalResult:
+    """formatted (整形済みのブロックのハッシュ値) にも previous (前回の入力のブロック → 整形結果) にも無いブロックのみ整形する
+
+    ツール単位に分割できないルール (STREAMABLE が偽) を含む場合は文書全体を整形する (ハッシュ値は記録しない)。
+    """
+    formatters = config.get_named_formatters(rules)
+    if not all(f.STREAMABLE for _name, f in formatters):
+        doc = Document(content.expandtabs(4))
+        apply_formatters(doc, formatters, stats)
+        if stats is not None:
+            stats.files += 1
+        return IncrementalResult(doc.text, reformatted=1, total=1)
+
+    known = formatted if isinstance(formatted, (set, frozenset)) else set(formatted)
+    previous = previous or {}
+    stateful = [(name, f) for name, f in formatters if not f.CHUNK_LOCAL]
+    state: Dict[str, int] = {}
+    result = IncrementalResult('')
+    parts = []
+    for indent, lines in iter_chunks(content.splitlines(True)):
+        text = ''.join(lines)
+        digest = block_hash(indent, text)
+        if digest in known:
+            base = text
+        elif digest in previous:
+            base = previous[digest]
+        else:
+            base = None
+        if base is None:
+            output = format_chunk(text, indent, formatters, state, stats)
+            result.reformatted += 1
+        elif stateful:
+            # 変更のないブロックにも番号付け等を適用し、前のブロックの変更による番号のずれを反映する
+            output = format_chunk(base, indent, stateful, state)
+        else:
+            output = base
+        parts.append(output)
+        result.sources.append(digest)
+        result.blocks.append(digest if output == text else block_hash(indent, output))
+    result.text = ''.join(parts)
+    result.total = len(parts)
+    if stats is not None:
+        stats.files += 1
+    return result
@@ -0,0 +1,113 @@
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, List, Optional, Tuple, TYPE_CHECKING
+
+from .config_loader import ConfigLoader
+from .formatters.base import Document, apply_formatters
+from .streaming import format_chunk, iter_chunks
+
+if TYPE_CHECKING:
+    from .formatters.base import ContentFormatter
+    from .formatters.stats import FormatStats
+
+# ワーカー毎に割り当てるタスク数 (大きさの偏りを均すため複数に分ける)
+TASKS_PER_WORKER = 4
+
+# ワーカープロセス毎に1度だけ生成する設定
+_worker_config: Optional[ConfigLoader] = None
+
+
+def _init_worker(config_file: str):
+    global _worker_config
+    _worker_config = ConfigLoader(config_file)
+
+
+def _format_task(chunks: List[Tuple[str, str]], rules: List[str],
+                 profile: bool) -> Tuple[List[str], Optional['FormatStats']]:
+    """チャンクの並びを順に整形する (ワーカープロセスで実行)"""
+    stats = None
+    if profile:
+        from .formatters.stats import FormatStats
+        stats = FormatStats()
+    formatters = _worker_config.get_named_formatters(rules)
+    return [format_chunk(text, indent, formatters, {}, stats) for indent, text in chunks], stats
+
+
+def _split_tasks(chunks: List[Tuple[str, str]], count: int) -> List[List[Tuple[str, str]]]:
+    """チャンクを順序を保ったまま、文字数がおおよそ均等な count 個以下のタスクに分ける"""
+    total = sum(len(text) for _, text in chunks)
+    target = max(1, total // count)
+    tasks, current, size = [], [], 0
+    for chunk in chunks:
+        current.append(chunk)
+        size += len(chunk[1])
+        if size >= target:
+            tasks.append(current)
+            current, size = [], 0
+    if current:
+        tasks.append(current)
+    return tasks
+
+
+def _split_runs(named: List[Tuple[str, 'ContentFormatter']]) -> List[Tuple[bool, List[Tuple[str, 'ContentFormatter']]]]:
+    """ルールを設定の順のまま、CHUNK_LOCAL が同じ連続した並び (CHUNK_LOCAL, ルールの並び) に分ける"""
+    runs: List[Tuple[bool, List[Tuple[str, 'ContentFormatter']]]] = []
+    for name, formatter in named:
+        if runs and runs[-1][0] == formatter.CHUNK_LOCAL:
+            runs[-1][1].append((name, formatter))
+        else:
+            runs.append((formatter.CHUNK_LOCAL, [(name, formatter)]))
+    return runs
+
+
+def _format_chunks(content: str, local_formatters: List[Tuple[str, 'ContentFormatter']], jobs: int,
+                   get_executor: Callable[[int], Executor], stats: Optional['FormatStats']) -> str:
+    """ツール単位に分割し、タスクが複数あればプロセスプールで並列に整形して元の順に繋ぎ直す"""
+    chunks = [(indent, ''.join(lines)) for indent, lines in iter_chunks(content.splitlines(True))]
+    tasks = _split_tasks(chunks, jobs * TASKS_PER_WORKER)
+    if len(tasks) <= 1:
+        return ''.join(format_chunk(chunk, indent, local_formatters, {}, stats) for indent, chunk in chunks)
+
+    executor = get_executor(len(tasks))
+    local_rules = [name for name, _f in local_formatters]
+    futures = [executor.submit(_format_task, task, local_rules, stats is not None) for task in tasks]
+    parts = []
+    for future in futures:
+        formatted, task_stats = future.result()
+        parts.extend(formatted)
+        if stats is not None:
+            stats.merge(task_stats)
+    return ''.join(parts)
+
+
+def format_parallel(content: str, rules: List[str], config: ConfigLoader, jobs: int,
+                    stats: Optional['FormatStats'] = None) -> str:
+    """トップレベルのツール単位に分割し、プロセスプールで並列に整形して元の順に繋ぎ直す
+
+    ツール単位で整形できない (CHUNK_LOCAL が偽の) ルールは、設定の順を保つため
+    その位置で繋ぎ直した文書全体に適用し、後続のツール単位のルールは改めて分割して適用する。
+    """
+    executor: Optional[ProcessPoolExecutor] = None
+
+    def get_executor(task_count: int) -> Executor:
+        # プロセスプールは最初に並列化する時に生成し、以降の並びでも使い回す
+        nonlocal executor
+        if executor is None:
+            executor = ProcessPoolExecutor(max_workers=min(jobs, task_count), initializer=_init_worker,
+                                           initargs=(str(config.config_path.resolve()),))
+        return executor
+
+    text = content.expandtabs(4)     # 逐次整形 (apply_formatting) と同じくタブを4スペースに変換
+    try:
+        for chunk_local, run in _split_runs(config.get_named_formatters(rules)):
+            if chunk_local:
+                text = _format_chunks(text, run, jobs, get_executor, stats)
+            else:
+                doc = Document(text)
+                apply_formatters(doc, run, stats)
+                text = doc.text
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    if stats is not None:
+        stats.files += 1
+    return text
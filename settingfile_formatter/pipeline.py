@@ -0,0 +1,210 @@
+"""読み込み・整形・書き込みを重ねて行う非同期パイプライン (--async-io)
+
+ネットワーク共有上のファイルのように入出力の待ち時間が大きい場合のバッチ処理用。
+    読み込み (I/Oスレッド) → 整形キュー → 整形 (プロセスプール) → 書き込みキュー → 書き込み (I/Oスレッド)
+を asyncio で並行に動かし、次のファイルの読み込みと現在のファイルの整形、前のファイルの書き込み (バックアップを含む) を重ねる。
+キューの長さに上限を設け、整形・書き込みが追い付かない間は読み込みを待たせるため、同時に保持する内容の数は一定に収まる。
+アーカイブ、--stream / --incremental 指定時は batch と同じく process_file 全体を整形のプロセスプールで実行する。
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from . import batch
+from .api import apply_formatting
+from .batch import BatchSummary, FileResult, discover_files
+from .cache import FormatCache
+from .config_loader import ConfigLoader
+from .file_utils import get_output_path, is_archive, prepare_file, read_file_content, write_file_content
+from .formatters.stats import FormatStats
+
+# 読み込み・書き込みを並行に行うスレッド数
+IO_WORKERS = 4
+# 整形プロセス1つあたりのキューの長さ (整形・書き込みを待つ内容の数の上限)
+QUEUE_DEPTH = 2
+
+
+@dataclass
+class _Job:
+    """パイプラインを流れる1ファイル分の処理内容"""
+    path: str
+    output_path: Optional[Path] = None
+    content: Optional[str] = None
+    formatted: Optional[str] = None
+    stats: Optional[FormatStats] = None
+    whole: bool = False             # process_file 全体を整形プロセスで実行する
+
+
+def _format_content(content: str, rules: List[str], profile: bool, verify: bool,
+                    config: Optional[ConfigLoader] = None) -> Tuple[str, Optional[FormatStats]]:
+    """内容を整形する (ワーカープロセスでは batch._init_worker で生成した設定を使う)"""
+    config = config or batch._worker_config
+    stats = FormatStats() if profile else None
+    return apply_formatting(content, rules, config, stats, verify=verify), stats
+
+
+class AsyncPipeline:
+    """ファイルの読み込み・整形・書き込みを段毎のワーカーで並行に処理する"""
+
+    def __init__(self, overwrite: bool, backup: bool, rules: List[str], config: ConfigLoader,
+                 jobs: int = 1, io_workers: int = IO_WORKERS, cache: Optional[FormatCache] = None,
+                 force: bool = False, on_stats: Optional[Callable[[str, FormatStats], None]] = None,
+                 stream: bool = False, verify: bool = False, incremental: bool = False):
+        self.overwrite = overwrite
+        self.backup = backup
+        self.rules = rules
+        self.config = config
+        self.jobs = max(1, jobs)
+        self.io_workers = max(1, io_workers)
+        self.cache = cache
+        self.force = force
+        self.on_stats = on_stats
+        self.stream = stream
+        self.verify = verify
+        self.incremental = incremental
+        self.results: List[FileResult] = []
+        self._io: Optional[Executor] = None
+        self._cpu: Optional[Executor] = None
+
+    def run(self, files: List[str]) -> List[FileResult]:
+        """files を処理し、結果を files と同じ順で返す"""
+        profile = self.on_stats is not None
+        with ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix='drsetfmt-io') as io:
+            if self.jobs > 1:
+                cpu: Executor = ProcessPoolExecutor(
+                    max_workers=self.jobs, initializer=batch._init_worker,
+                    initargs=(str(self.config.config_path.resolve()), self.cache is not None, profile))
+            else:
+                # 1プロセスの場合も整形中にイベントループを止めないよう別スレッドで整形する
+                cpu = ThreadPoolExecutor(max_workers=1, thread_name_prefix='drsetfmt-cpu')
+            with cpu:
+                self._io, self._cpu = io, cpu
+                asyncio.run(self._run(files))
+        order = {f: i for i, f in enumerate(files)}
+        self.results.sort(key=lambda r: order[r.path])
+        return self.results
+
+    async def _run(self, files: List[str]):
+        queue_size = self.jobs * QUEUE_DEPTH
+        format_queue: asyncio.Queue = asyncio.Queue(queue_size)
+        write_queue: asyncio.Queue = asyncio.Queue(queue_size)
+        pending = iter(files)
+
+        async def read_stage():
+            await asyncio.gather(*(self._reader(pending, format_queue) for _ in range(self.io_workers)))
+            for _ in range(self.jobs):
+                await format_queue.put(None)
+
+        async def format_stage():
+            await asyncio.gather(*(self._formatter(format_queue, write_queue) for _ in range(self.jobs)))
+            for _ in range(self.io_workers):
+                await write_queue.put(None)
+
+        await asyncio.gather(read_stage(), format_stage(),
+                             *(self._writer(write_queue) for _ in range(self.io_workers)))
+
+    async def _in_io(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._io, func, *args)
+
+    async def _reader(self, pending, format_queue: asyncio.Queue):
+        for file_path in pending:
+            try:
+                job = await self._in_io(self._read, file_path)
+            except Exception as e:
+                self._finish(FileResult(file_path, 'failed', error=str(e) or type(e).__name__))
+                continue
+            if isinstance(job, FileResult):
+                self._finish(job)
+            else:
+                # 整形が追い付かない間はここで待つ
+                await format_queue.put(job)
+
+    async def _formatter(self, format_queue: asyncio.Queue, write_queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        in_process = isinstance(self._cpu, ThreadPoolExecutor)
+        profile = self.on_stats is not None
+        while True:
+            job = await format_queue.get()
+            if job is None:
+                return
+            try:
+                if job.whole:
+                    args = (job.path, self.overwrite, self.backup, self.rules, self.force, profile, self.stream)
+                    if in_process:
+                        args += (self.config, self.cache, self.verify, self.incremental)
+                    else:
+                        args += (None, None, self.verify, self.incremental)
+                    result = await loop.run_in_executor(self._cpu, batch._process_one, *args)
+                    if self.cache is not None and result.cache_entry is not None:
+                        self.cache.merge_entry(FormatCache.key_for(Path(result.path)), result.cache_entry)
+                    self._finish(result)
+                    continue
+                config = self.config if in_process else None
+                job.formatted, worker_stats = await loop.run_in_executor(
+                    self._cpu, _format_content, job.content, self.rules, profile, self.verify, config)
+                if job.stats is not None and worker_stats is not None:
+                    job.stats.merge(worker_stats)
+            except Exception as e:
+                self._finish(FileResult(job.path, 'failed', error=str(e) or type(e).__name__))
+                continue
+            await write_queue.put(job)
+
+    async def _writer(self, write_queue: asyncio.Queue):
+        while True:
+            job = await write_queue.get()
+            if job is None:
+                return
+            try:
+                result = await self._in_io(self._write, job)
+            except Exception as e:
+                result = FileResult(job.path, 'failed', error=str(e) or type(e).__name__)
+            self._finish(result)
+
+    def _read(self, file_path: str):
+        """キャッシュの確認と読み込みを行う (I/Oスレッドで実行。スキップする場合は FileResult を返す)"""
+        input_path = Path(file_path)
+        if is_archive(input_path) or self.stream or self.incremental:
+            return _Job(file_path, whole=True)
+        if self.cache is not None and not self.force and input_path.is_file():
+            output_path = get_output_path(file_path, self.overwrite)
+            if self.cache.is_fresh(input_path, output_path, self.rules):
+                return FileResult(file_path, 'skipped', str(output_path))
+        output_path = prepare_file(file_path, self.overwrite)
+        stats = FormatStats() if self.on_stats is not None else None
+        return _Job(file_path, output_path, read_file_content(input_path, stats), stats=stats)
+
+    def _write(self, job: _Job) -> FileResult:
+        """整形結果を書き込み、キャッシュに記録する (I/Oスレッドで実行)"""
+        input_path = Path(job.path)
+        write_file_content(job.output_path, job.formatted, mode_from=input_path,
+                           backup=self.backup and self.overwrite, stats=job.stats)
+        if self.cache is not None:
+            self.cache.record(input_path, job.output_path, self.rules,
+                              job.formatted if self.overwrite else job.content)
+        status = 'changed' if job.formatted != job.content else 'unchanged'
+        return FileResult(job.path, status, str(job.output_path), stats=job.stats)
+
+    def _finish(self, result: FileResult):
+        """処理の終わったファイルの結果を記録する (イベントループのスレッドで呼び出す)"""
+        batch._report_stats(result, self.on_stats)
+        batch._print_progress(result)
+        self.results.append(result)
+
+
+def run_pipeline(paths: List[str], overwrite: bool, backup: bool, rules: List[str], config: ConfigLoader,
+                 jobs: Optional[int] = None, cache: Optional[FormatCache] = None, force: bool = False,
+                 on_stats: Optional[Callable[[str, FormatStats], None]] = None, stream: bool = False,
+                 verify: bool = False, incremental: bool = False, io_workers: int = IO_WORKERS) -> BatchSummary:
+    """複数ファイルを非同期パイプラインで整形する (引数と結果は batch.run_batch と同じ)"""
+    start = time.perf_counter()
+    files = [str(p) for p in discover_files(paths)]
+    pipeline = AsyncPipeline(overwrite, backup, rules, config, jobs or os.cpu_count() or 1, io_workers,
+                             cache=cache, force=force, on_stats=on_stats, stream=stream, verify=verify,
+                             incremental=incremental)
+    summary = BatchSummary(pipeline.run(files))
+    summary.wall_time = time.perf_counter() - start
+    return summary
@@ -0,0 +1,180 @@
+"""エディタ連携用の常駐整形サーバー
+
+1行1メッセージの JSON-RPC 2.0 を標準入出力またはUnixソケットで受け付ける。
+ConfigLoader とフォーマッターのインスタンスをプロセス内で保持するため、要求毎の起動・読み込みの時間がかからない。
+
+メソッド:
+    format   params: {text, rules?, line_range?: [開始行, 終了行), edits?}
+             result: {text, changed} または edits が真の場合 {edits: [{start, end, text}], changed}
+             (行番号は0始まり、end は含まない。edits は元のテキスト上の行範囲の置き換え)
+    rules    result: 利用可能な整形ルール名のリスト
+    shutdown result: null (応答後に終了する)
+"""
+import json
+import os
+import socket
+import sys
+from pathlib import Path
+from typing import Any, Dict, IO, List, Optional
+
+from .config_loader import ConfigLoader, FormatterError
+from .streaming import format_stream
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+FORMAT_ERROR = -32000
+
+
+class RpcError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+class FormatServer:
+    """整形要求を処理する (フォーマッターのインスタンスは要求をまたいで使い回す)"""
+
+    def __init__(self, config: ConfigLoader):
+        self.config = config
+        self.running = True
+        # 最初の要求で読み込みが発生しないよう、全ての整形ルールを読み込んでおく
+        config.get_formatters(['all'])
+
+    def handle(self, message: str) -> Optional[str]:
+        """1メッセージを処理し、応答の JSON 文字列を返す (通知の場合は None)"""
+        request_id = None
+        try:
+            try:
+                request = json.loads(message)
+            except ValueError as e:
+                raise RpcError(PARSE_ERROR, f'JSONとして解析できません: {e}') from e
+            if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+                raise RpcError(INVALID_REQUEST, '不正な要求です')
+            request_id = request.get('id')
+            result = self._dispatch(request['method'], request.get('params') or {})
+            if 'id' not in request:
+                return None
+            response: Dict[str, Any] = {'jsonrpc': '2.0', 'id': request_id, 'result': result}
+        except RpcError as e:
+            response = {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': e.code, 'message': str(e)}}
+        except Exception as e:
+            # 整形処理の想定外の例外でもサーバーは終了しない
+            response = {'jsonrpc': '2.0', 'id': request_id,
+                        'error': {'code': INTERNAL_ERROR, 'message': f'{type(e).__name__}: {e}'}}
+        return json.dumps(response, ensure_ascii=False)
+
+    def _dispatch(self, method: str, params: Dict[str, Any]) -> Any:
+        if not isinstance(params, dict):
+            raise RpcError(INVALID_PARAMS, 'params はオブジェクトで指定してください')
+        if method == 'format':
+            _check_format_params(params)
+            try:
+                return self.format(**params)
+            except (FormatterError, ValueError) as e:
+                raise RpcError(FORMAT_ERROR, str(e)) from e
+        if method == 'rules':
+            return self.config.get_formatter_choices()
+        if method == 'shutdown':
+            self.running = False
+            return None
+        raise RpcError(METHOD_NOT_FOUND, f'存在しないメソッドです: {method}')
+
+    def format(self, text: str, rules: Optional[List[str]] = None, line_range: Optional[List[int]] = None,
+               edits: bool = False) -> Dict[str, Any]:
+        """テキストを整形する
+
+        ツール単位に整形し、line_range が指定された場合はその行範囲に掛かるツールのみ整形する。
+        edits が真の場合は整形後のテキストの代わりに、変更のあったツール毎の行範囲の置き換えを返す。
+        """
+        text = text.replace('\r\n', '\n')
+        chunks = format_stream(text.splitlines(True), rules or ['all'], self.config,
+                               line_range=tuple(line_range) if line_range is not None else None)
+        if not edits:
+            formatted = ''.join(new for _old, new in chunks)
+            return {'text': formatted, 'changed': formatted != text}
+
+        result = []
+        line = 0
+        for original, formatted in chunks:
+            old_lines = original.splitlines(True)
+            if formatted != original:
+                result.append(_line_edit(line, old_lines, formatted.splitlines(True)))
+            line += len(old_lines)
+        return {'edits': result, 'changed': bool(result)}
+
+    def serve(self, reader: IO[str], writer: IO[str]):
+        """reader から1行ずつ要求を読み、応答を writer に書き込む (shutdown または入力の終わりまで)"""
+        for message in reader:
+            if not message.strip():
+                continue
+            response = self.handle(message)
+            if response is not None:
+                writer.write(response + '\n')
+                writer.flush()
+            if not self.running:
+                break
+
+
+def _check_format_params(params: Dict[str, Any]):
+    """format の params を検証する (不正な場合は INVALID_PARAMS)"""
+    unknown = set(params) - {'text', 'rules', 'line_range', 'edits'}
+    if unknown:
+        raise RpcError(INVALID_PARAMS, f"未知のパラメータです: {', '.join(sorted(unknown))}")
+    if not isinstance(params.get('text'), str):
+        raise RpcError(INVALID_PARAMS, 'text は文字列で指定してください')
+    rules = params.get('rules')
+    if rules is not None and not (isinstance(rules, list) and all(isinstance(rule, str) for rule in rules)):
+        raise RpcError(INVALID_PARAMS, 'rules は文字列の配列で指定してください')
+    line_range = params.get('line_range')
+    if line_range is not None:
+        # bool は int のサブクラスのため除外する
+        if not (isinstance(line_range, list) and len(line_range) == 2
+                and all(isinstance(n, int) and not isinstance(n, bool) for n in line_range)):
+            raise RpcError(INVALID_PARAMS, 'line_range は [開始行, 終了行] の2つの整数で指定してください')
+        if not 0 <= line_range[0] <= line_range[1]:
+            raise RpcError(INVALID_PARAMS, 'line_range は 0 <= 開始行 <= 終了行 で指定してください')
+    if not isinstance(params.get('edits', False), bool):
+        raise RpcError(INVALID_PARAMS, 'edits は真偽値で指定してください')
+
+
+def _line_edit(first: int, old_lines: List[str], new_lines: List[str]) -> Dict[str, Any]:
+    """チャンクの前後の一致する行を除いた置き換えを返す"""
+    limit = min(len(old_lines), len(new_lines))
+    head = 0
+    while head < limit and old_lines[head] == new_lines[head]:
+        head += 1
+    tail = 0
+    while tail < limit - head and old_lines[-1 - tail] == new_lines[-1 - tail]:
+        tail += 1
+    return {'start': first + head, 'end': first + len(old_lines) - tail,
+            'text': ''.join(new_lines[head:len(new_lines) - tail])}
+
+
+def serve_stdio(config: ConfigLoader):
+    """標準入出力で要求を受け付ける"""
+    # エディタとの間は環境に関わらずUTF-8でやり取りする
+    sys.stdin.reconfigure(encoding='utf-8')
+    sys.stdout.reconfigure(encoding='utf-8')
+    FormatServer(config).serve(sys.stdin, sys.stdout)
+
+
+def serve_unix(config: ConfigLoader, socket_path: str):
+    """Unixソケットで要求を受け付ける (接続は1つずつ順に処理する)"""
+    server = FormatServer(config)
+    path = Path(socket_path)
+    path.unlink(missing_ok=True)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.bind(str(path))
+        os.chmod(path, 0o600)
+        sock.listen()
+        try:
+            while server.running:
+                conn, _ = sock.accept()
+                with conn, conn.makefile('r', encoding='utf-8') as reader, \
+                        conn.makefile('w', encoding='utf-8') as writer:
+                    server.serve(reader, writer)
+        finally:
+            path.unlink(missing_ok=True)
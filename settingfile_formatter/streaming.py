@@ -0,0 +1,157 @@
+import hashlib
+import re
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+from .cache import file_hash
+from .config_loader import ConfigLoader, FormatterError
+from .file_utils import AtomicFile, encode_content
+from .formatters.base import ContentFormatter, Document, apply_formatters
+
+if TYPE_CHECKING:
+    from .formatters.stats import FormatStats
+
+# チャンクの区切りとするネストレベル ('{' と 'Tools = ordered() {' の内側がツールの並び)
+TOOL_DEPTH = 2
+
+# 文字列・コメント中の括弧を数えないための字句パターン (括弧のみ group 1 に入る)
+BRACE_PATTERN = re.compile(r'"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'|--[^\n]*|([{}])')
+# マクロ・グループ内のツールの並び
+TOOLS_PATTERN = re.compile(r'^\s*Tools\s*=\s*ordered\(\s*\)\s*\{\s*$')
+
+
+def iter_lines(file_path: Path) -> Iterator[str]:
+    """ファイルを1行ずつ (改行文字付きで) 読み込む"""
+    try:
+        with file_path.open('r', encoding='utf-8') as f:
+            yield from f
+    except (OSError, UnicodeDecodeError) as e:
+        raise IOError(f'ファイルの読み込みに失敗しました: {file_path}') from e
+
+
+def iter_chunks(lines: Iterable[str]) -> Iterator[Tuple[str, List[str]]]:
+    """行をツール単位のチャンクにまとめ、(チャンクを囲むブロックのインデント, 行リスト) を生成する
+
+    括弧のネストレベルがツールの並びの深さ以下に戻る行で区切る。
+    マクロ・グループ内の 'Tools = ordered() {' ブロックでは、その内側のツール単位で区切る。
+    """
+    chunk: List[str] = []
+    chunk_indent = ''
+    indents: List[str] = []           # ネストレベル毎の '{' がある行のインデント
+    tool_levels: List[int] = []       # 入れ子になったツールの並びの深さ
+    for line in lines:
+        if not chunk:
+            chunk_indent = indents[-1] if indents else ''
+        chunk.append(line)
+        indent = line[:len(line) - len(line.lstrip())].expandtabs(4)
+        for match in BRACE_PATTERN.finditer(line):
+            brace = match.group(1)
+            if brace == '{':
+                indents.append(indent)
+            elif brace == '}' and indents:
+                indents.pop()
+        level = len(indents)
+        if TOOLS_PATTERN.match(line):
+            tool_levels.append(level)
+        while tool_levels and level < tool_levels[-1]:
+            tool_levels.pop()
+        if level <= (tool_levels[-1] if tool_levels else TOOL_DEPTH):
+            yield chunk_indent, chunk
+            chunk = []
+    if chunk:
+        yield chunk_indent, chunk
+
+
+def format_chunk(text: str, indent: str, formatters: List[Tuple[str, ContentFormatter]], state: Dict[str, int],
+                 stats: Optional['FormatStats'] = None) -> str:
+    """1チャンクを整形する
+
+    チャンク単体でも1つのテーブルとして構文解析でき、親ブロックのインデントも変わらないよう、
+    囲んでいるブロックのインデント付きの '{' と '}' の行で囲んで整形し、整形後に取り除く。
+    state はチャンク間で引き継ぐ整形ルールの状態。
+    """
+    newline = text.endswith('\n')
+    doc = Document(f'{indent}{{\n' + text.expandtabs(4) + ('' if newline else '\n') + f'{indent}}}\n')
+    doc.state = state
+    apply_formatters(doc, formatters, stats)
+    return '\n'.join(doc.lines[1:-1]) + ('\n' if newline else '')
+
+
+def format_stream(lines: Iterable[str], rules: List[str], config: ConfigLoader,
+                  stats: Optional['FormatStats'] = None,
+                  line_range: Optional[Tuple[int, int]] = None) -> Iterator[Tuple[str, str]]:
+    """行の並びをツール単位で整形し、チャンク毎に (元のテキスト, 整形後のテキスト) を生成する
+
+    同時に保持するのは1チャンク分のみのため、メモリ使用量は最大のブロックの大きさに比例する。
+    line_range (0始まりの [開始行, 終了行)) を指定した場合は範囲に掛かるチャンクのみ整形し、他はそのまま返す。
+    範囲外のチャンクにもチャンク間で状態を引き継ぐルールだけは適用し、番号等を文書全体の整形と合わせる。
+    """
+    formatters = config.get_named_formatters(rules)
+    unstreamable = [name for name, f in formatters if not f.STREAMABLE]
+    if unstreamable:
+        raise FormatterError(f"ツール単位の逐次整形には使えない整形ルールです: {', '.join(unstreamable)}")
+    stateful = [(name, f) for name, f in formatters if not f.CHUNK_LOCAL]
+    state: Dict[str, int] = {}
+    line = 0
+    for indent, chunk in iter_chunks(lines):
+        text = ''.join(chunk)
+        first, line = line, line + len(chunk)
+        if line_range is None or (first < max(line_range[1], line_range[0] + 1) and line > line_range[0]):
+            yield text, format_chunk(text, indent, formatters, state, stats)
+            continue
+        if stateful:
+            format_chunk(text, indent, stateful, state)
+        yield text, text
+    if stats is not None:
+        stats.files += 1
+
+
+def format_file(input_path: Path, output_path: Path, rules: List[str], config: ConfigLoader,
+                stats: Optional['FormatStats'] = None, backup: bool = False,
+                verify: bool = False) -> Tuple[bool, str, str]:
+    """ファイルを逐次読み込んで整形し、出力先に書き込む
+
+    出力は同じディレクトリの一時ファイルに書き込んでから置き換えるため、上書き保存でも入力を読みながら書き込める。
+    上書き保存で内容が変わらなかった場合と、別名保存で既存の出力ファイルと同じ内容になった場合は置き換えない。
+    backup が真の場合は置き換える直前にバックアップを作成する。
+    verify が真の場合はチャンク毎に整形前後のトークン列を比較し、食い違った時点で VerifyError を送出する (出力は破棄する)。
+    変更の有無と、入力・出力内容のハッシュ値 (cache.content_hash と同じ値) を返す。
+    """
+    input_digest, output_digest = hashlib.sha256(), hashlib.sha256()
+    changed = False
+    bytes_read = bytes_written = 0
+    verifier = None
+    if verify:
+        from .verify import create_verifier
+        verifier = create_verifier(rules, config)
+        line = out_line = 1
+    # 別名保存で出力ファイルが既にある場合は、書き込んだ内容のサイズとハッシュ値を比較する
+    existing_size = output_path.stat().st_size if output_path != input_path and output_path.is_file() else None
+    written_digest = hashlib.sha256() if existing_size is not None else None
+    with AtomicFile(output_path, input_path, backup) as out:
+        for original, formatted in format_stream(iter_lines(input_path), rules, config, stats):
+            if verifier is not None:
+                verifier.check(original, formatted, line, out_line)
+                line += original.count('\n')
+                out_line += formatted.count('\n')
+            original_bytes = original.encode('utf-8')
+            input_digest.update(original_bytes)
+            output_digest.update(formatted.encode('utf-8'))
+            changed = changed or formatted != original
+            bytes_read += len(original_bytes)
+            data = encode_content(formatted)
+            if written_digest is not None:
+                written_digest.update(data)
+            bytes_written += out.write(data)
+        if output_path == input_path:
+            written = changed
+        else:
+            written = bytes_written != existing_size or file_hash(output_path) != written_digest.hexdigest()
+        if written:
+            out.commit()
+    if stats is not None:
+        # 読み込み・書き込みは整形と交互に行うため、時間は記録せずバイト数のみ記録する
+        stats.bytes_read += bytes_read
+        stats.bytes_written += bytes_written if written else 0
+        stats.writes_skipped += 0 if written else 1
+    return changed, input_digest.hexdigest(), output_digest.hexdigest()
@@ -0,0 +1,5 @@
+"""settingfile formatter の動作テスト
+
+実行はリポジトリのルート (settingfile_formatter の親ディレクトリ) から行う:
+    python -m pytest settingfile_formatter/tests
+"""
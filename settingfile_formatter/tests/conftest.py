@@ -0,0 +1,28 @@
+import shutil
+
+import pytest
+
+from ..benchmarks.corpus import CorpusSpec, generate
+from ..config_loader import DEFAULT_CONFIG_PATH, ConfigLoader
+
+# ツール単位の整形とルールの組み合わせを確認する代表的なルール指定
+RULE_SETS = [['all'], ['instance_input'], ['string_literal'], ['user_controls'], ['user_controls', 'instance_input']]
+
+
+@pytest.fixture(scope='session')
+def config() -> ConfigLoader:
+    return ConfigLoader()
+
+
+@pytest.fixture
+def local_config(tmp_path) -> ConfigLoader:
+    """一時ディレクトリに複製した設定 (キャッシュファイルを一時ディレクトリに作る)"""
+    config_path = tmp_path / 'config.json'
+    shutil.copyfile(DEFAULT_CONFIG_PATH, config_path)
+    return ConfigLoader(str(config_path))
+
+
+@pytest.fixture(scope='session')
+def macro() -> str:
+    """全ての整形ルールの対象を含む合成マクロ"""
+    return generate(CorpusSpec(tools=12, instance_inputs=12, seed=1))
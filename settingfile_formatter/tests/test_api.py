@@ -0,0 +1,41 @@
+"""FormatterSession (format_bytes / format_many) のテスト"""
+import pytest
+
+from ..api import FormatterSession, apply_formatting
+
+
+@pytest.fixture(scope='module')
+def session(config) -> FormatterSession:
+    return FormatterSession(['all'], config)
+
+
+def test_format_bytes_keeps_crlf(session, macro, config):
+    data = macro.replace('\n', '\r\n').encode('utf-8')
+    formatted = session.format_bytes(data)
+    assert formatted != data and formatted.count(b'\n') == formatted.count(b'\r\n')
+    assert formatted.decode('utf-8').replace('\r\n', '\n') == apply_formatting(macro, ['all'], config)
+    # LF のみの内容は LF のまま
+    assert b'\r' not in session.format_bytes(macro.encode('utf-8'))
+
+
+def test_format_bytes_returns_unchanged_data(session, macro):
+    for newline in [b'\n', b'\r\n']:
+        data = session.format_bytes(macro.encode('utf-8')).replace(b'\n', newline)
+        assert session.format_bytes(data) is data
+
+
+@pytest.mark.parametrize('jobs', [None, 2])
+def test_format_many_keeps_order(session, jobs):
+    # ワーカーへ渡す単位 (MANY_CHUNK_SIZE) をまたぐ数のテキスト
+    texts = [f'A{i} = {{ B = "x" .. "{i}", C = {{ {i}, 2 }}, Input{i} = InstanceInput {{}} }}\n' for i in range(20)]
+    assert list(session.format_many(texts, jobs=jobs)) == [session.format_text(text) for text in texts]
+
+
+@pytest.mark.parametrize('jobs', [None, 2])
+def test_format_many_raises_at_failing_item(session, jobs):
+    texts = ['A = { B = 1 }\n', None, 'C = { D = 2 }\n']
+    results = session.format_many(texts, jobs=jobs)
+    # 例外は失敗したテキストの結果を取り出す時点で送出する
+    assert next(results) == session.format_text(texts[0])
+    with pytest.raises(TypeError):
+        next(results)
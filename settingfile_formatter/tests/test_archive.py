@@ -0,0 +1,63 @@
+"""アーカイブ (.drfx / .zip) 内の整形のテスト"""
+import zipfile
+
+from .. import archive as archive_module
+from ..api import FormatterSession
+from ..archive import format_archive
+
+SETTING_NAME = 'Fusion/Templates/Edit/Titles/Macro.setting'
+ICON = bytes(range(256)) * 4
+
+
+def _make_archive(path, setting: bytes):
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.comment = b'macro bundle'
+        archive.writestr(zipfile.ZipInfo('Fusion/'), b'')
+        archive.writestr(SETTING_NAME, setting, compress_type=zipfile.ZIP_DEFLATED)
+        archive.writestr('Fusion/icon.png', ICON, compress_type=zipfile.ZIP_STORED)
+
+
+def test_archive_round_trip(tmp_path, macro, config):
+    source = macro.replace('\n', '\r\n').encode('utf-8')
+    input_path, output_path = tmp_path / 'Macro.drfx', tmp_path / 'fixed_Macro.drfx'
+    _make_archive(input_path, source)
+
+    assert format_archive(input_path, output_path, ['all'], config)
+    with zipfile.ZipFile(input_path) as before, zipfile.ZipFile(output_path) as after:
+        assert after.comment == before.comment
+        assert [i.filename for i in after.infolist()] == [i.filename for i in before.infolist()]
+        # .setting 以外のメンバーは圧縮方式を含めてそのまま複製する
+        assert after.read('Fusion/icon.png') == ICON
+        assert after.getinfo('Fusion/icon.png').compress_type == zipfile.ZIP_STORED
+        formatted = after.read(SETTING_NAME)
+    assert formatted == FormatterSession(['all'], config).format_bytes(source)
+    assert b'\r\n' in formatted
+
+    # 整形済みのアーカイブは変更なしとなり、上書きしない
+    mtime = output_path.stat().st_mtime_ns
+    assert not format_archive(output_path, output_path, ['all'], config)
+    assert output_path.stat().st_mtime_ns == mtime
+
+
+def test_session_shared_by_members(tmp_path, macro, config, monkeypatch):
+    input_path = tmp_path / 'Macro.drfx'
+    with zipfile.ZipFile(input_path, 'w') as archive:
+        for index in range(3):
+            archive.writestr(f'Fusion/Macro{index}.setting', macro)
+    sessions = []
+
+    class CountingSession(FormatterSession):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            sessions.append(self)
+
+    # 全メンバーを1つのセッションで整形する
+    monkeypatch.setattr(archive_module, 'FormatterSession', CountingSession)
+    assert format_archive(input_path, tmp_path / 'fixed_Macro.drfx', ['all'], config)
+    assert len(sessions) == 1
+
+    # 並列に整形しても結果は同じ
+    assert format_archive(input_path, tmp_path / 'fixed_parallel.drfx', ['all'], config, jobs=2)
+    with zipfile.ZipFile(tmp_path / 'fixed_Macro.drfx') as serial, \
+            zipfile.ZipFile(tmp_path / 'fixed_parallel.drfx') as parallel:
+        assert [serial.read(info) for info in serial.infolist()] == [parallel.read(i) for i in parallel.infolist()]
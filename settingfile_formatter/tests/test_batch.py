@@ -0,0 +1,50 @@
+"""バッチ処理 (run_batch / BatchSummary) と終了コードのテスト"""
+import sys
+
+import pytest
+
+from .. import drsetfmt
+from ..api import apply_formatting
+from ..batch import run_batch
+from ..cache import FormatCache
+
+
+def _make_files(root, macro, config):
+    # 失敗するファイルを先頭に置き、後続のファイルも処理されることを確かめる
+    (root / 'a_broken.setting').write_bytes(b'A = "\xff",\n')
+    (root / 'b_changed.setting').write_text(macro, encoding='utf-8')
+    (root / 'c_formatted.setting').write_text(apply_formatting(macro, ['all'], config), encoding='utf-8')
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_failure_does_not_abort_batch(tmp_path, macro, local_config, jobs):
+    _make_files(tmp_path, macro, local_config)
+    cache = FormatCache(local_config.config_path)
+    summary = run_batch([str(tmp_path)], False, False, ['all'], local_config, jobs=jobs, cache=cache)
+
+    assert [r.status for r in summary.results] == ['failed', 'changed', 'unchanged']
+    assert (tmp_path / 'fixed_b_changed.setting').is_file() and (tmp_path / 'fixed_c_formatted.setting').is_file()
+    assert [r.path for r in summary.failed] == [str(tmp_path / 'a_broken.setting')]
+    report = summary.report().splitlines()
+    assert report[1] == f"✗ {tmp_path / 'a_broken.setting'}: {summary.failed[0].error}"
+    assert report[2].startswith('変更: 1 / 変更なし: 1 / スキップ: 0 / 失敗: 1 (合計 3 ファイル, ')
+
+    # 整形済みのファイルは次の実行ではキャッシュによりスキップする (失敗したファイルは毎回処理する)
+    cache.save()
+    summary = run_batch([str(tmp_path)], False, False, ['all'], local_config, jobs=jobs, cache=cache)
+    assert (summary.count('skipped'), summary.count('failed')) == (2, 1)
+
+
+def test_exit_status(tmp_path, macro, local_config, monkeypatch, capsys):
+    _make_files(tmp_path, macro, local_config)
+    monkeypatch.setattr(drsetfmt, 'ConfigLoader', lambda: local_config)
+    monkeypatch.setattr(sys, 'argv', ['drsetfmt.py', str(tmp_path), '-r', 'all'])
+    with pytest.raises(SystemExit) as info:
+        drsetfmt.main()
+    assert info.value.code == 1
+    assert '失敗: 1 (合計 3 ファイル' in capsys.readouterr().out
+
+    # 失敗が無ければ終了コード 0 で終わる
+    (tmp_path / 'a_broken.setting').unlink()
+    drsetfmt.main()
+    assert '失敗: 0 (合計 2 ファイル' in capsys.readouterr().out
@@ -0,0 +1,145 @@
+"""整形済みファイルのキャッシュによるスキップのテスト"""
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+
+import pytest
+
+from .. import cache as cache_module
+from ..cache import FormatCache
+from ..drsetfmt import process_file
+
+
+def _run(path, config, cache, **kwargs):
+    calls = []
+    _output, status = process_file(str(path), False, False, ['all'], config, verbose=False, cache=cache,
+                                   on_stats=lambda file_path, _stats: calls.append(file_path), **kwargs)
+    return status, len(calls)
+
+
+def test_skip_and_force(tmp_path, macro, local_config):
+    path = tmp_path / 'macro.setting'
+    path.write_text(macro, encoding='utf-8')
+    cache = FormatCache(local_config.config_path)
+
+    assert _run(path, local_config, cache) == ('changed', 1)
+    # 入力も出力も変わっていなければ読み込まずにスキップする
+    assert _run(path, local_config, cache) == ('skipped', 0)
+    assert _run(path, local_config, cache, force=True) == ('changed', 1)
+
+    # 保存した記録は別のプロセス (新しい FormatCache) からも使う
+    cache.save()
+    assert _run(path, local_config, FormatCache(local_config.config_path)) == ('skipped', 0)
+
+
+def test_changes_invalidate_entry(tmp_path, macro, local_config):
+    path = tmp_path / 'macro.setting'
+    path.write_text(macro, encoding='utf-8')
+    cache = FormatCache(local_config.config_path)
+    _run(path, local_config, cache)
+
+    path.write_text(macro.replace('Tool1', 'Tool01'), encoding='utf-8')
+    assert _run(path, local_config, cache) == ('changed', 1)
+
+    # 出力ファイルが編集された場合も整形し直す
+    output = tmp_path / 'fixed_macro.setting'
+    output.write_text('edited', encoding='utf-8')
+    assert _run(path, local_config, cache) == ('changed', 1)
+
+    # ルールが異なれば記録は使わない
+    status, _calls = _run(path, local_config, cache)
+    assert status == 'skipped'
+    _output, status = process_file(str(path), False, False, ['instance_input'], local_config, verbose=False,
+                                   cache=cache)
+    assert status != 'skipped'
+
+
+def test_force_ignores_incremental_blocks(tmp_path, macro, local_config, capsys):
+    path = tmp_path / 'macro.setting'
+    path.write_text(macro, encoding='utf-8')
+    cache = FormatCache(local_config.config_path)
+    _run(path, local_config, cache, incremental=True)
+    expected = (tmp_path / 'fixed_macro.setting').read_text(encoding='utf-8')
+
+    # 記録したツール毎のハッシュ値は使わず、全てのツールを整形し直す
+    def fail(*_args):
+        raise AssertionError('block_hashes should not be used with force')
+    cache.block_hashes = fail
+    capsys.readouterr()
+    process_file(str(path), False, False, ['all'], local_config, cache=cache, force=True, incremental=True)
+    assert re.search(r'(\d+) ツール中 \1 ツールを整形しました', capsys.readouterr().out)
+    assert (tmp_path / 'fixed_macro.setting').read_text(encoding='utf-8') == expected
+
+
+def test_overwrite_incremental_reformats_resaved_raw_content(tmp_path, macro, local_config):
+    path = tmp_path / 'macro.setting'
+    path.write_text(macro, encoding='utf-8')
+    cache = FormatCache(local_config.config_path)
+    process_file(str(path), True, False, ['all'], local_config, verbose=False, cache=cache, incremental=True)
+    expected = path.read_text(encoding='utf-8')
+    assert expected != macro
+
+    # 整形前の内容で保存し直された場合 (Resolve からの再書き出し) も整形し直す
+    path.write_text(macro, encoding='utf-8')
+    process_file(str(path), True, False, ['all'], local_config, verbose=False, cache=cache, incremental=True)
+    assert path.read_text(encoding='utf-8') == expected
+
+
+def _dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+    return process.pid
+
+
+@pytest.fixture
+def short_lock_timeout(monkeypatch):
+    monkeypatch.setattr(cache_module, 'LOCK_TIMEOUT', 0.1)
+
+
+def test_stale_lock_is_removed(tmp_path, macro, local_config, short_lock_timeout):
+    path = tmp_path / 'macro.setting'
+    path.write_text(macro, encoding='utf-8')
+    cache = FormatCache(local_config.config_path)
+    _run(path, local_config, cache)
+
+    # 終了したプロセスが残したロックは取り除いて保存する
+    lock_path = cache.path.with_name(cache.path.name + '.lock')
+    lock_path.write_text(f'{_dead_pid()}@{socket.gethostname()}', encoding='utf-8')
+    cache.save()
+    assert not cache.disabled and not lock_path.exists()
+    assert json.loads(cache.path.read_text(encoding='utf-8'))['files']
+
+
+def test_live_lock_is_kept(tmp_path, macro, local_config, short_lock_timeout, capsys):
+    path = tmp_path / 'macro.setting'
+    path.write_text(macro, encoding='utf-8')
+    cache = FormatCache(local_config.config_path)
+    _run(path, local_config, cache)
+
+    # 動作中のプロセスのロックは取り除かず、保存を諦めてキャッシュを無効にする
+    lock_path = cache.path.with_name(cache.path.name + '.lock')
+    lock_path.write_text(f'{os.getpid()}@{socket.gethostname()}', encoding='utf-8')
+    cache.save()
+    assert cache.disabled and lock_path.exists()
+    assert not cache.path.exists()
+    assert '警告' in capsys.readouterr().err
+
+
+def test_unwritable_cache_is_disabled(tmp_path, macro, local_config, monkeypatch, capsys):
+    path = tmp_path / 'macro.setting'
+    path.write_text(macro, encoding='utf-8')
+    cache = FormatCache(local_config.config_path)
+    _run(path, local_config, cache)
+
+    def read_only(*_args, **_kwargs):
+        raise PermissionError(13, 'Permission denied')
+
+    # 読み取り専用の設置先では例外にせず警告してキャッシュを使わずに処理を続ける
+    monkeypatch.setattr(cache_module.os, 'open', read_only)
+    cache.save()
+    assert cache.disabled
+    assert '警告' in capsys.readouterr().err
+    assert _run(path, local_config, cache) == ('changed', 1)
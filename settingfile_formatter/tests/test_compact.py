@@ -0,0 +1,32 @@
+"""圧縮 (compact) のテスト"""
+import pytest
+
+from ..api import apply_formatting
+from ..formatters import lua_string
+
+
+def _compact(content, config) -> str:
+    return apply_formatting(content, ['compact'], config)
+
+
+@pytest.mark.parametrize('content, expected', [
+    # 行コメントの後には改行を置き、長いコメントは '=' の数が同じ閉じまでを残す
+    ('A = { -- note\n    B = 1, --[==[ x ]] y ]==] C = 2,\n}\n', 'A={-- note\nB=1,--[==[ x ]] y ]==]C=2}\n'),
+    # '..' で連結された文字列をまとめる
+    ('S = "ab" .. "c" .. \'d\',\n', 'S="abc"..\'d\',\n'),
+    # 繋げると後続の数字を取り込む '\\ddd' はまとめない
+    ('T = "\\1" .. "2" .. "\\65" .. "x" .. "\\123" .. "4",\n', 'T="\\1".."2\\65x\\1234",\n'),
+    # 長い文字列の中身は変えない
+    ('L = [==[ a ]] "b" .. "c" ]==] .. "d",\nM = [[ x ]] .. [=[ ]] ]=],\nN = - -1,\n',
+     'L=[==[ a ]] "b" .. "c" ]==].."d",M=[[ x ]]..[=[ ]] ]=],N=- -1,\n'),
+])
+def test_compact(config, content, expected):
+    assert _compact(content, config) == expected
+
+
+def test_round_trip(config, macro):
+    for content in [macro, 'T = "\\1" .. "2" .. "\\z\n  3" .. "\\x41",\nL = [=[ "a" .. "b" ]=],\n']:
+        compacted = _compact(content, config)
+        # 文字列の値は変わらず、もう一度圧縮しても変わらない
+        assert lua_string.decode_literals(compacted) == lua_string.decode_literals(content)
+        assert _compact(compacted, config) == compacted
@@ -0,0 +1,42 @@
+"""ストリーミング・並列・差分整形の結果が文書全体の逐次整形と一致することのテスト"""
+import pytest
+
+from ..api import apply_formatting
+from ..incremental import format_incremental, previous_blocks
+from ..parallel import format_parallel
+from ..streaming import format_stream
+from .conftest import RULE_SETS
+
+
+@pytest.mark.parametrize('rules', RULE_SETS)
+def test_stream_matches_sequential(macro, config, rules):
+    streamed = ''.join(formatted for _original, formatted in format_stream(macro.splitlines(True), rules, config))
+    assert streamed == apply_formatting(macro, rules, config)
+
+
+@pytest.mark.parametrize('rules', RULE_SETS)
+def test_parallel_matches_sequential(macro, config, rules):
+    assert format_parallel(macro, rules, config, jobs=2) == apply_formatting(macro, rules, config)
+
+
+@pytest.mark.parametrize('rules', RULE_SETS)
+def test_incremental_matches_sequential(macro, config, rules):
+    expected = apply_formatting(macro, rules, config)
+    first = format_incremental(macro, rules, config)
+    assert first.text == expected
+
+    # 整形済みのブロックは整形し直さず、同じ結果になる
+    again = format_incremental(first.text, rules, config, formatted=first.blocks)
+    assert again.text == expected
+    assert again.reformatted == 0
+
+
+def test_incremental_reformats_only_edited_tool(macro, config):
+    rules = ['instance_input', 'string_literal']
+    first = format_incremental(macro, rules, config)
+    edited = macro.replace('Tool3 = Custom {', 'Tool3 = Custom {\n\t\t\t\t\tComment = "edited\\nline",', 1)
+    assert edited != macro
+
+    result = format_incremental(edited, rules, config, previous=previous_blocks(first.sources, first.text))
+    assert result.text == apply_formatting(edited, rules, config)
+    assert result.reformatted == 1
@@ -0,0 +1,50 @@
+"""Lua文字列リテラルのエスケープ (lua_string) のテスト"""
+import pytest
+
+from ..formatters import lua_string
+
+
+@pytest.mark.parametrize('body, text', [
+    ('plain', 'plain'),
+    ('a\\\\nb', 'a\\nb'),                       # エスケープされた '\' の後の 'n' は改行ではない
+    ('a\\nb\\t\\"\\\'', 'a\nb\t"\''),
+    ('\\65\\0661\\x41\\u{3042}', 'AB1Aあ'),      # '\ddd' は3桁まで
+    ('a\\z  \n   b\\z', 'ab'),                   # '\z' は後続の空白 (改行を含む) と共に読み飛ばす
+    ('x\\\ny', 'x\ny'),
+    ('\\227\\129\\130', 'あ'),                   # UTF-8 として読めるバイト列は通常の文字に戻す
+    ('\\200\\255a', '\udcc8\udcffa'),            # UTF-8 以外のバイトは U+DC80..U+DCFF の文字になる
+])
+def test_decode(body, text):
+    assert lua_string.decode(body) == text
+
+
+def test_decode_rejects_large_escape():
+    with pytest.raises(ValueError):
+        lua_string.decode('\\256')
+
+
+@pytest.mark.parametrize('text', [
+    '', 'plain', 'a\\nb', 'line1\nline2\r\n\t"q"', '\\\\\x00\x01\x1f\x7f',
+    'あ\udc80\udcff', '\x00\uffff\ufffe\\n',   # '\\' の一時的な置き換え先の候補を全て含む
+])
+def test_round_trip(text):
+    for quote in '"\'':
+        body = lua_string.encode(text, quote)
+        assert '\n' not in body and quote not in body.replace('\\' + quote, '')
+        assert lua_string.decode(body) == text
+
+
+def test_encode_raw_bytes():
+    assert lua_string.encode('\udcff\x01あ\t"') == '\\255\\001あ\\t\\"'
+
+
+def test_concat_keeps_escape_boundaries():
+    assert lua_string.concat(['\\1', '2', '\\12', 'x', '\\123', '4', 'a\\z', ' b', '\\\\1', '2']) == [
+        '\\1', '2\\12x\\1234a\\z', ' b\\\\12']
+    bodies = ['\\1', '2', '\\z', '  c']
+    assert ''.join(map(lua_string.decode, bodies)) == ''.join(map(lua_string.decode, lua_string.concat(bodies)))
+
+
+def test_split_lines():
+    assert lua_string.split_lines('a\\nb\\\\nc\\n') == ['a\\n', 'b\\\\nc\\n', '']
+    assert lua_string.has_line_break('a\\\\\\nb') and not lua_string.has_line_break('a\\\\nb')
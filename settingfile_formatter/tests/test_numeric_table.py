@@ -0,0 +1,97 @@
+"""数値テーブル整形のテスト"""
+import json
+
+import pytest
+
+from ..api import apply_formatting
+from ..config_loader import ConfigLoader, FormatterError
+from ..formatters.numeric_table import NumericTableFormatter
+
+SOURCE = '''Gradient = {
+    Inline = { [0] = { 0, 0, 0, 1 }, [1] = { 1, 0.5, 0.25, 1 } },
+    Colors = {
+        [0] = { 0, 0, 0, 1 }, [1] = { 1, 0.123456, 0.25, 1 } },
+    Mixed = {
+        [0] = { 0.5 }, [0.25] = { -0.0625, 0, 0, 1 },
+    },
+}
+'''
+
+EXPECTED = '''Gradient = {
+    Inline = { [0] = { 0, 0, 0, 1 }, [1] = { 1, 0.5, 0.25, 1 } },
+    Colors = {
+        [0] = { 0,        0,    0, 1 },
+        [1] = { 1, 0.123456, 0.25, 1 },
+    },
+    Mixed = {
+        [0] = { 0.5 },
+        [0.25] = { -0.0625, 0, 0, 1 },
+    },
+}
+'''
+
+KEYFRAMES = '''BezierSpline {
+    KeyFrames = {
+        [10] = { 0, RH = { 16.6666666666667, 0.333333333333333 }, Flags = { Linear = true } },
+        [50] = { 0.75, LH = { 36.6666666666667, 0.5 }, RH = { 63.3333333333333, 0.8 } },
+        [90] = { 1, LH = { 76.6666666666667, 0.9 }, Flags = { Linear = true } }
+    },
+}
+'''
+
+
+def _config_with_options(tmp_path, config, options) -> ConfigLoader:
+    data = json.loads(config.config_path.read_text(encoding='utf-8'))
+    data['options'] = options
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps(data), encoding='utf-8')
+    return ConfigLoader(str(path))
+
+
+def test_format_table(config):
+    assert apply_formatting(SOURCE, ['numeric_table'], config) == EXPECTED
+
+
+def test_keyframes_with_handles(tmp_path, config):
+    config = _config_with_options(tmp_path, config, {'numeric_table': {'precision': 3}})
+    assert apply_formatting(KEYFRAMES, ['numeric_table'], config) == '''BezierSpline {
+    KeyFrames = {
+        [10] = {    0, RH = { 16.667, 0.333 }, Flags = { Linear = true } },
+        [50] = { 0.75, LH = { 36.667, 0.5 }, RH = { 63.333, 0.8 } },
+        [90] = {    1, LH = { 76.667, 0.9 }, Flags = { Linear = true } },
+    },
+}
+'''
+    # 添字の幅が揃わない行は揃えずに1行1要素にする
+    content = KEYFRAMES.replace('[10]', '[0]')
+    assert apply_formatting(content, ['numeric_table'], config).splitlines()[2:4] == [
+        '        [0] = { 0, RH = { 16.667, 0.333 }, Flags = { Linear = true } },',
+        '        [50] = { 0.75, LH = { 36.667, 0.5 }, RH = { 63.333, 0.8 } },',
+    ]
+
+
+def test_not_in_all(config):
+    assert 'numeric_table' not in config.resolve_rule_names(['all'])
+    assert config.resolve_rule_names(['all', 'numeric_table'])[-1] == 'numeric_table'
+
+
+def test_precision_from_config(tmp_path, config):
+    config = _config_with_options(tmp_path, config, {'numeric_table': {'precision': 2}})
+    assert apply_formatting(SOURCE, ['numeric_table'], config) == EXPECTED.replace(
+        '0,        0,    0, 1 },\n        [1] = { 1, 0.123456,', '0,    0,    0, 1 },\n        [1] = { 1, 0.12,').replace(
+        '-0.0625', '-0.06')
+
+
+def test_invalid_option(tmp_path, config):
+    config = _config_with_options(tmp_path, config, {'numeric_table': {'precision': -1}})
+    with pytest.raises(FormatterError):
+        config.get_formatters(['numeric_table'])
+
+
+@pytest.mark.parametrize('precision', [0, 3])
+def test_numpy_rounding_matches_python(monkeypatch, precision):
+    pytest.importorskip('numpy')
+    values = ['0', '-0.0004', '1.23456', '12', 'true', '.5', '-2.5e-3']
+    expected = NumericTableFormatter(precision)._round_values(values)
+    monkeypatch.setattr(NumericTableFormatter, 'NUMPY_MIN_VALUES', 1)
+    assert NumericTableFormatter(precision)._round_values(values) == expected
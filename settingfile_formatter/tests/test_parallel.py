@@ -0,0 +1,26 @@
+"""並列整形でのルールの適用順のテスト"""
+from ..formatters.base import ContentFormatter
+from ..parallel import _split_runs, format_parallel
+
+
+class _Replace(ContentFormatter):
+    def __init__(self, old, new, chunk_local):
+        super().__init__()
+        self.old, self.new, self.CHUNK_LOCAL = old, new, chunk_local
+
+    def format_content(self, content):
+        return content.replace(self.old, self.new)
+
+
+def test_split_runs_keeps_configured_order(config):
+    named = config.get_named_formatters(['instance_input', 'string_literal', 'user_controls'])
+    runs = [(local, [name for name, _f in run]) for local, run in _split_runs(named)]
+    assert runs == [(False, ['instance_input']), (True, ['string_literal', 'user_controls'])]
+
+
+def test_global_rule_runs_before_later_local_rules(config, monkeypatch):
+    # ツール単位でないルールの後のツール単位のルールは、その結果に対して適用する
+    named = [('a', _Replace('x', 'y', False)), ('b', _Replace('y', 'z', True)), ('c', _Replace('z', 'w', False))]
+    monkeypatch.setattr(config, 'get_named_formatters', lambda rules: named)
+    content = 'T1 = Custom { Comment = "x" }\n'     # 1チャンクのためプロセスプールを使わない
+    assert format_parallel(content, ['a', 'b', 'c'], config, jobs=2) == content.replace('x', 'w')
@@ -0,0 +1,51 @@
+"""非同期パイプライン (--async-io) と batch の結果の一致のテスト"""
+import shutil
+
+import pytest
+
+from ..api import apply_formatting
+from ..batch import run_batch
+from ..cache import FormatCache
+from ..pipeline import run_pipeline
+from .test_archive import _make_archive
+
+
+def _make_tree(root, macro, config):
+    (root / 'sub').mkdir(parents=True)
+    (root / 'changed.setting').write_text(macro, encoding='utf-8')
+    (root / 'sub' / 'formatted.setting').write_text(apply_formatting(macro, ['all'], config), encoding='utf-8')
+    (root / 'sub' / 'broken.setting').write_bytes(b'A = "\xff\xfe",\n')    # UTF-8 として読めず失敗する
+    _make_archive(root / 'Macro.drfx', macro.encode('utf-8'))
+
+
+def _snapshot(root, summary, cache):
+    """ディレクトリを除いた結果 (ファイルの内容、処理結果、キャッシュの記録) を返す"""
+    prefix = str(root.resolve())
+    files = {str(p.relative_to(root)): p.read_bytes() for p in sorted(root.rglob('*')) if p.is_file()}
+    results = [(r.path.replace(str(root), ''), r.status, (r.output_path or '').replace(str(root), ''),
+                (r.error or '').replace(str(root), '')) for r in summary.results]
+    entries = {key.replace(prefix, ''): dict(entry, output=entry['output'].replace(prefix, ''),
+                                             stat=entry['stat'][0], output_stat=entry['output_stat'][0])
+               for key, entry in cache._updates.items()}
+    return files, results, entries
+
+
+@pytest.mark.parametrize('jobs, stream', [(1, False), (2, False), (1, True)])
+def test_pipeline_matches_batch(tmp_path, macro, local_config, jobs, stream):
+    _make_tree(tmp_path / 'batch', macro, local_config)
+    shutil.copytree(tmp_path / 'batch', tmp_path / 'pipeline')
+
+    snapshots = []
+    for run, name in [(run_batch, 'batch'), (run_pipeline, 'pipeline')]:
+        root = tmp_path / name
+        cache = FormatCache(local_config.config_path)
+        summary = run([str(root)], True, True, ['all'], local_config, jobs=jobs, cache=cache, stream=stream)
+        snapshots.append(_snapshot(root, summary, cache))
+
+    batch_snapshot, pipeline_snapshot = snapshots
+    assert pipeline_snapshot == batch_snapshot
+    files, results, entries = batch_snapshot
+    assert [status for _path, status, _output, _error in results] == ['changed', 'changed', 'failed', 'unchanged']
+    assert len(entries) == 3
+    # 書き込んだファイルのみバックアップを作成する
+    assert sorted(name for name in files if name.endswith('.bak')) == ['Macro.drfx.bak', 'changed.setting.bak']
@@ -0,0 +1,81 @@
+"""常駐サーバー (JSON-RPC) のテスト"""
+import json
+
+import pytest
+
+from ..server import FORMAT_ERROR, INVALID_PARAMS, INVALID_REQUEST, METHOD_NOT_FOUND, PARSE_ERROR, FormatServer
+
+
+@pytest.fixture(scope='module')
+def server(config):
+    return FormatServer(config)
+
+
+def _call(server, method, params=None, request_id=1):
+    request = {'jsonrpc': '2.0', 'id': request_id, 'method': method}
+    if params is not None:
+        request['params'] = params
+    return json.loads(server.handle(json.dumps(request)))
+
+
+def _error_code(response):
+    return response['error']['code']
+
+
+def test_format(server, macro, config):
+    from ..api import apply_formatting
+    response = _call(server, 'format', {'text': macro, 'rules': ['all']})
+    assert response['result'] == {'text': apply_formatting(macro, ['all'], config), 'changed': True}
+
+
+def test_edits_apply_to_original(server, macro):
+    formatted = _call(server, 'format', {'text': macro})['result']['text']
+    lines = macro.splitlines(True)
+    for edit in reversed(_call(server, 'format', {'text': macro, 'edits': True})['result']['edits']):
+        lines[edit['start']:edit['end']] = [edit['text']]
+    assert ''.join(lines) == formatted
+
+
+def test_line_range(server, macro, config):
+    from ..streaming import format_stream
+    expected = ''.join(new for _old, new in format_stream(macro.splitlines(True), ['all'], config, line_range=(10, 20)))
+    response = _call(server, 'format', {'text': macro, 'line_range': [10, 20]})
+    assert response['result']['text'] == expected
+    assert expected != _call(server, 'format', {'text': macro})['result']['text']
+
+
+@pytest.mark.parametrize('message, code', [
+    ('{"jsonrpc": "2.0", "id": 1, "method": ', PARSE_ERROR),
+    ('[1, 2]', INVALID_REQUEST),
+    ('{"jsonrpc": "2.0", "id": 1}', INVALID_REQUEST),
+])
+def test_malformed_requests(server, message, code):
+    assert _error_code(json.loads(server.handle(message))) == code
+
+
+@pytest.mark.parametrize('method, params, code', [
+    ('unknown', {}, METHOD_NOT_FOUND),
+    ('format', [1], INVALID_PARAMS),
+    ('format', {}, INVALID_PARAMS),
+    ('format', {'text': 1}, INVALID_PARAMS),
+    ('format', {'text': 'a = 1', 'indent': 4}, INVALID_PARAMS),
+    ('format', {'text': 'a = 1', 'range': [0, 1]}, INVALID_PARAMS),
+    ('format', {'text': 'a = 1', 'rules': 'all'}, INVALID_PARAMS),
+    ('format', {'text': 'a = 1', 'edits': 'yes'}, INVALID_PARAMS),
+    ('format', {'text': 'a = 1', 'line_range': [2, 1]}, INVALID_PARAMS),
+    ('format', {'text': 'a = 1', 'line_range': [-1, 1]}, INVALID_PARAMS),
+    ('format', {'text': 'a = 1', 'line_range': [0]}, INVALID_PARAMS),
+    ('format', {'text': 'a = 1', 'line_range': ['0', 1]}, INVALID_PARAMS),
+    ('format', {'text': 'a = 1', 'line_range': [True, 1]}, INVALID_PARAMS),
+    ('format', {'text': 'a = 1', 'rules': ['no_such_rule']}, FORMAT_ERROR),
+])
+def test_error_codes(server, method, params, code):
+    assert _error_code(_call(server, method, params)) == code
+
+
+def test_notification_has_no_response(server):
+    assert server.handle('{"jsonrpc": "2.0", "method": "rules"}') is None
+
+
+def test_rules(server, config):
+    assert _call(server, 'rules')['result'] == config.get_formatter_choices()
@@ -0,0 +1,77 @@
+"""ルール毎の計測 (FormatStats) と --profile のテスト"""
+import sys
+
+import pytest
+
+from .. import drsetfmt
+from ..drsetfmt import process_file
+from ..formatters.stats import FormatStats, RuleStats
+
+PLAIN = 'Plain = { A = 1 },\n'     # どのルールの整形対象も含まない
+
+
+def _make_files(root, macro):
+    paths = [root / 'a_macro.setting', root / 'b_plain.setting']
+    paths[0].write_text(macro, encoding='utf-8')
+    paths[1].write_text(PLAIN, encoding='utf-8')
+    return [str(path) for path in paths]
+
+
+def _report_rows(report: str) -> dict:
+    """レポートのルール毎の行を列のリストで返す"""
+    return {line.split()[0]: line.split() for line in report.splitlines()[2:] if not line.startswith('I/O')}
+
+
+def test_rule_stats_merge():
+    total = RuleStats(wall_time=0.5, phases={'scan': 0.25}, tokens=10, edits=1, peak_bytes=300, runs=1)
+    total.merge(RuleStats(wall_time=0.25, phases={'scan': 0.25, 'rebuild': 0.5}, tokens=5, edits=2,
+                          peak_bytes=200, runs=1, skipped=1))
+    assert (total.wall_time, total.tokens, total.edits, total.peak_bytes, total.runs, total.skipped) == (
+        0.75, 15, 3, 300, 2, 1)
+    assert total.phases == {'scan': 0.5, 'rebuild': 0.5}
+
+
+def test_stats_of_two_files(tmp_path, macro, config):
+    per_file = {}
+    total = FormatStats()
+
+    def on_stats(path, stats):
+        per_file[path] = stats
+        total.merge(stats)
+
+    paths = _make_files(tmp_path, macro)
+    for path in paths:
+        process_file(path, False, False, ['all'], config, verbose=False, on_stats=on_stats)
+
+    names = config.resolve_rule_names(['all'])
+    assert total.files == 2 and list(per_file) == paths
+    # 整形対象を含まないファイルでは全てのルールを省略する
+    assert {name: (s.runs, s.skipped) for name, s in per_file[paths[1]].rules.items()} == dict.fromkeys(names, (0, 1))
+    for name in names:
+        rules = [stats.rules[name] for stats in per_file.values()]
+        merged = total.rules[name]
+        assert (merged.runs, merged.skipped, merged.tokens, merged.edits) == (
+            sum(r.runs for r in rules), sum(r.skipped for r in rules),
+            sum(r.tokens for r in rules), sum(r.edits for r in rules))
+        assert merged.wall_time == pytest.approx(sum(r.wall_time for r in rules))
+    assert total.bytes_read == len(macro.encode('utf-8')) + len(PLAIN)
+
+    report = total.report()
+    assert report.splitlines()[0] == '--- プロファイル (2 ファイル) ---'
+    rows = _report_rows(report)
+    assert list(rows) == list(total.rules)
+    assert all(rows[name][5] == str(total.rules[name].skipped) for name in names)
+
+
+def test_profile_option(tmp_path, macro, local_config, monkeypatch, capsys):
+    _make_files(tmp_path, macro)
+    monkeypatch.setattr(drsetfmt, 'ConfigLoader', lambda: local_config)
+    monkeypatch.setattr(sys, 'argv', ['drsetfmt.py', str(tmp_path), '-r', 'all', '--profile', '-j', '1'])
+    drsetfmt.main()
+    out = capsys.readouterr().out
+    report = out[out.index('--- プロファイル'):]
+    assert report.splitlines()[0] == '--- プロファイル (2 ファイル) ---'
+    rows = _report_rows(report)
+    assert list(rows) == local_config.resolve_rule_names(['all'])
+    # 整形対象を含まないファイルの分は各ルールの省略として数える
+    assert all(int(row[5]) >= 1 for row in rows.values())
@@ -0,0 +1,24 @@
+"""逐次整形 (--stream) の書き込みのテスト"""
+from ..api import apply_formatting
+from ..formatters.stats import FormatStats
+from ..streaming import format_file
+
+
+def test_identical_output_not_replaced(tmp_path, macro, config):
+    input_path, output_path = tmp_path / 'macro.setting', tmp_path / 'fixed_macro.setting'
+    input_path.write_text(macro, encoding='utf-8')
+    assert format_file(input_path, output_path, ['all'], config)[0]
+    assert output_path.read_text(encoding='utf-8') == apply_formatting(macro, ['all'], config)
+
+    # 既存の出力ファイルと同じ内容であれば置き換えない
+    mtime = output_path.stat().st_mtime_ns
+    stats = FormatStats()
+    format_file(input_path, output_path, ['all'], config, stats)
+    assert output_path.stat().st_mtime_ns == mtime
+    assert (stats.writes_skipped, stats.bytes_written) == (1, 0)
+
+    # 内容が異なれば (サイズが同じでも) 置き換える
+    edited = output_path.read_bytes().replace(b'Tool1', b'Tool2', 1)
+    output_path.write_bytes(edited)
+    format_file(input_path, output_path, ['all'], config)
+    assert output_path.read_text(encoding='utf-8') == apply_formatting(macro, ['all'], config)
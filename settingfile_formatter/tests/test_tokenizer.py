@@ -0,0 +1,85 @@
+"""Tokenizer.scan_line の種別コードのテスト"""
+import pytest
+
+from ..benchmarks.bench_tokenizer import finditer_scan_line
+from ..formatters.base import Document, StringChainScanner, Tokenizer
+
+T = Tokenizer
+
+
+@pytest.mark.parametrize('line, kinds', [
+    ('Input1 = InstanceInput {', [T.NAME, T.ASSIGN, T.NAME, T.OPEN_BRACE]),
+    ('Value = "a" .. "b",', [T.NAME, T.ASSIGN, T.STRING, T.CONCAT, T.STRING, T.COMMA]),
+    ('{ -1, +2.5, .5, 3 }', [T.OPEN_BRACE, T.NUMBER, T.COMMA, T.NUMBER, T.COMMA, T.NUMBER, T.COMMA,
+                            T.NUMBER, T.CLOSE_BRACE]),
+    ('Source = Tool1.Output[1](x)', [T.NAME, T.ASSIGN, T.NAME, T.PUNCT, T.NUMBER, T.PUNCT, T.PUNCT, T.NAME, T.PUNCT]),
+    ('"a\\"..b" ..', [T.STRING, T.CONCAT]),
+    ('', []),
+])
+def test_scan_line_kinds(line, kinds):
+    tokens = T().scan_line(line)
+    assert list(tokens.kinds) == kinds
+    assert tokens == T().tokenize_line(line)
+
+
+def test_scan_matches_finditer(macro):
+    tokenizer = T()
+    for line in macro.splitlines():
+        tokens, legacy = tokenizer.scan_line(line), finditer_scan_line(tokenizer, line)
+        assert tokens == legacy and tokens.kinds == legacy.kinds
+
+
+def test_document_reuses_tokens_of_known_lines():
+    doc = Document('A = {\n    B = 1,\n}\n')
+    first = doc.tokens_per_line
+    doc.set_text('A = {\n    B = 1,\n    C = 2,\n}\n')
+    tokens = doc.tokens_per_line
+    assert tokens[1] is first[1] and tokens[3] is first[2]
+    assert tokens[2] == ['C', '=', '2', ',']
+
+
+@pytest.mark.parametrize('line, tokens, kinds', [
+    ('A = 1, -- note  ', ['A', '=', '1', ',', '-- note'], [T.NAME, T.ASSIGN, T.NUMBER, T.COMMA, T.COMMENT]),
+    ('S = "x -- y", --[[ c ]] B = 2', ['S', '=', '"x -- y"', ',', '--[[ c ]]', 'B', '=', '2'],
+     [T.NAME, T.ASSIGN, T.STRING, T.COMMA, T.COMMENT, T.NAME, T.ASSIGN, T.NUMBER]),
+    ('L = [==[ a ]] ]==],', ['L', '=', '[==[ a ]] ]==]', ','], [T.NAME, T.ASSIGN, T.LONG_STRING, T.COMMA]),
+])
+def test_comments_and_long_strings(line, tokens, kinds):
+    scanned = T().scan_line(line)
+    assert scanned == tokens and list(scanned.kinds) == kinds and scanned.opened is None
+
+
+def test_constructs_spanning_lines():
+    content = ('A = {\n    S = [[line1\n"q" .. "r"\n]],\n    --[==[ x\n  B = "a" .. "b"\n]==] C = 1,\n'
+               '    D = "p\\\n-- q",\n}\n')
+    expected = [
+        ['A', '=', '{'], ['S', '=', '[[line1'], ['"q" .. "r"'], [']]', ','],
+        ['--[==[ x'], ['  B = "a" .. "b"'], [']==]', 'C', '=', '1', ','],
+        ['D', '=', '"p\\'], ['-- q"', ','], ['}'],
+    ]
+    lines = T().scan_content(content)
+    assert lines == expected
+    assert [tokens.opened for tokens in lines][1:4] == [(T.LONG_STRING, ']]'), (T.LONG_STRING, ']]'), None]
+    # 行をまたぐ引用符の文字列も、組み立て直さない字句として LONG_STRING になる
+    assert lines[8].continued == (T.LONG_STRING, '"') and list(lines[8].kinds) == [T.LONG_STRING, T.COMMA]
+    assert Document(content).tokens_per_line == expected
+
+
+def test_document_rescans_lines_when_span_changes():
+    doc = Document('A = 1,\nB = "x" .. "y",\n')
+    assert doc.tokens_per_line[1] == ['B', '=', '"x"', '..', '"y"', ',']
+    doc.set_text('A = [[\nB = "x" .. "y",\n]]\n')
+    assert doc.tokens_per_line[1] == ['B = "x" .. "y",'] and doc.tokens_per_line[1].kinds == bytes([T.LONG_STRING])
+
+
+@pytest.mark.parametrize('text, chains', [
+    ('A = "a" .. "b\\"", B = "c"', [('A', ['"a"', '"b\\""'])]),
+    # コメントを挟んだ連結も続け、文字列以外で終わる連結は対象外
+    ('B = "c" .. -- note\n  "d"..\'e\', C = "f" .. "g" .. x, D = "h" .. "i" .. "j"',
+     [('D', ['"h"', '"i"', '"j"'])]),
+    ('B = "c" .. -- note\n  "d" .. "e"\nE = 1', [('B', ['"c"', '"d"', '"e"'])]),
+])
+def test_string_chains(text, chains):
+    found = StringChainScanner().scan(text)
+    assert [(chain.key, [text[start:end] for start, end in chain.parts]) for chain in found] == chains
+    assert all(text[chain.start:chain.end].startswith(chain.key) for chain in found)
@@ -0,0 +1,32 @@
+"""UserControls 整形の文字列連結の展開のテスト"""
+from ..api import format_text
+
+SOURCE = '''Tools = ordered() {
+    T1 = Text {
+        Comments = "a" .. "b",
+        UserControls = ordered() { Info = { LINKS_Name = "x", Text = "p" .. "q", }, },
+    },
+}
+'''
+
+
+def test_chains_expanded_only_inside_blocks():
+    assert format_text(SOURCE, ['user_controls']) == '''Tools = ordered() {
+    T1 = Text {
+        Comments = "a" .. "b",
+        UserControls = ordered() {
+            Info = {
+                LINKS_Name = "x",
+                Text =
+                    "p" ..
+                    "q",
+            },
+        }
+    },
+}
+'''
+
+
+def test_blocks_with_comments_kept_verbatim():
+    source = SOURCE.replace('Text = "p" .. "q", }', 'Text = "p" .. "q", -- keep\n }')
+    assert format_text(source, ['user_controls']) == source
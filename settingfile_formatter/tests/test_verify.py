@@ -0,0 +1,92 @@
+"""整形前後のトークン列の検証 (--verify) のテスト"""
+import pytest
+
+from ..api import apply_formatting
+from ..formatters.base import Document
+from ..streaming import format_stream
+from ..verify import TokenVerifier, VerifyError
+from .conftest import RULE_SETS
+
+
+@pytest.mark.parametrize('rules', RULE_SETS)
+def test_formatting_passes(macro, config, rules):
+    assert apply_formatting(macro, rules, config, verify=True) == apply_formatting(macro, rules, config)
+
+
+@pytest.mark.parametrize('rules', RULE_SETS)
+def test_stream_chunks_pass(macro, config, rules):
+    verifier = TokenVerifier('instance_input' in config.resolve_rule_names(rules))
+    line = out_line = 1
+    for original, formatted in format_stream(macro.splitlines(True), rules, config):
+        verifier.check(original, formatted, line, out_line)
+        line += original.count('\n')
+        out_line += formatted.count('\n')
+
+
+def test_ignored_differences():
+    original = 'A = { B = "ab" .. "c", C = { 1, 2 }, }\n'
+    formatted = 'A = {\n    B =\n        "a" ..\n        "bc",\n    C = { 1, 2, },\n}\n'
+    TokenVerifier().check(original, formatted)
+
+
+def test_mismatch_position():
+    with pytest.raises(VerifyError) as info:
+        TokenVerifier().check('A = {\n    B = 1,\n}\n', 'A = {\n  B = 2,\n}\n', line=10, out_line=20)
+    error = info.value
+    assert (error.line, error.column, error.out_line, error.out_column) == (11, 9, 21, 7)
+    assert "'1' != '2'" in str(error)
+
+
+def test_missing_and_extra_tokens():
+    with pytest.raises(VerifyError, match='不足') as info:
+        TokenVerifier().check('A = { B = 1 }\n', 'A = { B = 1\n')
+    assert (info.value.line, info.value.column) == (1, 13)
+    with pytest.raises(VerifyError, match='余分'):
+        TokenVerifier().check('A = { B = 1 }\n', 'A = { B = 1 } C\n')
+
+
+def test_renumbered_inputs_across_chunks():
+    verifier = TokenVerifier(renumber=True)
+    verifier.check('Input3 = InstanceInput {},\n', 'Input1 = InstanceInput {},\n')
+    verifier.check('Input1 = InstanceInput {},\n', 'Input2 = InstanceInput {},\n', line=2, out_line=2)
+    with pytest.raises(VerifyError, match='連番') as info:
+        verifier.check('Input9 = InstanceInput {},\n', 'Input4 = InstanceInput {},\n', line=3, out_line=3)
+    assert (info.value.out_line, info.value.out_column) == (3, 1)
+    # 番号を振り直さないルールでは番号の違いも食い違いになる
+    with pytest.raises(VerifyError):
+        TokenVerifier().check('Input3 = InstanceInput {},\n', 'Input1 = InstanceInput {},\n')
+
+
+def test_comments_compared_as_tokens():
+    TokenVerifier().check('A = { -- a\n    B = 1,\n}\n', 'A = { -- a\n  B = 1,\n}\n')
+    with pytest.raises(VerifyError) as info:
+        TokenVerifier().check('A = { -- a\n    B = 1, --[[ x\n y ]]\n}\n', 'A = { -- a\n    B = 1, --[[ x\n z ]]\n}\n')
+    assert (info.value.line, info.value.column) == (3, 1)
+
+
+def test_changed_ranges():
+    doc = Document('A\nB\nC\nD\nE\n')
+    doc.track_changes()
+    doc.replace_lines(1, 2, ['B1', 'B2'])
+    doc.replace_lines(4, 5, [])
+    assert doc.changed_ranges() == [(1, 2, 1, 3), (3, 4, 4, 4)]
+    doc.set_text('A\n')
+    assert doc.changed_ranges() == [(0, 5, 0, 1)]
+
+
+def test_check_changes_compares_changed_lines_only():
+    doc = Document('A = { B = "a" .. "b", },\nC = 1,\nD = 2,\n')
+    doc.track_changes()
+    doc.replace_lines(0, 1, ['A = {', '    B = "ab",', '},'])
+    assert TokenVerifier().check_changes(doc)
+    # 変更されていない行をまたいでトークンが移動した場合は一致しない
+    doc = Document('A = 1,\nB = 2,\nC = 3,\n')
+    doc.track_changes()
+    doc.replace_lines(0, 1, ['A = 1'])
+    doc.replace_lines(2, 3, [', C = 3,'])
+    assert not TokenVerifier().check_changes(doc)
+
+
+def test_spanning_long_string_compared_as_whole(config):
+    content = 'A = { S = [[\nx = { 1 }\n]], B = { C = "p" .. "q" } }\n'
+    assert apply_formatting(content, ['all'], config, verify=True) == apply_formatting(content, ['all'], config)
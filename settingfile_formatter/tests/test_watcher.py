@@ -0,0 +1,22 @@
+"""監視モードのテスト"""
+import zipfile
+
+from ..watcher import Watcher
+from .test_archive import SETTING_NAME, _make_archive
+
+
+def test_archive_is_formatted_through_process_file(tmp_path, macro, config, capsys):
+    path = tmp_path / 'Macro.drfx'
+    _make_archive(path, b'')
+    watcher = Watcher([str(tmp_path)], True, False, ['all'], config, debounce=0)
+    watcher.start()
+
+    # アーカイブはテキストとして読まず、展開して中の .setting を整形する
+    _make_archive(path, macro.encode('utf-8'))
+    assert watcher.poll(now=1.0) == [path]
+    assert '✗' not in capsys.readouterr().out
+    with zipfile.ZipFile(path) as archive:
+        assert archive.read(SETTING_NAME) != macro.encode('utf-8')
+
+    # 自身の上書きでは整形し直さない
+    assert watcher.poll(now=2.0) == []
@@ -0,0 +1,303 @@
+"""整形前後のトークン列の等価性の検証 (--verify)
+
+整形前と整形後のテキストを整形ルールと同じ Tokenizer のトークン列にし、正規化したトークン列が一致することを確認する。
+文書全体の整形 (api.apply_formatting) では整形ルールが変更した行の範囲 (Document.changed_ranges) のみを比較し、
+トークン化は整形中に作成したトークン列を使い回す。行をまたぐ字句を含む場合や範囲毎の比較で一致しない場合のみ文書全体を比較する。
+ストリーミング整形ではチャンク毎に検証し、変更の無いチャンクは比較しない。
+比較は正規化したトークン列を連結した文字列同士で行い、一致しない場合のみトークン単位で食い違った位置を探す。
+整形で意味の変わらない以下の違いは無視し、最初に食い違ったトークンの位置 (行・列) を報告する。
+    - 空白・改行・インデント (Tokenizer が読み飛ばす文字は比較しない。コメントはトークンとして比較する)
+    - '..' で連結された文字列リテラル (StringLiteralFormatter による分割、UserControls の連結の展開)
+    - '}' の直前のカンマ (UserControls / NumericTable が付け加える末尾のカンマ)
+    - InstanceInput の 'InputN' の番号 (instance_input の適用時のみ。整形後は文書全体で連番であることを確認する)
+"""
+import re
+from bisect import bisect_right
+from itertools import accumulate, chain
+from typing import Dict, List, Optional, Tuple
+
+from .config_loader import ConfigLoader
+from .formatters.base import Document, TokenLine, Tokenizer
+
+_TOKENIZER = Tokenizer()
+# 種別コード列から正規化が必要な並びを探すパターン
+_COMMA_BEFORE_CLOSE = re.compile(re.escape(bytes([Tokenizer.COMMA, Tokenizer.CLOSE_BRACE])))
+_STRING_CHAIN = re.compile(re.escape(bytes([Tokenizer.STRING]))
+                           + b'(?:' + re.escape(bytes([Tokenizer.CONCAT, Tokenizer.STRING])) + b')+')
+_INPUT_KEY = re.compile(r'Input\d+')
+# 改行で区切って連結したトークン列での InstanceInput のキー
+_JOINED_KEY = re.compile(r'\nInput(\d+)(?=\n=\nInstanceInput\n)')
+# InstanceInput のキー (変更された範囲のみを比較する際に、行頭にあるものから文書全体の番号を読む)
+_TEXT_KEY = re.compile(r'Input(\d+)[ \t]*=[ \t]*InstanceInput(?![\w.])')
+# 変更された範囲毎に比較する際の範囲の区切り (トークンにならない文字の行。正規化で範囲をまたいで置き換えないようにする)
+_RANGE_SEPARATOR = '\0'
+# 食い違いを探す際に1度に比較するトークン数
+_COMPARE_STEP = 4096
+
+RENUMBERED = 'Input#'
+
+
+class VerifyError(ValueError):
+    """整形前後でトークン列が一致しない"""
+
+    def __init__(self, message: str, line: int, column: int, out_line: int, out_column: int, source: str = ''):
+        prefix = f'{source}: ' if source else ''
+        super().__init__(f'{prefix}{message} (入力 {line}行 {column}列 / 出力 {out_line}行 {out_column}列)')
+        self.message = message
+        self.line = line
+        self.column = column
+        self.out_line = out_line
+        self.out_column = out_column
+        self.source = source
+
+    def __reduce__(self):
+        # プロセスプールから受け取れるよう、生成時の引数で復元する
+        return type(self), (self.message, self.line, self.column, self.out_line, self.out_column, self.source)
+
+    def with_source(self, source: str) -> 'VerifyError':
+        """検証対象の名前 (アーカイブのメンバー名等) を付けたエラーを返す"""
+        return VerifyError(self.message, self.line, self.column, self.out_line, self.out_column, source)
+
+
+class _TokenStream:
+    """行毎のトークン列を連結して正規化したトークン列
+
+    正規化で変わらない範囲は元のリストのスライスをそのまま繋げる。
+    _norm_starts / _flat_starts は各範囲の正規化後と連結したトークン列での開始位置で、食い違った位置を元の行・列に戻すのに使う。
+    """
+
+    def __init__(self, text: str, tokens_per_line: List[TokenLine], renumber: bool):
+        self.text = text
+        self.tokens_per_line = tokens_per_line
+        flat = list(chain.from_iterable(tokens_per_line))
+        kinds = b''.join([tokens.kinds for tokens in tokens_per_line])
+
+        edits: List[Tuple[int, int, Optional[str]]] = []       # (開始, 終了, 置き換えるトークン (None は削除))
+        edits.extend((m.start(), m.start() + 1, None) for m in _COMMA_BEFORE_CLOSE.finditer(kinds))
+        if Tokenizer.CONCAT in kinds:
+            for m in _STRING_CHAIN.finditer(kinds):
+                start, end = m.span()
+                edits.append((start, end, '"' + ''.join(token[1:-1] for token in flat[start:end:2]) + '"'))
+        self.keys: List[int] = []                              # InstanceInput のキーの位置
+        if renumber:
+            i = -1
+            while True:
+                try:
+                    i = flat.index('InstanceInput', i + 1)
+                except ValueError:
+                    break
+                if i >= 2 and flat[i - 1] == '=' and _INPUT_KEY.fullmatch(flat[i - 2]):
+                    self.keys.append(i - 2)
+                    edits.append((i - 2, i - 1, RENUMBERED))
+
+        self.flat = flat
+        if not edits:
+            self.tokens, self._norm_starts, self._flat_starts = flat, [0], [0]
+            return
+        edits.sort()
+        tokens: List[str] = []
+        norm_starts, flat_starts = [], []
+        pos = 0
+        for start, end, replacement in edits:
+            if pos < start:
+                norm_starts.append(len(tokens))
+                flat_starts.append(pos)
+                tokens += flat[pos:start]
+            if replacement is not None:
+                norm_starts.append(len(tokens))
+                flat_starts.append(start)
+                tokens.append(replacement)
+            pos = end
+        norm_starts.append(len(tokens))
+        flat_starts.append(pos)
+        tokens += flat[pos:]
+        self.tokens, self._norm_starts, self._flat_starts = tokens, norm_starts, flat_starts
+
+    def key_numbers(self) -> List[int]:
+        return [int(self.flat[i][5:]) for i in self.keys]
+
+    def position(self, index: int, first_line: int, flat: bool = False) -> Tuple[int, int]:
+        """index 番目のトークン (flat が偽の場合は正規化後の番号) の行・列 (1始まり) を返す"""
+        if not flat:
+            segment = bisect_right(self._norm_starts, index) - 1
+            index = self._flat_starts[segment] + index - self._norm_starts[segment]
+        line_ends = list(accumulate(len(tokens) for tokens in self.tokens_per_line))
+        line_idx = bisect_right(line_ends, index)
+        if line_idx >= len(self.tokens_per_line):
+            # トークンが無い (末尾) 場合はテキストの末尾
+            text = self.text
+            return first_line + text.count('\n'), len(text) - text.rfind('\n')
+        token_idx = index - (line_ends[line_idx - 1] if line_idx else 0)
+        line_text = self.text.splitlines()[line_idx]
+        starts = _TOKENIZER.token_starts(line_text, self.tokens_per_line[line_idx].continued)
+        if token_idx < len(starts):
+            return first_line + line_idx, starts[token_idx] + 1
+        return first_line + line_idx, len(line_text) + 1
+
+
+class TokenVerifier:
+    """整形前後のテキストを順に受け取り、トークン列が等価であることを検証する
+
+    ストリーミング整形ではチャンク毎に check() を呼び出す。InstanceInput の番号はチャンクをまたいで数える。
+    """
+
+    def __init__(self, renumber: bool = False):
+        self.renumber = renumber
+        self.next_input = 1
+
+    def check(self, original: str, formatted: str, line: int = 1, out_line: int = 1):
+        """original と formatted のトークン列を比較し、一致しない場合は VerifyError を送出する
+
+        line / out_line は original / formatted の先頭の行番号 (1始まり。報告する位置に使う)。
+        """
+        if original == formatted and not (self.renumber and 'InstanceInput' in formatted):
+            return
+        # 同じ Document で続けてトークン化し、整形前と同じ文字列の行はトークン列を共有する
+        doc = Document(original, _TOKENIZER)
+        tokens = doc.tokens_per_line
+        doc.set_text(formatted)
+        self.check_tokens(original, formatted, tokens, doc.tokens_per_line, line, out_line)
+
+    def check_changes(self, doc: Document) -> bool:
+        """track_changes を呼んだ doc の変更された範囲のみを比較し、一致すれば真を返す
+
+        範囲の外は整形前後で同じ行が並ぶため、範囲毎の正規化したトークン列が一致すれば文書全体でも一致する。
+        行をまたぐ字句を含む場合や一致しない範囲がある場合は偽を返す (呼び出し側は check_tokens で文書全体を比較する)。
+        """
+        original, lines = doc.original_lines, doc.lines
+        if Tokenizer.may_open_span(doc.original_text) and doc.opens_span(original):
+            return False
+        # 変更された範囲の行を区切りを挟んで並べ、1度に連結・正規化して比較する
+        orig_lines: List[str] = []
+        out_lines: List[str] = []
+        for orig_start, orig_end, start, end in doc.changed_ranges():
+            orig_lines += original[orig_start:orig_end]
+            orig_lines.append(_RANGE_SEPARATOR)
+            out_lines += lines[start:end]
+            out_lines.append(_RANGE_SEPARATOR)
+        known = {_RANGE_SEPARATOR: _RANGE_SEPARATOR}
+        joined, out_joined = _join_lines(doc, orig_lines, known), _join_lines(doc, out_lines, known)
+        if joined is None or out_joined is None:
+            return False
+        if self._normalize_joined(joined, False)[0] != self._normalize_joined(out_joined, False)[0]:
+            return False
+        if self.renumber:
+            numbers = _key_numbers(doc.text)
+            if numbers is None or numbers != list(range(self.next_input, self.next_input + len(numbers))):
+                return False
+            self.next_input += len(numbers)
+        return True
+
+    def check_tokens(self, original: str, formatted: str, tokens: List[TokenLine], out_tokens: List[TokenLine],
+                     line: int = 1, out_line: int = 1):
+        """トークン化済みの行毎のトークン列 (Document.tokens_per_line 等) で check() と同じ検証を行う
+
+        まず正規化したトークン列を区切り文字で連結した文字列同士で比較し、一致しない場合のみ
+        _TokenStream で食い違った位置を探す。
+        """
+        joined, _numbers = self._normalize(tokens)
+        out_joined, numbers = self._normalize(out_tokens)
+        if joined == out_joined and numbers == list(range(self.next_input, self.next_input + len(numbers))):
+            self.next_input += len(numbers)
+            return
+        stream = _TokenStream(original, tokens, self.renumber)
+        out_stream = _TokenStream(formatted, out_tokens, self.renumber)
+        if self.renumber:
+            self._check_numbers(stream, out_stream, line, out_line)
+        a, b = stream.tokens, out_stream.tokens
+        if a == b:
+            return
+        index = _first_difference(a, b)
+        token = a[index] if index < len(a) else None
+        out_token = b[index] if index < len(b) else None
+        if token is not None and out_token is not None:
+            message = f'トークンが一致しません: {_shorten(token)} != {_shorten(out_token)}'
+        elif token is not None:
+            message = f'整形後のトークンが不足しています: {_shorten(token)}'
+        else:
+            message = f'整形後に余分なトークンがあります: {_shorten(out_token)}'
+        raise VerifyError(message, *stream.position(index, line), *out_stream.position(index, out_line))
+
+    def _normalize(self, tokens_per_line: List[TokenLine]) -> Tuple[str, List[int]]:
+        """トークンを改行で区切って連結して正規化した文字列と、InstanceInput のキーの番号を返す
+
+        トークンは改行を含まず、'}' / ',' / '..' は単独のトークンにしかならないため、
+        区切り文字を含めた部分文字列の置き換えでトークン列の正規化になる。
+        """
+        return self._normalize_joined('\n' + '\n'.join(chain.from_iterable(tokens_per_line)) + '\n')
+
+    def _normalize_joined(self, joined: str, keys: bool = True) -> Tuple[str, List[int]]:
+        """改行で区切って連結したトークン列 (前後にも改行を置く) を正規化する (keys が偽の場合はキーの番号を読まない)"""
+        joined = joined.replace('\n,\n}', '\n}')
+        if '\n..\n' in joined:
+            joined = joined.replace('"\n..\n"', '')
+        numbers: List[int] = []
+        if self.renumber and '\nInstanceInput\n' in joined:
+            if keys:
+                numbers = [int(number) for number in _JOINED_KEY.findall(joined)]
+            joined = _JOINED_KEY.sub('\n' + RENUMBERED, joined)
+        return joined, numbers
+
+    def _check_numbers(self, stream: _TokenStream, out_stream: _TokenStream, line: int, out_line: int):
+        """整形後の InstanceInput のキーが、前のチャンクから続く連番になっているか確認する"""
+        for i, number in enumerate(out_stream.key_numbers()):
+            expected = self.next_input + i
+            if number != expected:
+                position = (stream.position(stream.keys[i], line, flat=True) if i < len(stream.keys)
+                            else stream.position(len(stream.flat), line, flat=True))
+                raise VerifyError(f'InstanceInput の番号が連番ではありません: Input{number} (Input{expected} のはず)',
+                                  *position, *out_stream.position(out_stream.keys[i], out_line, flat=True))
+        self.next_input += len(out_stream.keys)
+
+
+def create_verifier(rules: List[str], config: ConfigLoader) -> TokenVerifier:
+    """適用する整形ルールに合わせた TokenVerifier を返す (instance_input を含む場合のみ番号の違いを許す)"""
+    return TokenVerifier(any(name == 'instance_input' for name in config.resolve_rule_names(rules)))
+
+
+def _join_lines(doc: Document, lines: List[str], known: Dict[str, str]) -> Optional[str]:
+    """行毎のトークンを改行で区切って連結する (次の行に続く字句を含む場合は None)
+
+    変更された範囲の外は整形前と同じ行なので、範囲内で閉じていれば範囲の行だけをトークン化すれば足りる。
+    行毎の連結は known に記録し、同じ文字列の行は1度だけトークン化する。
+    """
+    findall, cached_tokens, is_special = Tokenizer.FLAT_PATTERN.findall, doc.cached_tokens, Tokenizer.is_special
+    for line in dict.fromkeys(lines).keys() - known.keys():
+        tokens = cached_tokens(line)
+        if tokens is None and not is_special(line):
+            # 整形中にトークン化されず、コメント等も含まない行は種別を求めずにトークン文字列のみを切り出す
+            tokens = findall(line, len(line) - len(line.lstrip()))
+        else:
+            if tokens is None:
+                tokens = doc.scan_lines([line])[0]
+            if tokens.opened is not None:
+                return None
+        known[line] = '\n'.join(tokens)
+    return '\n' + '\n'.join(filter(None, map(known.__getitem__, lines))) + '\n'
+
+
+def _key_numbers(text: str) -> Optional[List[int]]:
+    """行頭の InstanceInput のキーの番号を返す (それ以外の位置に 'InstanceInput' がある場合は None)"""
+    numbers = []
+    for m in _TEXT_KEY.finditer(text):
+        start = m.start()
+        if text[text.rfind('\n', 0, start) + 1:start].strip(' \t'):
+            return None
+        numbers.append(int(m.group(1)))
+    return numbers if len(numbers) == text.count('InstanceInput') else None
+
+
+def _first_difference(a: List[str], b: List[str]) -> int:
+    """2つのトークン列が最初に食い違う位置を返す (一定数毎のスライスの比較で範囲を絞る)"""
+    count = min(len(a), len(b))
+    start = 0
+    while start < count and a[start:start + _COMPARE_STEP] == b[start:start + _COMPARE_STEP]:
+        start += _COMPARE_STEP
+    for i in range(start, min(start + _COMPARE_STEP, count)):
+        if a[i] != b[i]:
+            return i
+    return count
+
+
+def _shorten(token: str, limit: int = 40) -> str:
+    return repr(token if len(token) <= limit else token[:limit] + '...')
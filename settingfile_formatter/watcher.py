@@ -0,0 +1,121 @@
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .batch import discover_files
+from .cache import input_hash
+from .config_loader import ConfigLoader
+
+DEFAULT_INTERVAL = 0.5
+DEFAULT_DEBOUNCE = 1.0
+
+
+class PollingBackend:
+    """ファイルの更新をstat情報のポーリングで検出する"""
+
+    def __init__(self, paths: Iterable[str], prefix: str = 'fixed_'):
+        self.paths = list(paths)
+        self.prefix = prefix
+
+    def snapshot(self) -> Dict[Path, Tuple[int, int]]:
+        """監視対象ファイルの (サイズ, 更新日時) を返す
+
+        本ツールの出力 (prefix付きファイル、.bak) は discover_files で除外される。
+        """
+        stats = {}
+        for path in discover_files(self.paths, self.prefix):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            stats[path] = (stat.st_size, stat.st_mtime_ns)
+        return stats
+
+
+class Watcher:
+    """settingファイルの保存を監視し、変更されたファイルのみを整形する
+
+    ConfigLoader とフォーマッターのインスタンスはセッション中使い回す。
+    """
+
+    def __init__(self, paths: Iterable[str], overwrite: bool, backup: bool, rules: List[str], config: ConfigLoader,
+                 interval: float = DEFAULT_INTERVAL, debounce: float = DEFAULT_DEBOUNCE,
+                 backend: Optional[PollingBackend] = None):
+        self.overwrite = overwrite
+        self.backup = backup
+        self.rules = rules
+        self.config = config
+        self.interval = interval
+        self.debounce = debounce
+        self.backend = backend or PollingBackend(paths)
+        self._stats: Dict[Path, Tuple[int, int]] = {}
+        self._hashes: Dict[Path, str] = {}
+        self._pending: Dict[Path, float] = {}
+
+    def start(self):
+        """現在の状態を基準として記録する (既存ファイルは整形しない)"""
+        self._stats = self.backend.snapshot()
+
+    def poll(self, now: Optional[float] = None) -> List[Path]:
+        """更新を検出し、書き込みが落ち着いたファイルを整形する。整形したファイルを返す"""
+        now = time.monotonic() if now is None else now
+        current = self.backend.snapshot()
+        for path, stat in current.items():
+            if self._stats.get(path) != stat:
+                # 連続した書き込みの間は待機時間を延長する
+                self._pending[path] = now
+        for path in list(self._pending):
+            if path not in current:
+                del self._pending[path]
+                self._hashes.pop(path, None)
+        self._stats = current
+
+        processed = []
+        for path, changed_at in list(self._pending.items()):
+            if now - changed_at < self.debounce:
+                continue
+            del self._pending[path]
+            if self._process(path):
+                processed.append(path)
+        return processed
+
+    def _process(self, path: Path) -> bool:
+        # drsetfmt との循環importを避けるため関数内でimportする
+        from .drsetfmt import process_file
+
+        try:
+            # アーカイブ (.drfx) はテキストとして読まず、バイト列のハッシュ値で比較して process_file で展開する
+            digest = input_hash(path)
+            if self._hashes.get(path) == digest:
+                # 更新日時のみの変化や自身の書き込みは無視する
+                return False
+            output_path, _status = process_file(str(path), self.overwrite, self.backup, self.rules, self.config)
+        except Exception as e:
+            print(f'✗ 整形に失敗しました: {path}: {e}')
+            return False
+
+        if output_path == path:
+            # 上書き保存した内容を記録し、自身の書き込みで再整形しないようにする
+            self._stats[path] = self._stat(path) or self._stats.get(path)
+            digest = input_hash(path)
+        self._hashes[path] = digest
+        return True
+
+    @staticmethod
+    def _stat(path: Path) -> Optional[Tuple[int, int]]:
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def run(self):
+        """Ctrl+C で中断されるまで監視を続ける"""
+        self.start()
+        print(f'監視を開始しました ({len(self._stats)} ファイル)。Ctrl+C で終了します。')
+        try:
+            while True:
+                self.poll()
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            print('\n監視を終了しました。')